@@ -5,6 +5,7 @@ from app.utils.database import get_db
 from app.models.user import User
 from app.utils.auth import create_access_token
 from app.services.riot_api import riot_api
+from app.services.matchup_aggregates import rebuild_matchup_stats
 from config.settings import settings
 from datetime import timedelta
 from pydantic import BaseModel
@@ -33,7 +34,7 @@ class UserResponse(BaseModel):
 async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """Login user and return access token"""
     # Get PUUID from Riot API
-    puuid = riot_api.get_puuid(user_data.riot_id, user_data.tag)
+    puuid = await riot_api.get_puuid(user_data.riot_id, user_data.tag)
     if not puuid:
         raise HTTPException(status_code=400, detail="Invalid Riot ID or Tag")
     
@@ -45,6 +46,8 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             db.add(user)
             db.commit()
             db.refresh(user)
+            # Games stored earlier for other players may include this one
+            rebuild_matchup_stats(db, user.id)
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
@@ -1,12 +1,15 @@
-﻿from fastapi import APIRouter, HTTPException, Depends, Query
+﻿import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
 from typing import Optional
-import json
 from app.utils.database import get_db
 from app.models.user import User
 from app.utils.auth import get_current_user
 from app.services.champion_recommender import champion_recommender
 from app.services.matchup_analyzer import matchup_analyzer
+from app.services.matchup_matrix import matchup_matrix
+from app.services.cache_service import cache
+from config.settings import settings
 
 router = APIRouter(prefix="/champions", tags=["champions"])
 
@@ -35,13 +38,21 @@ async def get_champion_recommendations(
                 "message": "No match data available. Please refresh your data."
             }
         
-        # Get difficult matchups first
-        difficult_matchups = matchup_analyzer.analyze_difficult_matchups(db, user.id, role, game_mode)
+        # Load the matchup cube and the recommendations into this request's cache batch
+        # with one round trip once the user's data version is known
+        cache.prefetch([
+            matchup_analyzer.difficult_matchups_cache_key(user.id),
+            champion_recommender.recommendations_cache_key(user.id, role, game_mode),
+        ])
+        # Both may wait on another worker's recompute lock, so they run off the event loop
+        difficult_matchups = await asyncio.to_thread(
+            matchup_analyzer.analyze_difficult_matchups, db, user.id, role, game_mode
+        )
         difficult_champions = [m["champion"] for m in difficult_matchups]
         
         # Get recommendations
-        recommendations = champion_recommender.get_champion_recommendations(
-            db, user.id, difficult_champions, role, game_mode
+        recommendations = await asyncio.to_thread(
+            champion_recommender.get_champion_recommendations, db, user.id, difficult_champions, role, game_mode
         )
         
         return {
@@ -56,13 +67,37 @@ async def get_champion_recommendations(
         raise HTTPException(status_code=500, detail=f"Failed to get champion recommendations: {str(e)}")
 
 
+@router.get("/similar")
+async def get_similar_champions(
+    champion: Optional[str] = Query(None, description="Champion to find look-alikes for (default: your best champions)"),
+    role: Optional[str] = Query(None, description="Filter by role"),
+    game_mode: Optional[str] = Query(None, description="Filter by game mode"),
+    limit: int = Query(5, ge=1, le=10),
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get champions that play like a given champion, or like the ones you perform best on"""
+    if champion:
+        matrix = matchup_matrix.get()
+        return {
+            "based_on": [champion],
+            "similar": matrix.similar(champion, limit) if matrix else []
+        }
+    
+    return champion_recommender.get_similar_champions(db, int(current_user), role, game_mode, limit=limit)
+
+
 @router.get("/counters/{champion_name}")
 async def get_champion_counters(
     champion_name: str,
+    role: Optional[str] = Query(None, description="Filter by role (TOP, JUNGLE, MIDDLE, ADC, SUPPORT)"),
     current_user: str = Depends(get_current_user)
 ):
     """Get champions that counter a specific champion"""
-    counters = champion_recommender.get_champion_counters(champion_name)
+    try:
+        counters = champion_recommender.get_champion_counters(champion_name, role=role)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "champion": champion_name,
@@ -78,23 +113,15 @@ async def get_champion_stats(
 ):
     """Get comprehensive champion stats from u.gg scraper"""
     try:
-        from app.utils.redis_client import redis_client
-        
         cache_key = f"champion_stats:{champion_name.lower()}"
-        cached_data = redis_client.get(cache_key)
-        
-        if cached_data:
-            data = json.loads(cached_data)
-            if data.get('win_rate') == 50.0 and data.get('pick_rate') == 0.0:
-                redis_client.delete(cache_key)
-            else:
-                return data
         
-        from app.services.scraper import get_champion_data
-        champion_data = get_champion_data(champion_name)
-        
-        if champion_data:
-            result = {
+        def _scrape_stats():
+            from app.services.scraper import get_champion_data
+            champion_data = get_champion_data(champion_name)
+            # Placeholder numbers mean the page could not be parsed; don't cache them
+            if not champion_data or (champion_data.get('win_rate') == 50.0 and champion_data.get('pick_rate') == 0.0):
+                return None
+            return {
                 "champion": champion_name,
                 "win_rate": round(champion_data.get('win_rate', 50.0), 2),
                 "pick_rate": round(champion_data.get('pick_rate', 0.0), 2),
@@ -103,29 +130,29 @@ async def get_champion_stats(
                 "strong_against": champion_data.get('strong_against', []),
                 "weak_against": champion_data.get('weak_against', [])
             }
-            
-            redis_client.setex(cache_key, 86400, json.dumps(result))
-            return result
-        else:
-            # Fallback to basic counter data
-            from app.services.scraper import get_champion_counters
-            counters = get_champion_counters(champion_name)
-            
-            result = {
-                "champion": champion_name,
-                "win_rate": 50.0,
-                "pick_rate": 0.0,
-                "ban_rate": 0.0,
-                "counters": counters if counters else [],
-                "strong_against": [],
-                "weak_against": []
-            }
-            
-            # Even cache the fallback (with shorter TTL - 1 hour)
-            if counters:
-                redis_client.setex(cache_key, 3600, json.dumps(result))
-            
+        
+        # Served stale while one background scrape refreshes it, so expiry never blocks a request.
+        # A cold scrape waits on the network, so it runs off the event loop
+        result = await asyncio.to_thread(
+            cache.get_or_set, cache_key, _scrape_stats, settings.CACHE_CHAMPION_STATS_TTL,
+            stale_ttl=settings.CACHE_CHAMPION_STATS_STALE_TTL
+        )
+        if result:
             return result
+        
+        # Fallback to basic counter data, parsed from the counter page fetched above
+        from app.services.scraper import get_champion_counters
+        counters = await asyncio.to_thread(get_champion_counters, champion_name)
+        
+        return {
+            "champion": champion_name,
+            "win_rate": 50.0,
+            "pick_rate": 0.0,
+            "ban_rate": 0.0,
+            "counters": counters if counters else [],
+            "strong_against": [],
+            "weak_against": []
+        }
     except Exception as e:
         return {
             "champion": champion_name,
@@ -1,10 +1,13 @@
-﻿from fastapi import APIRouter, HTTPException, Depends, Query
+﻿import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
+import time
 from typing import Optional
 from app.utils.database import get_db
 from app.models.user import User
 from app.utils.auth import get_current_user
 from app.services.matchup_analyzer import matchup_analyzer
+from app.services.matchup_matrix import matchup_matrix
 
 router = APIRouter(prefix="/matchups", tags=["matchups"])
 
@@ -32,21 +35,28 @@ def _get_user_with_validation(db: Session, user_id: str):
 async def get_difficult_matchups(
     role: Optional[str] = Query(None, description="Filter by role (TOP, JUNGLE, MIDDLE, ADC, SUPPORT)"),
     game_mode: Optional[str] = Query(None, description="Filter by game mode (e.g., RANKED_SOLO_5x5, ARAM, NORMAL_DRAFT)"),
+    window: Optional[str] = Query(None, description="Time window: all, 7d, 30d, 90d or split (current ranked split)"),
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user's most difficult matchups - champions with win rate < 50%."""
     try:
         user = _get_user_with_validation(db, current_user)
-        difficult_matchups = matchup_analyzer.analyze_difficult_matchups(db, user.id, role, game_mode)
+        # A cache miss may wait on another worker's recompute lock, so keep it off the event loop
+        difficult_matchups = await asyncio.to_thread(
+            matchup_analyzer.analyze_difficult_matchups, db, user.id, role, game_mode, window
+        )
         
         return {
             "difficult_matchups": difficult_matchups,
             "total_analyzed": len(difficult_matchups),
             "role_filter": role,
-            "game_mode_filter": game_mode
+            "game_mode_filter": game_mode,
+            "window": window or "all"
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -54,26 +64,68 @@ async def get_difficult_matchups(
         raise HTTPException(status_code=500, detail=f"Failed to analyze difficult matchups: {str(e)}")
 
 
+@router.get("/explore")
+async def explore_matchups(
+    group_by: str = Query("opponent", description="Comma separated: champion, opponent, role, game_mode"),
+    role: Optional[str] = Query(None, description="Filter by role (TOP, JUNGLE, MIDDLE, ADC, SUPPORT)"),
+    game_mode: Optional[str] = Query(None, description="Filter by game mode"),
+    champion: Optional[str] = Query(None, description="Filter by the champion you played"),
+    opponent: Optional[str] = Query(None, description="Filter by lane opponent"),
+    days: Optional[int] = Query(None, ge=1, description="Only games from the last N days"),
+    min_games: int = Query(1, ge=1),
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Slice the user's games by any combination of filters and group-by fields."""
+    try:
+        user = _get_user_with_validation(db, current_user)
+        fields = [field.strip() for field in group_by.split(",") if field.strip()]
+        since = int(time.time()) - days * 86400 if days else None
+        groups = matchup_analyzer.explore_matchups(
+            db, user.id, fields, role, game_mode, champion, opponent, since, min_games
+        )
+        
+        return {
+            "groups": groups,
+            "group_by": fields,
+            "total_games": sum(g["games"] for g in groups)
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"🔍 ERROR: Explore matchups error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to explore matchups: {str(e)}")
+
+
 @router.get("/champion/{champion_name}")
 async def get_champion_matchup_data(
     champion_name: str,
+    role: Optional[str] = Query(None, description="Filter by role (TOP, JUNGLE, MIDDLE, ADC, SUPPORT)"),
+    limit: int = Query(5, ge=1, le=50, description="Matchups listed on each side"),
     current_user: str = Depends(get_current_user)
 ):
     """Get general matchup data for a specific champion.
     
-    Returns strong/weak matchups based on u.gg data.
+    Returns strong/weak matchups from every match we have ingested, across the most
+    recent patches (see build_matchup_matrix.py).
     """
-    # TODO: Replace with real u.gg scraper data
+    matrix = matchup_matrix.get()
+    if matrix is None:
+        return {"champion": champion_name, "patches": [], "strong_against": [], "weak_against": []}
+    
+    try:
+        matchups = matrix.matchups(champion_name, role=role)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     return {
         "champion": champion_name,
-        "strong_against": [
-            {"champion": "WeakChamp1", "win_rate": 65.2},
-            {"champion": "WeakChamp2", "win_rate": 62.8}
-        ],
-        "weak_against": [
-            {"champion": "StrongChamp1", "win_rate": 35.1},
-            {"champion": "StrongChamp2", "win_rate": 38.9}
-        ]
+        "patches": matrix.patches,
+        "strong_against": [m for m in matchups[:limit] if m["win_rate"] > 50],
+        "weak_against": [m for m in matchups[::-1][:limit] if m["win_rate"] < 50]
     }
 
 
@@ -81,10 +133,14 @@ async def get_champion_matchup_data(
 async def get_head_to_head_matchup(
     champion1: str,
     champion2: str,
+    role: Optional[str] = Query(None, description="Filter by role (TOP, JUNGLE, MIDDLE, ADC, SUPPORT)"),
     current_user: str = Depends(get_current_user)
 ):
     """Get detailed head-to-head matchup data between two champions."""
-    matchup_data = matchup_analyzer.get_champion_matchup_data(champion1, champion2)
+    try:
+        matchup_data = matchup_analyzer.get_champion_matchup_data(champion1, champion2, role=role)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "champion1": champion1,
@@ -98,6 +154,7 @@ async def get_matchup_details(
     opponent: str,
     role: Optional[str] = Query(None, description="Filter by role (TOP, JUNGLE, MIDDLE, ADC, SUPPORT)"),
     game_mode: Optional[str] = Query(None, description="Filter by game mode (e.g., RANKED_SOLO_5x5, ARAM, NORMAL_DRAFT)"),
+    window: Optional[str] = Query(None, description="Time window: all, 7d, 30d, 90d or split (current ranked split)"),
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -107,8 +164,12 @@ async def get_matchup_details(
     """
     try:
         user = _get_user_with_validation(db, current_user)
-        details = matchup_analyzer.analyze_matchup_details(db, user.id, opponent, role, game_mode)
+        details = await asyncio.to_thread(
+            matchup_analyzer.analyze_matchup_details, db, user.id, opponent, role, game_mode, window
+        )
         return details
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -7,11 +7,12 @@ from app.models.champion_mastery import ChampionMastery
 from app.utils.auth import get_current_user
 from app.services.riot_api import riot_api
 from app.services.cache_service import cache
+from app.services.match_sync import match_sync
+from app.services.mastery_sync import sync_champion_mastery
 from config.settings import settings
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import Optional
-from app.services.champion_data import champion_data
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -49,6 +50,7 @@ async def get_user_profile(current_user: str = Depends(get_current_user), db: Se
 
 @router.get("/match-history")
 async def get_match_history(
+    background_tasks: BackgroundTasks,
     current_user: str = Depends(get_current_user), 
     db: Session = Depends(get_db),
     game_mode: Optional[str] = None,
@@ -63,7 +65,7 @@ async def get_match_history(
             raise HTTPException(status_code=404, detail="User not found")
         
         # Try to get from cache first (1 hour TTL)
-        cache_key = f"match_history:{user.id}:{game_mode or 'all'}:{limit}"
+        cache_key = cache.user_key(user.id, "match_history", game_mode or 'all', limit)
         cached_data = cache.get(cache_key)
         if cached_data:
             print(f"🔍 DEBUG: Returning {len(cached_data)} matches from cache")
@@ -125,12 +127,18 @@ async def get_match_history(
             # Fetch new matches and add them to the database
             await _fetch_and_store_matches(db, user)
             
+            # Older history is paged in by the resumable backfill
+            background_tasks.add_task(match_sync.run_backfill, user.id)
+            
             # Re-query to get the updated data including new matches
             query = db.query(Match).filter(Match.user_id == user.id)
             if game_mode:
                 query = query.filter(Match.game_mode == game_mode)
             updated_matches = query.order_by(Match.game_creation.desc()).limit(limit).all()
             
+            # Storing new matches bumped the user's cache version
+            cache_key = cache.user_key(user.id, "match_history", game_mode or 'all', limit)
+            
             # Format updated matches
             formatted_matches = []
             for match in updated_matches:
@@ -176,7 +184,7 @@ async def get_champion_mastery(current_user: str = Depends(get_current_user), db
             raise HTTPException(status_code=404, detail="User not found")
         
         # Try to get from cache first (2 hour TTL)
-        cache_key = f"champion_mastery:{user.id}"
+        cache_key = cache.user_key(user.id, "champion_mastery")
         cached_data = cache.get(cache_key)
         if cached_data:
             print(f"🔍 DEBUG: Returning {len(cached_data)} masteries from cache")
@@ -240,17 +248,13 @@ async def refresh_user_data(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Clear cache for this user
-        cache.clear_user_cache(user.puuid)
-        
-        # Clear specific cache keys
-        cache.delete(f"match_history:{user.id}:all:200")
-        cache.delete(f"match_history:{user.id}:all:100")
-        cache.delete(f"champion_mastery:{user.id}")
+        # Invalidate everything cached for this user
+        cache.bump_user_versions([user.id])
         
         # Add background tasks to fetch fresh data
         background_tasks.add_task(_fetch_and_store_matches, db, user)
         background_tasks.add_task(_fetch_and_store_mastery, db, user)
+        background_tasks.add_task(match_sync.run_backfill, user.id)
         
         # Update last_updated timestamp
         user.last_updated = datetime.utcnow()
@@ -267,89 +271,13 @@ async def refresh_user_data(
 
 # Helper functions for fetching and storing data
 async def _fetch_and_store_matches(db: Session, user: User):
-    """Fetch match data from Riot API and store in database - stops when finding existing matches"""
+    """Fetch matches played since the last sync from Riot API and store them in database"""
+    puuid = user.puuid
     try:
-        # Fetch matches in batches and stop when we find an existing match
-        batch_size = 100
-        found_existing = False
-        matches_added = 0
-        
-        # Fetch first batch to check
-        match_ids = riot_api.get_match_history(user.puuid, count=batch_size, start=0)
-        
-        if not match_ids:
-            print(f"🔍 DEBUG: No matches found for user {user.puuid}")
-            return
-        
-        print(f"🔍 DEBUG: Checking {len(match_ids)} match IDs for existing matches...")
-        
-        # Get all existing match IDs in one query (much faster!)
-        existing_match_ids = set(
-            row[0] for row in db.query(Match.match_id)
-            .filter(Match.user_id == user.id)
-            .all()
-        )
-        
-        new_match_ids = []
-        for match_id in match_ids:
-            if match_id in existing_match_ids:
-                print(f"🔍 DEBUG: Found existing match {match_id}. Will not fetch more.")
-                found_existing = True
-                break
-            new_match_ids.append(match_id)
-        
-        # Only fetch details for new matches
-        for match_id in new_match_ids:
-            # Fetch match details from Riot API
-            match_data = riot_api.get_match_details(match_id)
-            if not match_data:
-                continue
-            
-            # Find player data in match
-            player_data = next(
-                (p for p in match_data["info"]["participants"] if p["puuid"] == user.puuid),
-                None
-            )
-            if not player_data:
-                continue
-            
-            # Extract opponent champion
-            opponent_champion = _get_opponent_champion(match_data, player_data)
-            
-            # Calculate game mode
-            queue_id = match_data["info"]["queueId"]
-            game_mode = _get_game_mode(queue_id)
-            
-            # Calculate kill participation
-            team_kills = sum(p["kills"] for p in match_data["info"]["participants"] if p["teamId"] == player_data["teamId"])
-            kill_participation = (player_data["kills"] + player_data["assists"]) / max(1, team_kills)
-            
-            # Create match record
-            match_record = Match(
-                match_id=match_id,
-                user_id=user.id,
-                champion=player_data["championName"],
-                opponent_champion=opponent_champion,
-                team_position=_normalize_team_position(player_data.get("teamPosition", "UNKNOWN")),
-                win=player_data["win"],
-                game_duration=match_data["info"]["gameDuration"] / 60,  # Convert to minutes
-                kills=player_data["kills"],
-                deaths=player_data["deaths"],
-                assists=player_data["assists"],
-                cs_per_min=(player_data["totalMinionsKilled"] + player_data["neutralMinionsKilled"]) / (match_data["info"]["gameDuration"] / 60),
-                gold_per_min=player_data["goldEarned"] / (match_data["info"]["gameDuration"] / 60),
-                kill_participation=kill_participation,
-                damage_to_champs_per_min=player_data["totalDamageDealtToChampions"] / (match_data["info"]["gameDuration"] / 60),
-                game_creation=datetime.fromtimestamp(match_data["info"]["gameCreation"] / 1000),
-                queue_id=queue_id,
-                game_mode=game_mode
-            )
-            
-            db.add(match_record)
-            matches_added += 1
+        # The sync cursor limits the ID list to games after the newest stored one
+        matches_added = await match_sync.sync_recent(db, user)
         
-        db.commit()
-        print(f"🔍 DEBUG: Successfully stored {matches_added} new matches for user {user.puuid}")
+        print(f"🔍 DEBUG: Successfully stored {matches_added} new matches for user {puuid}")
         
     except Exception as e:
         print(f"🔍 ERROR: Failed to fetch and store matches: {e}")
@@ -359,84 +287,14 @@ async def _fetch_and_store_mastery(db: Session, user: User):
     """Fetch champion mastery data from Riot API and store in database"""
     try:
         # Get mastery data from Riot API
-        mastery_data = riot_api.get_champion_mastery(user.puuid)
+        mastery_data = await riot_api.get_champion_mastery(user.puuid)
         print(f"🔍 DEBUG: Found {len(mastery_data)} champion masteries")
         
-        for champ_data in mastery_data:
-            # Check if mastery already exists
-            existing_mastery = db.query(ChampionMastery).filter(
-                ChampionMastery.user_id == user.id,
-                ChampionMastery.champion_id == champ_data["championId"]
-            ).first()
-            
-            if existing_mastery:
-                # Update existing mastery
-                existing_mastery.champion_level = champ_data["championLevel"]
-                existing_mastery.champion_points = champ_data["championPoints"]
-                existing_mastery.last_played = datetime.fromtimestamp(champ_data["lastPlayTime"] / 1000) if champ_data["lastPlayTime"] else None
-            else:
-                # Create new mastery record
-                mastery_record = ChampionMastery(
-                    user_id=user.id,
-                    champion_id=champ_data["championId"],
-                    champion_name=_get_champion_name_by_id(champ_data["championId"]),
-                    champion_level=champ_data["championLevel"],
-                    champion_points=champ_data["championPoints"],
-                    last_played=datetime.fromtimestamp(champ_data["lastPlayTime"] / 1000) if champ_data["lastPlayTime"] else None
-                )
-                db.add(mastery_record)
-        
-        db.commit()
+        # One upsert for the whole payload; unchanged champions are skipped
+        changed = sync_champion_mastery(db, user, mastery_data)
+        print(f"🔍 DEBUG: {changed} champion masteries changed")
         print(f"🔍 DEBUG: Successfully stored mastery data for user {user.puuid}")
         
     except Exception as e:
         print(f"🔍 ERROR: Failed to fetch and store mastery: {e}")
         db.rollback()
-
-def _get_opponent_champion(match_data: dict, player_data: dict) -> Optional[str]:
-    """Get the opponent champion in the same lane"""
-    player_lane = player_data.get("teamPosition", "UNKNOWN")
-    player_team = player_data["teamId"]
-    
-    # Find opponent in same lane
-    for participant in match_data["info"]["participants"]:
-        if (participant["teamId"] != player_team and 
-            participant.get("teamPosition") == player_lane):
-            return participant["championName"]
-    
-    return None
-
-def _get_game_mode(queue_id: int) -> str:
-    """Convert queue ID to game mode name"""
-    queue_map = {
-        420: "Ranked Solo/Duo",
-        440: "Ranked Flex",
-        450: "ARAM",
-        700: "Clash",
-        900: "URF",
-        1020: "One for All",
-        1300: "Nexus Blitz",
-        1400: "Ultimate Spellbook",
-        1700: "Arena",
-        1900: "URF",
-        2000: "Tutorial",
-        2010: "Tutorial",
-        2020: "Tutorial"
-    }
-    return queue_map.get(queue_id, f"Queue {queue_id}")
-
-def _get_champion_name_by_id(champion_id: int) -> str:
-    """Get champion name by ID using Data Dragon mapping"""
-    return champion_data.get_champion_name_by_id(champion_id)
-
-def _normalize_team_position(pos: str) -> str:
-    if not pos:
-        return "UNKNOWN"
-    mapping = {
-        'MID': 'MIDDLE',
-        'ADC': 'BOTTOM',
-        'BOT': 'BOTTOM',
-        'SUPPORT': 'UTILITY',
-    }
-    up = pos.strip().upper()
-    return mapping.get(up, up)
\ No newline at end of file
@@ -1,8 +1,12 @@
-﻿from fastapi import FastAPI, HTTPException
+﻿from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.utils.database import init_db
 from app.api import auth, users, matchups, champions
+from app.services.riot_api import riot_api
+from app.services.match_archive import match_archive
+from app.services.scraper import ugg_client
+from app.services.cache_service import cache
 from config.settings import settings
 
 
@@ -14,6 +18,9 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     print(" Shutting down League Analytics API...")
+    await riot_api.aclose()
+    ugg_client.close()
+    match_archive.close()
 
 
 app = FastAPI(
@@ -32,6 +39,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def cache_batch(request: Request, call_next):
+    """Share cache reads across the services handling one request (see CacheService.batch)"""
+    with cache.batch():
+        return await call_next(request)
+
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -54,6 +68,12 @@ async def health_check():
     return {"status": "healthy", "database": "connected"}
 
 
+@app.get("/health/cache")
+async def cache_stats():
+    """Hit, miss and eviction counters for the in-process and Redis cache tiers"""
+    return cache.get_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
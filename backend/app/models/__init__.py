@@ -1,6 +1,10 @@
 ﻿from .user import User
+from .match_info import MatchInfo
+from .match_participant import MatchParticipant
 from .match import Match
 from .champion_mastery import ChampionMastery
 from .matchup_stats import MatchupStats
+from .matchup_daily_stats import MatchupDailyStats
+from .user_sync_cursor import UserSyncCursor
 
-__all__ = ["User", "Match", "ChampionMastery", "MatchupStats"]
+__all__ = ["User", "MatchInfo", "MatchParticipant", "Match", "ChampionMastery", "MatchupStats", "MatchupDailyStats", "UserSyncCursor"]
@@ -1,4 +1,4 @@
-﻿from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+﻿from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.utils.database import Base
@@ -6,6 +6,9 @@ from app.utils.database import Base
 
 class ChampionMastery(Base):
     __tablename__ = "champion_mastery"
+    __table_args__ = (
+        Index("uq_champion_mastery_user_champion", "user_id", "champion_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
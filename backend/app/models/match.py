@@ -1,43 +1,59 @@
-﻿from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text
-from sqlalchemy.sql import func
+﻿from sqlalchemy import select
 from sqlalchemy.orm import relationship
 from app.utils.database import Base
+from app.models.user import User
+from app.models.match_info import MatchInfo
+from app.models.match_participant import MatchParticipant
+
+
+# Per-user view of the shared match tables: one row for every participant who is a user.
+# Postgres inlines the subquery, so filters on user_id and game_creation still use the
+# participant and match_info indexes.
+matches_view = (
+    select(
+        MatchParticipant.id.label("id"),
+        MatchParticipant.match_id.label("match_id"),
+        User.id.label("user_id"),
+        
+        # Match details
+        MatchParticipant.champion,
+        MatchParticipant.opponent_champion,
+        MatchParticipant.team_position,
+        MatchParticipant.win,
+        MatchInfo.game_duration,  # in minutes
+        MatchInfo.queue_id,
+        MatchInfo.game_mode,
+        
+        # Performance stats
+        MatchParticipant.kills,
+        MatchParticipant.deaths,
+        MatchParticipant.assists,
+        MatchParticipant.cs_per_min,
+        MatchParticipant.gold_per_min,
+        MatchParticipant.kill_participation,
+        MatchParticipant.damage_to_champs_per_min,
+        
+        # Timestamps
+        MatchInfo.game_creation,
+        MatchParticipant.created_at,
+    )
+    .join(MatchInfo, MatchInfo.match_id == MatchParticipant.match_id)
+    .join(User, User.puuid == MatchParticipant.puuid)
+    .subquery("matches")
+)
 
 
 class Match(Base):
-    __tablename__ = "matches"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    match_id = Column(String(50), unique=True, nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    
-    # Match details
-    champion = Column(String(50), nullable=False)
-    opponent_champion = Column(String(50), nullable=True)
-    team_position = Column(String(20), nullable=False)
-    win = Column(Boolean, nullable=False)
-    game_duration = Column(Float, nullable=False)  # in minutes
-    queue_id = Column(Integer, nullable=True)
-    game_mode = Column(String(50), nullable=True)
-    # Performance stats
-    kills = Column(Integer, nullable=False)
-    deaths = Column(Integer, nullable=False)
-    assists = Column(Integer, nullable=False)
-    cs_per_min = Column(Float, nullable=False)
-    gold_per_min = Column(Float, nullable=False)
-    kill_participation = Column(Float, nullable=False)
-    damage_to_champs_per_min = Column(Float, nullable=False)
-    
-    # Game mode and queue info
-    queue_id = Column(Integer, nullable=True)
-    game_mode = Column(String(50), nullable=True)
-    
-    # Timestamps
-    game_creation = Column(DateTime(timezone=True), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    """Read-only, per-user match rows served from MatchParticipant and MatchInfo.
+
+    Ingestion writes the shared tables (see app/services/match_ingestion.py); this mapping
+    keeps the Match-shaped queries used by the analytics and match history working.
+    """
+    __table__ = matches_view
+    __mapper_args__ = {"primary_key": [matches_view.c.id]}
     
     # Relationships
-    user = relationship("User", back_populates="matches")
+    user = relationship("User", primaryjoin="foreign(Match.user_id) == User.id", viewonly=True, back_populates="matches")
     
     def __repr__(self):
         return f"<Match(match_id='{self.match_id}', champion='{self.champion}', win={self.win})>"
@@ -0,0 +1,27 @@
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, true
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class MatchInfo(Base):
+    """One row per Riot match, shared by every participant we track"""
+    __tablename__ = "match_info"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    match_id = Column(String(50), unique=True, nullable=False, index=True)
+    
+    # Game details
+    queue_id = Column(Integer, nullable=True)
+    game_mode = Column(String(50), nullable=False)  # Derived from queue_id (get_game_mode)
+    game_duration = Column(Float, nullable=False)  # in minutes
+    game_version = Column(String(30), nullable=True)
+    # False for matches migrated from the per-user table, which only have the rows of
+    # players tracked at the time; ingestion refetches them to store everyone
+    participants_complete = Column(Boolean, nullable=False, server_default=true())
+    
+    # Timestamps
+    game_creation = Column(DateTime(timezone=True), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<MatchInfo(match_id='{self.match_id}', game_mode='{self.game_mode}')>"
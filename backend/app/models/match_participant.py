@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class MatchParticipant(Base):
+    """One row per player in a match (ten per MatchInfo), whether or not they are a user"""
+    __tablename__ = "match_participants"
+    __table_args__ = (
+        Index("uq_match_participants_match_puuid", "match_id", "puuid", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    match_id = Column(String(50), ForeignKey("match_info.match_id"), nullable=False)
+    puuid = Column(String(100), nullable=False, index=True)
+    team_id = Column(Integer, nullable=True)
+    
+    # Player details
+    champion = Column(String(50), nullable=False)
+    opponent_champion = Column(String(50), nullable=True)
+    team_position = Column(String(20), nullable=False)
+    win = Column(Boolean, nullable=False)
+    
+    # Performance stats
+    kills = Column(Integer, nullable=False)
+    deaths = Column(Integer, nullable=False)
+    assists = Column(Integer, nullable=False)
+    cs_per_min = Column(Float, nullable=False)
+    gold_per_min = Column(Float, nullable=False)
+    kill_participation = Column(Float, nullable=False)
+    damage_to_champs_per_min = Column(Float, nullable=False)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<MatchParticipant(match_id='{self.match_id}', champion='{self.champion}', win={self.win})>"
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, Date
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class MatchupDailyStats(Base):
+    """Per-user matchup totals for one UTC day of play, maintained on ingest.
+
+    Same running sums as MatchupStats, split by the day the games were played, so any
+    date window is answered by summing the rollup rows in that range.
+    """
+    __tablename__ = "matchup_daily_stats"
+    __table_args__ = (
+        Index(
+            "uq_matchup_daily_stats_key",
+            "user_id", "day", "champion", "opponent_champion", "team_position", "game_mode",
+            unique=True,
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    champion = Column(String(50), nullable=False)
+    opponent_champion = Column(String(50), nullable=False)
+    team_position = Column(String(20), nullable=False)
+    game_mode = Column(String(50), nullable=False)
+    
+    # Statistics
+    games_played = Column(Integer, nullable=False)
+    wins = Column(Integer, nullable=False)
+    
+    # Running totals (divide by games_played for averages)
+    total_kills = Column(Integer, nullable=False)
+    total_deaths = Column(Integer, nullable=False)
+    total_assists = Column(Integer, nullable=False)
+    total_cs_per_min = Column(Float, nullable=False)
+    total_gold_per_min = Column(Float, nullable=False)
+    total_damage_per_min = Column(Float, nullable=False)
+    total_game_duration = Column(Float, nullable=False)  # in minutes
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<MatchupDailyStats(day={self.day}, champion='{self.champion}', vs='{self.opponent_champion}', games={self.games_played})>"
@@ -1,34 +1,47 @@
-﻿from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+﻿from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.utils.database import Base
 
 
 class MatchupStats(Base):
+    """Per-user matchup totals, maintained incrementally as matches are ingested.
+
+    Stores running sums (not averages) so a new batch of games is folded in with a single
+    additive upsert; averages are derived at read time as total / games_played.
+    """
     __tablename__ = "matchup_stats"
+    __table_args__ = (
+        Index(
+            "uq_matchup_stats_key",
+            "user_id", "champion", "opponent_champion", "team_position", "game_mode",
+            unique=True,
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     champion = Column(String(50), nullable=False)
     opponent_champion = Column(String(50), nullable=False)
     team_position = Column(String(20), nullable=False)
+    game_mode = Column(String(50), nullable=False)
     
     # Statistics
     games_played = Column(Integer, nullable=False)
     wins = Column(Integer, nullable=False)
-    losses = Column(Integer, nullable=False)
-    win_rate = Column(Float, nullable=False)
     
-    # Average performance
-    avg_kills = Column(Float, nullable=False)
-    avg_deaths = Column(Float, nullable=False)
-    avg_assists = Column(Float, nullable=False)
-    avg_cs_per_min = Column(Float, nullable=False)
-    avg_damage_per_min = Column(Float, nullable=False)
+    # Running totals (divide by games_played for averages)
+    total_kills = Column(Integer, nullable=False)
+    total_deaths = Column(Integer, nullable=False)
+    total_assists = Column(Integer, nullable=False)
+    total_cs_per_min = Column(Float, nullable=False)
+    total_gold_per_min = Column(Float, nullable=False)
+    total_damage_per_min = Column(Float, nullable=False)
+    total_game_duration = Column(Float, nullable=False)  # in minutes
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     def __repr__(self):
-        return f"<MatchupStats(champion='{self.champion}', vs='{self.opponent_champion}', win_rate={self.win_rate}%)>"
+        return f"<MatchupStats(champion='{self.champion}', vs='{self.opponent_champion}', games={self.games_played}, wins={self.wins})>"
@@ -16,7 +16,7 @@ class User(Base):
     last_updated = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
-    matches = relationship("Match", back_populates="user")
+    matches = relationship("Match", primaryjoin="User.id == foreign(Match.user_id)", viewonly=True, back_populates="user")
     champion_mastery = relationship("ChampionMastery", back_populates="user")
     
     def __repr__(self):
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, BigInteger, Boolean
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class UserSyncCursor(Base):
+    """How far a user's match history has been synced from Riot, in both directions"""
+    __tablename__ = "user_sync_cursors"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    
+    # Newest ingested game (epoch seconds); refreshes only ask Riot for games after it
+    newest_game_start = Column(BigInteger, nullable=True)
+    
+    # Backfill checkpoint: everything newer than this (epoch seconds) has been listed
+    backfill_end_time = Column(BigInteger, nullable=True)
+    backfill_complete = Column(Boolean, nullable=False, default=False, server_default='false')
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_updated = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<UserSyncCursor(user_id={self.user_id}, newest={self.newest_game_start}, backfill_end={self.backfill_end_time})>"
@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class CacheBackend:
+    """Key-value storage behind CacheService.
+
+    Values are encoded bytes and TTLs are in seconds. `shared` says whether every worker
+    sees the same data and invalidation messages, which the in-process L1 relies on.
+    """
+
+    name = ""
+    shared = False
+
+    def get_many(self, keys: List[str], with_ttl: bool = False) -> List[Tuple[Optional[bytes], int]]:
+        """(value, remaining TTL) per key, value None for missing keys. The TTL is only read
+        with_ttl (0 otherwise)"""
+        raise NotImplementedError
+
+    def set_many(self, items: Dict[str, bytes], ttl: int):
+        raise NotImplementedError
+
+    def delete_many(self, keys: List[str]) -> int:
+        raise NotImplementedError
+
+    def incr_many(self, keys: List[str], ttl: int):
+        """Increment integer counters (created at 1) and reset their TTL"""
+        raise NotImplementedError
+
+    def lock(self, key: str, timeout: int):
+        """Lock object with acquire(blocking=False) and release(), held for at most timeout"""
+        raise NotImplementedError
+
+    def publish(self, channel: str, message: str):
+        pass
+
+    def subscribe(self, channel: str, handler: Callable, error_handler: Callable):
+        """Start a listener thread for channel, or return None if messages are not supported"""
+        return None
+
+
+class RedisBackend(CacheBackend):
+    """Shared cache in Redis; every multi-key operation is one pipelined round trip"""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_many(self, keys: List[str], with_ttl: bool = False) -> List[Tuple[Optional[bytes], int]]:
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+            if with_ttl:
+                pipe.ttl(key)
+        results = pipe.execute()
+        if not with_ttl:
+            return [(raw, 0) for raw in results]
+        return list(zip(results[0::2], results[1::2]))
+
+    def set_many(self, items: Dict[str, bytes], ttl: int):
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.setex(key, ttl, value)
+        pipe.execute()
+
+    def delete_many(self, keys: List[str]) -> int:
+        return int(self.client.delete(*keys))
+
+    def incr_many(self, keys: List[str], ttl: int):
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(key)
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def lock(self, key: str, timeout: int):
+        return self.client.lock(key, timeout=timeout)
+
+    def publish(self, channel: str, message: str):
+        self.client.publish(channel, message)
+
+    def subscribe(self, channel: str, handler: Callable, error_handler: Callable):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: handler})
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=error_handler)
+
+
+class LocalBackend(CacheBackend):
+    """Cache in a SQLite file on local disk, used while Redis is unreachable.
+
+    Shared by the workers on one host (WAL mode, one connection per thread) and kept
+    across restarts; the file is created on first use. Expired rows are never returned;
+    when the file's live pages exceed max_bytes the least recently read rows are
+    evicted. Increments of counters are logged so they can be replayed into Redis when
+    it comes back.
+    """
+
+    name = "local"
+    shared = False
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self._created = False
+        self._create_lock = threading.Lock()
+
+    def _create(self, db: sqlite3.Connection):
+        with self._create_lock:
+            if self._created:
+                return
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+                CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS increments (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL);
+            """)
+            self._created = True
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._create(db)
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction holding the file's write lock from the start. Connections are
+        in autocommit mode, so without it every statement would commit on its own."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def get_many(self, keys: List[str], with_ttl: bool = False) -> List[Tuple[Optional[bytes], int]]:
+        now = time.time()
+        db = self._db()
+        placeholders = ",".join("?" * len(keys))
+        rows = {
+            key: (value, expires_at)
+            for key, value, expires_at in db.execute(
+                f"SELECT key, value, expires_at FROM entries WHERE key IN ({placeholders}) AND expires_at > ?",
+                (*keys, now),
+            )
+        }
+        if rows:
+            db.execute(f"UPDATE entries SET accessed_at = ? WHERE key IN ({','.join('?' * len(rows))})", (now, *rows))
+        return [
+            (bytes(rows[key][0]), max(1, int(rows[key][1] - now)) if with_ttl else 0)
+            if key in rows else (None, -2 if with_ttl else 0)
+            for key in keys
+        ]
+
+    def set_many(self, items: Dict[str, bytes], ttl: int):
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(key, value, now + ttl, now) for key, value in items.items()],
+            )
+        self._writes += len(items)
+        if self._writes >= 100:
+            self._writes = 0
+            self._evict()
+
+    def delete_many(self, keys: List[str]) -> int:
+        with self._transaction() as db:
+            return db.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(keys))})", keys).rowcount
+
+    def incr_many(self, keys: List[str], ttl: int):
+        now = time.time()
+        with self._transaction() as db:
+            # Counters are stored as decimal text, like Redis; an expired one restarts at 1
+            db.executemany(
+                "INSERT INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "value = CASE WHEN expires_at > excluded.accessed_at "
+                "THEN CAST(CAST(value AS INTEGER) + 1 AS BLOB) ELSE excluded.value END, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                [(key, b"1", now + ttl, now) for key in keys],
+            )
+            db.executemany("INSERT INTO increments (key) VALUES (?)", [(key,) for key in keys])
+
+    def pending_increments(self) -> Tuple[int, List[str]]:
+        """Counters incremented here and not yet replayed elsewhere: (last increment id, keys)"""
+        rows = self._db().execute("SELECT id, key FROM increments ORDER BY id").fetchall()
+        return (rows[-1][0] if rows else 0), list(dict.fromkeys(key for _, key in rows))
+
+    def forget_increments(self, up_to: int):
+        """Drop replayed increments; ones made since pending_increments() are kept"""
+        with self._transaction() as db:
+            db.execute("DELETE FROM increments WHERE id <= ?", (up_to,))
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM entries")
+
+    def lock(self, key: str, timeout: int):
+        return _LocalLock(self, key, timeout)
+
+    def _evict(self):
+        db = self._db()
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        used = (db.execute("PRAGMA page_count").fetchone()[0] - db.execute("PRAGMA freelist_count").fetchone()[0]) * page_size
+        if used <= self.max_bytes:
+            return
+        with self._transaction() as db:
+            db.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            # Then the least recently read quarter, which leaves room for a while
+            db.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT "
+                "(SELECT COUNT(*) / 4 FROM entries))"
+            )
+
+
+class _LocalLock:
+    """Expiring lock row, shared by the processes using the same SQLite file"""
+
+    def __init__(self, backend: LocalBackend, key: str, timeout: int):
+        self.backend = backend
+        self.key = key
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    def acquire(self, blocking: bool = False) -> bool:
+        now = time.time()
+        with self.backend._transaction() as db:
+            db.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (self.key, now))
+            return db.execute(
+                "INSERT OR IGNORE INTO locks (key, token, expires_at) VALUES (?, ?, ?)",
+                (self.key, self.token, now + self.timeout),
+            ).rowcount == 1
+
+    def release(self):
+        with self.backend._transaction() as db:
+            db.execute("DELETE FROM locks WHERE key = ? AND token = ?", (self.key, self.token))
@@ -0,0 +1,100 @@
+import threading
+from typing import Any, Dict
+import msgpack
+import orjson
+import zstandard
+from config.settings import settings
+
+
+class Codec:
+    """Serializes cache values to bytes; `header` is the first byte of every encoded value"""
+
+    name = ""
+    header = b""
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, payload: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = "orjson"
+    header = b"\x01"
+
+    def encode(self, value: Any) -> bytes:
+        # Non-string keys are stringified, as json.dumps did for the legacy format
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, payload: bytes) -> Any:
+        return orjson.loads(payload)
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    header = b"\x02"
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, payload: bytes) -> Any:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+class ZstdMsgpackCodec(MsgpackCodec):
+    """msgpack compressed with zstd, for large documents such as match histories"""
+
+    name = "zstd_msgpack"
+    header = b"\x03"
+
+    def __init__(self, level: int):
+        self.level = level
+        self._local = threading.local()  # zstd contexts are not thread-safe
+
+    def _contexts(self):
+        local = self._local
+        if not hasattr(local, "compressor"):
+            local.compressor = zstandard.ZstdCompressor(level=self.level)
+            local.decompressor = zstandard.ZstdDecompressor()
+        return local.compressor, local.decompressor
+
+    def encode(self, value: Any) -> bytes:
+        compressor, _ = self._contexts()
+        return compressor.compress(super().encode(value))
+
+    def decode(self, payload: bytes) -> Any:
+        _, decompressor = self._contexts()
+        return super().decode(decompressor.decompress(payload))
+
+
+CODECS: Dict[str, Codec] = {
+    codec.name: codec
+    for codec in (JsonCodec(), MsgpackCodec(), ZstdMsgpackCodec(settings.CACHE_ZSTD_LEVEL))
+}
+_BY_HEADER = {codec.header[0]: codec for codec in CODECS.values()}
+_LEGACY = CODECS["orjson"]
+
+
+def encode(value: Any, codec: str) -> bytes:
+    """Header byte followed by the value encoded with the named codec"""
+    codec = CODECS[codec]
+    return codec.header + codec.encode(value)
+
+
+def decode(raw: bytes) -> Any:
+    """Decode a value written by encode, or a headerless JSON value from before codecs
+    (JSON text never starts with a control byte, so the two cannot be confused)"""
+    codec = _BY_HEADER.get(raw[0])
+    if codec is None:
+        return _LEGACY.decode(raw)
+    return codec.decode(memoryview(raw)[1:])
+
+
+def decoded_size(raw: bytes) -> int:
+    """Approximate in-memory weight of an encoded value: its uncompressed payload size"""
+    if raw[:1] == CODECS["zstd_msgpack"].header:
+        size = zstandard.frame_content_size(raw[1:])
+        if size > 0:
+            return size
+    return len(raw)
@@ -1,73 +1,590 @@
 ﻿import json
-from typing import Any, Optional
-from app.utils.database import get_redis
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import redis
+from app.services import cache_codecs
+from app.services.cache_backends import CacheBackend, LocalBackend, RedisBackend
+from app.utils.database import connect_redis, get_redis_binary
+from config.settings import settings
+
+# Pub/sub channel carrying L1 invalidations between workers
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+_MISSING = object()
+_ABSENT = object()  # Known not to be in Redis (recorded in request batches)
+
+# Values read or written during the current request (see CacheService.batch)
+_batch: ContextVar[Optional[Dict[str, Any]]] = ContextVar("cache_batch", default=None)
+
+
+def key_namespace(key: str) -> str:
+    """Namespace of a cache key for L1 TTLs: its first segment, or the segment after the
+    user id and data version for per-user keys ("user:<id>:v<version>:<namespace>:...")"""
+    parts = key.split(":", 4)
+    if parts[0] == "user" and len(parts) > 2:
+        if len(parts) > 3 and parts[2][:1] == "v" and parts[2][1:].isdigit():
+            return parts[3]
+        return parts[2]
+    return parts[0]
+
+
+class LocalCache:
+    """In-process LRU of decoded cache values with per-namespace TTLs.
+    
+    Memory is bounded by the total size of the values' serialized form. Values are
+    shared between callers, so they must be treated as read-only.
+    """
+    
+    def __init__(self, max_bytes: int, default_ttl: int, namespace_ttls: Dict[str, int]):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.namespace_ttls = namespace_ttls
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+    
+    def ttl_for(self, key: str, ttl: int) -> int:
+        """L1 lifetime of a key: its namespace TTL, never longer than the Redis TTL"""
+        return min(ttl, self.namespace_ttls.get(key_namespace(key), self.default_ttl))
+    
+    def get(self, key: str) -> Any:
+        """Cached value, or _MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return _MISSING
+            expires_at, value, size = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+    
+    def set(self, key: str, value: Any, size: int, ttl: int):
+        ttl = self.ttl_for(key, ttl)
+        if ttl <= 0 or size > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.stats["evictions"] += 1
+    
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._bytes -= entry[2]
+            self.stats["invalidations"] += 1
+            return True
+    
+    def clear(self):
+        with self._lock:
+            self.stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+    
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes}
 
 
 class CacheService:
-    def __init__(self):
-        self.redis_client = get_redis()
-        self.enabled = self.redis_client is not None
+    """Two-tier cache: an in-process L1 (LocalCache) in front of Redis.
+    
+    Values are stored in Redis in the binary format chosen per namespace (see
+    cache_codecs and CACHE_CODECS); the header byte lets any format be read back.
+    
+    Reads served from L1 touch neither the network nor the JSON decoder. Every write or
+    delete is published on INVALIDATION_CHANNEL so the other workers drop their L1 copy;
+    a read racing with another worker's write can keep the old value for at most its
+    namespace's L1 TTL.
+    L1 is only used while Redis is available, because invalidation depends on it.
+    
+    When Redis cannot be reached (at startup or later), the cache switches to a SQLite
+    file on local disk (LocalBackend, CACHE_LOCAL_PATH) and a background thread retries
+    Redis every CACHE_REDIS_RETRY_SECONDS. On reconnecting, user version bumps made
+    locally are replayed into Redis, so documents cached there before the outage are not
+    served for users whose data changed during it.
+    """
+    
+    def __init__(self, redis_client=None):
+        redis_client = redis_client if redis_client is not None else get_redis_binary()
+        self.backend: Optional[CacheBackend] = RedisBackend(redis_client) if redis_client is not None else None
+        self.worker_id = uuid.uuid4().hex
+        self.l1 = None
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+        self._flights: Dict[str, list] = {}  # key -> [lock, callers] for single-flight
+        self._flights_lock = threading.Lock()
+        self._pubsub_thread = None
+        self._local_backend: Optional[LocalBackend] = None
+        self._switch_lock = threading.Lock()
+        self._reconnecting = False
+        if self.backend is not None:
+            self._start_l1()
+        elif settings.CACHE_LOCAL_FALLBACK_ENABLED:
+            self._fall_back("not connected")
+    
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+    
+    def _start_l1(self):
+        if not settings.CACHE_L1_ENABLED:
+            return
+        self.l1 = LocalCache(settings.CACHE_L1_MAX_BYTES, settings.CACHE_L1_DEFAULT_TTL, settings.CACHE_L1_TTLS)
+        self._subscribe()
+    
+    def _stop_l1(self):
+        self.l1 = None
+        if self._pubsub_thread is not None:
+            self._pubsub_thread.stop()
+            self._pubsub_thread = None
+    
+    def _subscribe(self):
+        """Listen for other workers' invalidations on a background thread"""
+        try:
+            self._pubsub_thread = self.backend.subscribe(
+                INVALIDATION_CHANNEL, self._on_invalidation, self._on_pubsub_error
+            )
+        except Exception as e:
+            print(f"Cache invalidation subscribe error (L1 disabled): {e}")
+            self._pubsub_thread = None
+        if self._pubsub_thread is None:
+            self.l1 = None
+    
+    def _on_invalidation(self, message):
+        try:
+            data = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        if data.get("sender") == self.worker_id or self.l1 is None:
+            return
+        for key in data.get("keys", []):
+            self.l1.delete(key)
+    
+    def _on_pubsub_error(self, error, pubsub, thread):
+        # Invalidations may have been missed while disconnected; the subscription is
+        # restored on the next poll
+        print(f"Cache invalidation listener error: {error}")
+        if self.l1 is not None:
+            self.l1.clear()
+        if self._is_connection_error(error):
+            self._fall_back(error)
+        time.sleep(1.0)
+    
+    def _publish_invalidation(self, keys):
+        if self.l1 is None:
+            return
+        message = {"sender": self.worker_id, "keys": list(keys)}
+        try:
+            self.backend.publish(INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            print(f"Cache invalidation publish error: {e}")
+    
+    @staticmethod
+    def _is_connection_error(error: BaseException) -> bool:
+        return isinstance(error, (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError))
+    
+    def _call(self, action: str, op: Callable[[CacheBackend], Any], default: Any = None) -> Any:
+        """op(backend), or default if it fails. When Redis is unreachable, switches to the
+        local fallback and runs op there instead."""
+        backend = self.backend
+        if backend is None:
+            return default
+        try:
+            return op(backend)
+        except Exception as e:
+            print(f"Cache {action} error: {e}")
+            self.stats["errors"] += 1
+            if backend.shared and self._is_connection_error(e) and self._fall_back(e):
+                return self._call(action, op, default)
+            return default
+    
+    def _fall_back(self, error) -> bool:
+        """Switch to the local backend until Redis answers again; returns whether the
+        cache is now using it"""
+        if not settings.CACHE_LOCAL_FALLBACK_ENABLED:
+            return False
+        with self._switch_lock:
+            if self.backend is not None and not self.backend.shared:
+                return True
+            self._stop_l1()
+            try:
+                if self._local_backend is None:
+                    self._local_backend = LocalBackend(settings.CACHE_LOCAL_PATH, settings.CACHE_LOCAL_MAX_BYTES)
+                self.backend = self._local_backend
+                print(f" Redis unavailable ({error}); caching in {settings.CACHE_LOCAL_PATH} until it is back")
+            except Exception as e:
+                print(f" Cache fallback failed (caching disabled until Redis is back): {e}")
+                self.backend = None
+            if not self._reconnecting:
+                self._reconnecting = True
+                threading.Thread(target=self._reconnect, daemon=True).start()
+            return self.backend is not None
+    
+    def _reconnect(self):
+        """Retry Redis in the background and switch back to it once it answers"""
+        while True:
+            time.sleep(settings.CACHE_REDIS_RETRY_SECONDS)
+            local = self._local_backend
+            try:
+                backend = RedisBackend(connect_redis(decode_responses=False))
+                if local is not None:
+                    self._replay_increments(local, backend)
+            except Exception:
+                continue
+            
+            with self._switch_lock:
+                self.backend = backend
+                self._reconnecting = False
+                if local is not None:
+                    # Bumps made locally between the replay above and the switch
+                    try:
+                        self._replay_increments(local, backend)
+                    except Exception as e:
+                        print(f"Cache version replay error (retried on the next reconnect): {e}")
+                self._start_l1()
+            if local is not None:
+                # Versions kept locally are unrelated to Redis ones; the next outage starts afresh
+                try:
+                    local.clear()
+                except Exception as e:
+                    print(f"Cache fallback clear error: {e}")
+            print(" Reconnected to Redis")
+            return
+    
+    @staticmethod
+    def _replay_increments(local: LocalBackend, backend: CacheBackend):
+        """Apply the counter increments logged by the local backend to backend"""
+        up_to, keys = local.pending_increments()
+        if keys:
+            backend.incr_many(keys, settings.CACHE_USER_VERSION_TTL)
+        local.forget_increments(up_to)
+    
+    def codec_for(self, key: str) -> str:
+        return settings.CACHE_CODECS.get(key_namespace(key), settings.CACHE_CODEC_DEFAULT)
+    
+    @contextmanager
+    def batch(self):
+        """Request-scoped read batch.
+        
+        Inside the block, values loaded with prefetch() (and every key read or written)
+        are remembered, so services reading the same keys cost no further round trips.
+        """
+        token = _batch.set({})
+        try:
+            yield
+        finally:
+            _batch.reset(token)
+    
+    def prefetch(self, keys: Iterable[str]):
+        """Load keys into the current batch with one pipelined round trip"""
+        batch = _batch.get()
+        if batch is None:
+            return
+        self.get_many([key for key in keys if key not in batch])
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
-        if not self.enabled:
-            return None
+        return self.get_many([key]).get(key)
+    
+    def get_many(self, keys: Iterable[str], use_batch: bool = True) -> Dict[str, Any]:
+        """Values of every cached key among keys, reading Redis at most once (pipelined)"""
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled or not keys:
+            return {}
+        
+        batch = _batch.get() if use_batch else None
+        values = {}
+        remaining = []
+        for key in keys:
+            value = batch.get(key, _MISSING) if batch is not None else _MISSING
+            if value is _MISSING and self.l1 is not None:
+                value = self.l1.get(key)
+            if value is _ABSENT:
+                continue
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                values[key] = value
+        if not remaining:
+            return values
         
+        # The remaining Redis TTL caps the L1 lifetime; fetched in the same round trip
+        l1 = self.l1
+        results = self._call("get", lambda backend: backend.get_many(remaining, with_ttl=l1 is not None))
+        if results is None:
+            return values
+        
+        for key, (raw, ttl) in zip(remaining, results):
+            if raw:
+                value = self._decode(key, raw)
+            else:
+                self.stats["misses"] += 1
+                value = _MISSING
+            if batch is not None:
+                batch[key] = _ABSENT if value is _MISSING else value
+            if value is _MISSING:
+                continue
+            values[key] = value
+            if l1 is not None and ttl > 0:
+                l1.set(key, value, cache_codecs.decoded_size(raw), ttl)
+        return values
+    
+    def _decode(self, key: str, raw: bytes) -> Any:
+        """Decoded value, or _MISSING if it cannot be read"""
         try:
-            value = self.redis_client.get(key)
-            if value:
-                return json.loads(value)
-            return None
+            value = cache_codecs.decode(raw)
         except Exception as e:
-            print(f"Cache get error: {e}")
-            return None
+            print(f"Cache decode error for {key}: {e}")
+            self.stats["errors"] += 1
+            self.stats["misses"] += 1
+            return _MISSING
+        self.stats["hits"] += 1
+        return value
     
     def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
         """Set value in cache with TTL"""
-        if not self.enabled:
+        return self.set_many({key: value}, ttl)
+    
+    def set_many(self, items: Dict[str, Any], ttl: int = 3600) -> bool:
+        """Set several values with the same TTL in one pipelined round trip"""
+        if not self.enabled or not items:
             return False
         
         try:
-            serialized_value = json.dumps(value)
-            return self.redis_client.setex(key, ttl, serialized_value)
+            encoded = {key: cache_codecs.encode(value, self.codec_for(key)) for key, value in items.items()}
         except Exception as e:
             print(f"Cache set error: {e}")
+            self.stats["errors"] += 1
+            return False
+        if self._call("set", lambda backend: backend.set_many(encoded, ttl), default=_MISSING) is _MISSING:
             return False
+        
+        batch = _batch.get()
+        if batch is not None:
+            batch.update(items)
+        if self.l1 is not None:
+            for key, value in items.items():
+                self.l1.set(key, value, cache_codecs.decoded_size(encoded[key]), ttl)
+            self._publish_invalidation(keys=list(items))
+        return True
     
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
+        return self.delete_many([key]) > 0
+    
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Delete several keys with one DEL; returns how many existed"""
+        keys = list(keys)
+        if not self.enabled or not keys:
+            return 0
+        
+        batch = _batch.get()
+        if batch is not None:
+            batch.update(dict.fromkeys(keys, _ABSENT))
+        if self.l1 is not None:
+            for key in keys:
+                self.l1.delete(key)
+            self._publish_invalidation(keys=keys)
+        return self._call("delete", lambda backend: backend.delete_many(keys), default=0)
+    
+    def get_or_set(self, key: str, func, ttl: int = 3600, stale_ttl: int = 0) -> Any:
+        """Get from cache or set using function, computing each key once at a time.
+        
+        - Concurrent misses are single-flighted: one caller per process computes while the
+          others wait for its result, and a short Redis lock does the same across workers.
+        - Before expiry, callers refresh early with a probability that grows as expiry
+          nears and with how long func took (XFetch), so a hot key is usually recomputed
+          by one request before it expires instead of by all of them after.
+        - With stale_ttl, an expired value is still served for up to stale_ttl seconds
+          while one background thread recomputes it. func then runs outside the request,
+          so it must not use request-scoped resources such as the db session.
+        
+        Values are stored in an envelope with their expiry, so keys written here must
+        only be read through get_or_set.
+        """
         if not self.enabled:
-            return False
+            return func()
         
-        try:
-            return bool(self.redis_client.delete(key))
-        except Exception as e:
-            print(f"Cache delete error: {e}")
+        entry = self._get_entry(key)
+        if entry is not None:
+            now = time.time()
+            if now < entry["_exp"]:
+                if self._should_refresh_early(entry, now):
+                    value = self._refresh(key, func, ttl, stale_ttl, wait=False)
+                    if value is not _MISSING:
+                        return value
+                return entry["_v"]
+            if stale_ttl:
+                self._refresh_in_background(key, func, ttl, stale_ttl)
+                return entry["_v"]
+        
+        return self._refresh(key, func, ttl, stale_ttl, wait=True)
+    
+    def _get_entry(self, key: str, fresh: bool = False) -> Optional[Dict]:
+        """get_or_set envelope for key; fresh skips the request batch, e.g. while waiting
+        for another worker to store it"""
+        entry = self.get_many([key], use_batch=not fresh).get(key)
+        if isinstance(entry, dict) and "_v" in entry and "_exp" in entry:
+            return entry
+        return None
+    
+    def _should_refresh_early(self, entry: Dict, now: float) -> bool:
+        beta = settings.CACHE_EARLY_REFRESH_BETA
+        if beta <= 0:
             return False
+        # -log(U) is exponentially distributed: usually small, occasionally large
+        return now - entry.get("_dt", 0.0) * beta * math.log(1.0 - random.random()) >= entry["_exp"]
+    
+    @contextmanager
+    def _single_flight(self, key: str, blocking: bool):
+        """Per-key lock within this process; yields whether it was acquired"""
+        with self._flights_lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        acquired = flight[0].acquire(blocking=blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                flight[0].release()
+            with self._flights_lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    del self._flights[key]
     
-    def get_or_set(self, key: str, func, ttl: int = 3600) -> Any:
-        """Get from cache or set using function"""
-        cached_value = self.get(key)
-        if cached_value is not None:
-            return cached_value
+    def _refresh(self, key: str, func, ttl: int, stale_ttl: int, wait: bool) -> Any:
+        """Compute and store key unless another caller already is.
         
-        value = func()
-        if value is not None:
-            self.set(key, value, ttl)
-        return value
+        With wait, a caller that loses the race waits for the winner's value (computing
+        it itself if the winner takes longer than CACHE_LOCK_WAIT_SECONDS); without, it
+        returns _MISSING straight away.
+        """
+        with self._single_flight(key, blocking=wait) as acquired:
+            if not acquired:
+                return _MISSING
+            if wait:
+                # Another thread may have stored it while this one waited
+                entry = self._get_entry(key, fresh=True)
+                if entry is not None and time.time() < entry["_exp"]:
+                    return entry["_v"]
+            
+            try:
+                lock = self.backend.lock(f"lock:{key}", timeout=settings.CACHE_LOCK_TIMEOUT_SECONDS)
+                locked = lock.acquire(blocking=False)
+            except Exception as e:
+                print(f"Cache lock error: {e}")
+                lock, locked = None, True
+            
+            if not locked:
+                if not wait:
+                    return _MISSING
+                deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_SECONDS
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = self._get_entry(key, fresh=True)
+                    if entry is not None and time.time() < entry["_exp"]:
+                        return entry["_v"]
+            
+            try:
+                started = time.monotonic()
+                value = func()
+                if value is not None:
+                    entry = {"_v": value, "_exp": time.time() + ttl, "_dt": round(time.monotonic() - started, 4)}
+                    self.set(key, entry, ttl + stale_ttl)
+                return value
+            finally:
+                if lock is not None and locked:
+                    try:
+                        lock.release()
+                    except Exception:
+                        pass  # Expired while computing; another worker may hold it now
+    
+    def _refresh_in_background(self, key: str, func, ttl: int, stale_ttl: int):
+        if key in self._flights:
+            return
+        
+        def _run():
+            try:
+                self._refresh(key, func, ttl, stale_ttl, wait=False)
+            except Exception as e:
+                print(f"Cache background refresh error for {key}: {e}")
+        
+        threading.Thread(target=_run, daemon=True).start()
     
-    def clear_user_cache(self, puuid: str):
-        """Clear all cache entries for a user"""
+    def user_version(self, user_id: int) -> int:
+        """Current data version of a user (0 until their data first changes)"""
         if not self.enabled:
+            return 0
+        version = self.get(f"user:{user_id}:version")
+        return int(version) if version else 0
+    
+    def user_key(self, user_id: int, *parts) -> str:
+        """Cache key for a document derived from a user's data: "user:<id>:v<version>:<parts>".
+        
+        Bumping the version moves every reader to new keys at once; documents under old
+        versions are never read again and expire with their TTL.
+        """
+        return ":".join([f"user:{user_id}", f"v{self.user_version(user_id)}", *(str(part) for part in parts)])
+    
+    def bump_user_versions(self, user_ids: Iterable[int]):
+        """Invalidate everything cached from these users' data, with one INCR per user.
+        
+        Call after the transaction that changed their data has committed, so a reader that
+        sees the new version also sees the new rows.
+        """
+        keys = [f"user:{user_id}:version" for user_id in set(user_ids)]
+        if not self.enabled or not keys:
             return
         
-        try:
-            pattern = f"user:{puuid}:*"
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                self.redis_client.delete(*keys)
-        except Exception as e:
-            print(f"Cache clear error: {e}")
+        def _bump(backend: CacheBackend):
+            backend.incr_many(keys, settings.CACHE_USER_VERSION_TTL)
+            current = self.backend
+            if not backend.shared and current is not None and current is not backend:
+                # Redis came back while this ran, possibly after the replay; an extra
+                # bump only moves readers to a fresh key
+                current.incr_many(keys, settings.CACHE_USER_VERSION_TTL)
+        
+        self._call("version bump", _bump)
+        batch = _batch.get()
+        if batch is not None:
+            # Forget the old versions, so later user_key() calls in this request read the new ones
+            for key in keys:
+                batch.pop(key, None)
+        if self.l1 is not None:
+            for key in keys:
+                self.l1.delete(key)
+            self._publish_invalidation(keys)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters per tier, and which backend is in use"""
+        return {
+            "backend": self.backend.name if self.backend is not None else None,
+            "l1": self.l1.info() if self.l1 is not None else None,
+            "l2": dict(self.stats),
+        }
 
 
 # Global instance
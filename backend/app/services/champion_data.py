@@ -1,11 +1,15 @@
 import requests
 from typing import Dict, Optional
 
+# Data Dragon ids that differ from match-v5 championName
+_MATCH_NAME_OVERRIDES = {"Fiddlesticks": "FiddleSticks"}
+
 
 class ChampionDataService:
     def __init__(self):
         self.version: Optional[str] = None
         self.id_to_name: Dict[int, str] = {}
+        self.id_to_key: Dict[int, str] = {}  # Match-v5 championName, e.g. "MonkeyKing" for Wukong
 
     def _ensure_loaded(self):
         if self.id_to_name:
@@ -26,16 +30,19 @@ class ChampionDataService:
             ).json()
             # champion.json maps by champion name; each item has a string key "key" which is numeric ID
             mapping: Dict[int, str] = {}
+            keys: Dict[int, str] = {}
             for champ in data.get("data", {}).values():
                 try:
                     champ_id = int(champ.get("key"))
                     champ_name = champ.get("name")
                     if champ_id and champ_name:
                         mapping[champ_id] = champ_name
+                        keys[champ_id] = _MATCH_NAME_OVERRIDES.get(champ["id"], champ["id"])
                 except Exception:
                     continue
             if mapping:
                 self.id_to_name = mapping
+                self.id_to_key = keys
         except Exception:
             # leave mapping empty on failure
             pass
@@ -43,6 +50,11 @@ class ChampionDataService:
     def get_champion_name_by_id(self, champion_id: int) -> str:
         self._ensure_loaded()
         return self.id_to_name.get(champion_id, f"Champion {champion_id}")
+
+    def get_champion_key_by_id(self, champion_id: int) -> str:
+        """Name match-v5 uses for the champion (championName), which stored matches are keyed by"""
+        self._ensure_loaded()
+        return self.id_to_key.get(champion_id, f"Champion {champion_id}")
     
     def get_champion_image_url(self, champion_name: str) -> str:
         """Get champion image URL from Data Dragon CDN"""
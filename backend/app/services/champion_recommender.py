@@ -1,8 +1,13 @@
-﻿from typing import List, Dict
+﻿from typing import List, Dict, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
 from app.models.champion_mastery import ChampionMastery
+from app.services.champion_data import champion_data
+from app.services.match_columns import match_columns
+from app.services.match_ingestion import normalize_team_position
 from app.services.riot_api import riot_api
 from app.services.cache_service import cache
+from app.services.matchup_matrix import matchup_matrix
 from config.settings import settings
 
 
@@ -10,97 +15,177 @@ class ChampionRecommender:
     def __init__(self):
         self.cache_ttl = settings.CACHE_MATCHUP_DATA_TTL
     
+    def recommendations_cache_key(self, user_id: int, role: str = None, game_mode: str | None = None) -> str:
+        """Cache key of the recommendations for a role and game mode, for callers that prefetch it"""
+        return cache.user_key(user_id, "recommendations", role or 'all', game_mode or 'all')
+    
     def get_champion_recommendations(self, db: Session, user_id: int, difficult_matchups: List[str], role: str = None, game_mode: str | None = None) -> List[Dict]:
-        """Get champion recommendations based on difficult matchups"""
-        cache_key = f"user:{user_id}:recommendations:{role or 'all'}:{game_mode or 'all'}:{hash(tuple(difficult_matchups))}"
+        """Get champion recommendations based on difficult matchups.
+        
+        difficult_matchups must be the user's own for role and game_mode (as returned by
+        analyze_difficult_matchups): they follow from the user's data version, so the
+        cache key does not include them and can be prefetched before they are known.
+        """
+        cache_key = self.recommendations_cache_key(user_id, role, game_mode)
         
         def _get_recommendations():
-            # Get user's champion mastery from database
-            query = db.query(ChampionMastery).filter(ChampionMastery.user_id == user_id)
-            mastery_data = query.all()
+            # The user's whole champion pool, scored in one pass
+            mastery_data = db.query(
+                ChampionMastery.champion_id,
+                ChampionMastery.champion_name,
+                ChampionMastery.champion_points,
+                ChampionMastery.champion_level
+            ).filter(
+                ChampionMastery.user_id == user_id,
+                ChampionMastery.champion_points >= settings.RECOMMENDER_MIN_MASTERY_POINTS
+            ).all()
             
-            if not mastery_data:
+            if not mastery_data or not difficult_matchups:
                 return []
             
-            # Filter by role if specified (this would need champion role data)
-            if role:
-                # For now, we'll include all champions
-                pass
+            # Stored matches and the global matrix use match-v5 names ("MonkeyKing"), not
+            # the display names mastery rows carry ("Wukong")
+            champions = [champion_data.get_champion_key_by_id(m.champion_id) for m in mastery_data]
             
-            recommendations = []
+            # The user's own record with these champions against the difficult opponents
+            records = self._get_matchup_records(db, user_id, champions, difficult_matchups, role, game_mode)
             
-            for mastery in mastery_data[:20]:  # Top 20 champions by mastery
-                recommendation = self._analyze_champion_vs_matchups(
-                    mastery.champion_name, difficult_matchups, mastery, role
-                )
-                if recommendation:
-                    recommendations.append(recommendation)
-            
-            # Sort by counter effectiveness
-            recommendations.sort(key=lambda x: x['counter_win_rate'], reverse=True)
-            return recommendations[:5] 
+            return self._score_candidates(mastery_data, champions, difficult_matchups, role, records, limit=5)
         
         return cache.get_or_set(cache_key, _get_recommendations, self.cache_ttl)
     
-    def _analyze_champion_vs_matchups(self, champion: str, difficult_matchups: List[str], mastery: ChampionMastery, role: str | None) -> Dict:
-        """Analyze how well a champion counters difficult matchups"""
-        if not difficult_matchups:
-            return None
-            
-        total_win_rate = 0
-        matchup_count = 0
-        counters = []
-        
-        # Simulate win rate based on mastery and assume moderate counter ability
-        # This avoids slow web scraping calls that block the entire request
-        for opponent in difficult_matchups:
-            # Use mastery as a proxy for champion strength
-            # Higher mastery = better counter ability
-            base_win_rate = 50.0
-            
-            # Adjust based on mastery level
-            if mastery.champion_level >= 6:
-                win_rate = 52.0 + (mastery.champion_points / 100000) * 5  # Scale with points
-            elif mastery.champion_level >= 5:
-                win_rate = 51.0
-            else:
-                win_rate = 50.0
-            
-            # Assume this champion counters at least some matchups if mastery is high
-            if win_rate >= 50:
-                total_win_rate += win_rate
-                matchup_count += 1
-                counters.append(opponent)
+    def _get_matchup_records(self, db: Session, user_id: int, champions: List[str], opponents: List[str],
+                             role: str | None, game_mode: str | None) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        """(champion, opponent) -> (games, wins) from the user's games in the column store"""
+        if not champions or not opponents:
+            return {}
+        wanted_champions, wanted_opponents = set(champions), set(opponents)
+        groups = match_columns.get(db, user_id).aggregate(("champion", "opponent"), self._filters(role, game_mode))
+        return {
+            (group['champion'], group['opponent']): (group['games'], group['wins'])
+            for group in groups
+            if group['champion'] in wanted_champions and group['opponent'] in wanted_opponents
+        }
+    
+    def _filters(self, role: str | None, game_mode: str | None) -> Dict[str, str]:
+        """Column store filters for the optional role and game mode"""
+        filters = {}
+        if role:
+            filters['role'] = normalize_team_position(role)
+        if game_mode:
+            filters['game_mode'] = game_mode
+        return filters
+    
+    def _score_candidates(self, mastery_data: List, champions: List[str], opponents: List[str], role: str | None,
+                          records: Dict[Tuple[str, str], Tuple[int, int]], limit: int = 5) -> List[Dict]:
+        """Score every candidate champion against the difficult opponents at once.
+        
+        Each (candidate, opponent) win rate is the user's own record shrunk towards the
+        global matchup matrix, which is itself shrunk towards 50% when it has few games:
+        
+            prior = (global_wins + 0.5 * m) / (global_games + m)
+            rate  = (user_wins + prior * k) / (user_games + k)
+        
+        with m = MATCHUP_MATRIX_MIN_GAMES and k = RECOMMENDER_PRIOR_GAMES. A candidate's
+        counter win rate is its mean rate over the opponents; the ranking score adds a
+        comfort bonus of up to RECOMMENDER_MASTERY_WEIGHT points on a log scale of mastery.
         
-        # Only recommend champions that have sufficient mastery
-        if matchup_count == 0 or mastery.champion_points < 10000:
-            return None
+        champions are the match-v5 names of the mastery rows, which records and the
+        global matrix are keyed by; responses show the mastery display name.
+        """
+        points = np.array([m.champion_points for m in mastery_data], dtype=np.float64)
         
-        avg_win_rate = total_win_rate / matchup_count if matchup_count > 0 else 50.0
+        champion_index = {champion: i for i, champion in enumerate(champions)}
+        opponent_index = {opponent: j for j, opponent in enumerate(opponents)}
+        user_games = np.zeros((len(champions), len(opponents)))
+        user_wins = np.zeros((len(champions), len(opponents)))
+        for (champion, opponent), (games, wins) in records.items():
+            i, j = champion_index.get(champion), opponent_index.get(opponent)
+            if i is not None and j is not None:
+                user_games[i, j] = games
+                user_wins[i, j] = wins
         
+        matrix = matchup_matrix.get()
+        if matrix is not None:
+            global_games, global_wins = matrix.pair_counts(champions, opponents, role=role)
+        else:
+            global_games = global_wins = np.zeros((len(champions), len(opponents)))
+        
+        shrink = settings.MATCHUP_MATRIX_MIN_GAMES
+        prior = (global_wins + 0.5 * shrink) / (global_games + shrink)
+        k = settings.RECOMMENDER_PRIOR_GAMES
+        rates = (user_wins + prior * k) / (user_games + k)
+        
+        counter_win_rate = rates.mean(axis=1) * 100
+        comfort = np.log1p(points) / np.log1p(max(points.max(), 1.0))
+        scores = counter_win_rate + settings.RECOMMENDER_MASTERY_WEIGHT * comfort
+        
+        k_best = min(limit, len(champions))
+        top = np.argpartition(-scores, k_best - 1)[:k_best]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        
+        recommendations = []
+        for i in top:
+            countered = np.flatnonzero(rates[i] >= 0.5)
+            countered = countered[np.argsort(-rates[i, countered], kind="stable")]
+            mastery = mastery_data[i]
+            recommendations.append({
+                'champion': mastery.champion_name,
+                'mastery_points': mastery.champion_points,
+                'mastery_level': mastery.champion_level,
+                'counter_win_rate': round(float(counter_win_rate[i]), 1),
+                'games_vs_opponents': int(user_games[i].sum()),
+                'counters': [opponents[j] for j in countered[:5]],  # Limit to 5 counters for display
+                'reason': f"Strong against {len(countered)} of your {len(opponents)} difficult matchups"
+            })
+        return recommendations
+    
+    def get_similar_champions(self, db: Session, user_id: int, role: str = None, game_mode: str | None = None,
+                              best: int = 3, limit: int = 5, min_games: int = 5) -> Dict:
+        """Champions that play like the ones the user performs best on.
+        
+        The user's `best` champions (by win rate shrunk towards 50%, with at least
+        min_games games) are looked up in the precomputed similarity table; each neighbor
+        scores the sum of its similarity to them.
+        """
+        played = match_columns.get(db, user_id).aggregate(("champion",), self._filters(role, game_mode), min_games=min_games)
+        
+        k = settings.RECOMMENDER_PRIOR_GAMES
+        ranked = sorted(
+            ((group['champion'], (group['wins'] + 0.5 * k) / (group['games'] + k)) for group in played if group['champion']),
+            key=lambda x: (-x[1], x[0])
+        )[:best]
+        best_champions = [champion for champion, _ in ranked]
+        
+        matrix = matchup_matrix.get()
+        if matrix is None or not best_champions:
+            return {'based_on': best_champions, 'similar': []}
+        
+        scores: Dict[str, float] = {}
+        similar_to: Dict[str, List[str]] = {}
+        for champion in best_champions:
+            for entry in matrix.similar(champion):
+                name = entry['champion']
+                if name in best_champions:
+                    continue
+                scores[name] = scores.get(name, 0.0) + entry['similarity']
+                similar_to.setdefault(name, []).append(champion)
+        
+        top = sorted(scores, key=lambda name: (-scores[name], name))[:limit]
         return {
-            'champion': champion,
-            'mastery_points': mastery.champion_points,
-            'mastery_level': mastery.champion_level,
-            'counter_win_rate': round(avg_win_rate, 1),
-            'games_vs_opponents': matchup_count,
-            'counters': counters[:5],  # Limit to 5 counters for display
-            'reason': f"Strong against {len(counters)} of your {len(difficult_matchups)} difficult matchups"
+            'based_on': best_champions,
+            'similar': [
+                {'champion': name, 'similarity': round(scores[name], 3), 'similar_to': similar_to[name]}
+                for name in top
+            ]
         }
     
-    def get_champion_counters(self, champion: str) -> List[Dict]:
-        """Get champions that counter a specific champion (using scraper)."""
-        cache_key = f"counters:{champion}"
-
-        def _get_counters():
-            try:
-                from app.services.scraper import get_champion_counters as scrape_counters
-                data = scrape_counters(champion)
-                return data or []
-            except Exception:
-                return []
-
-        return cache.get_or_set(cache_key, _get_counters, self.cache_ttl)
+    def get_champion_counters(self, champion: str, role: str = None) -> List[Dict]:
+        """Get champions that counter a specific champion (from the global matchup matrix)."""
+        matrix = matchup_matrix.get()
+        if matrix is None:
+            return []
+        return matrix.counters(champion, role=role)
 
 
 # Global instance
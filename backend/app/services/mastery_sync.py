@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.champion_mastery import ChampionMastery
+from app.models.user import User
+from app.services.champion_data import champion_data
+from app.services.cache_service import cache
+
+
+def sync_champion_mastery(db: Session, user: User, mastery_data: List[Dict]) -> int:
+    """Upsert a user's whole champion-mastery payload in a single statement.
+
+    Rows whose champion_points did not change are left untouched, so last_updated only
+    moves for champions that were actually played. Returns the number of rows inserted
+    or updated.
+    """
+    if not mastery_data:
+        return 0
+
+    rows = [
+        {
+            "user_id": user.id,
+            "champion_id": champ["championId"],
+            "champion_name": champion_data.get_champion_name_by_id(champ["championId"]),
+            "champion_level": champ["championLevel"],
+            "champion_points": champ["championPoints"],
+            "last_played": datetime.fromtimestamp(champ["lastPlayTime"] / 1000) if champ.get("lastPlayTime") else None,
+            "last_updated": func.now(),
+        }
+        for champ in mastery_data
+    ]
+
+    stmt = insert(ChampionMastery).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChampionMastery.user_id, ChampionMastery.champion_id],
+        set_={
+            "champion_name": stmt.excluded.champion_name,
+            "champion_level": stmt.excluded.champion_level,
+            "champion_points": stmt.excluded.champion_points,
+            "last_played": stmt.excluded.last_played,
+            "last_updated": func.now(),
+        },
+        where=ChampionMastery.champion_points.is_distinct_from(stmt.excluded.champion_points),
+    ).returning(ChampionMastery.id)
+
+    changed = len(db.execute(stmt).fetchall())
+    db.commit()
+    if changed:
+        cache.bump_user_versions([user.id])
+    return changed
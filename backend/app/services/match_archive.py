@@ -0,0 +1,200 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zstandard
+from typing import Dict, Iterator, List, Optional, Tuple
+from config.settings import settings
+
+# Index record: match id (NUL padded), offset and length of the compressed frame in the
+# segment, and a digest of the uncompressed JSON
+_INDEX_RECORD = struct.Struct("<32sQI16s")
+_SEGMENT_SUFFIX = ".seg"
+_INDEX_SUFFIX = ".idx"
+
+
+def content_digest(raw: bytes) -> bytes:
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def read_segment_index(index_path: str, start: int = 0) -> Iterator[Tuple[str, int, int, bytes]]:
+    """Yield (match_id, offset, length, digest) for every complete record after byte start"""
+    with open(index_path, "rb") as f:
+        f.seek(start)
+        data = f.read()
+    usable = len(data) - len(data) % _INDEX_RECORD.size
+    for raw_id, offset, length, digest in _INDEX_RECORD.iter_unpack(data[:usable]):
+        yield raw_id.rstrip(b"\0").decode(), offset, length, digest
+
+
+def iter_segment(segment_path: str) -> Iterator[Tuple[str, Dict]]:
+    """Yield (match_id, match_data) for every match stored in one segment file"""
+    decompressor = zstandard.ZstdDecompressor()
+    index_path = segment_path[:-len(_SEGMENT_SUFFIX)] + _INDEX_SUFFIX
+    with open(segment_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for match_id, offset, length, _ in read_segment_index(index_path):
+                if offset + length > len(mapped):
+                    break
+                yield match_id, json.loads(decompressor.decompress(mapped[offset:offset + length]))
+
+
+class MatchArchive:
+    """Append-only store of raw match-v5 JSON, keyed by match ID.
+
+    Each match is a separate zstd frame appended to a segment file, and a fixed-size record
+    in the segment's .idx file points at it. Every process writes to its own segments, so
+    several workers can share one directory; readers memory-map segments and pick up other
+    processes' writes on a miss. A miss lists the directory again only when its mtime has
+    changed and reads only index files that have grown; segments that reached
+    segment_bytes are never written again, so once indexed they are not even stat'ed.
+    Call close() at shutdown to release the file handles and maps.
+    """
+
+    def __init__(self, directory: str = None, segment_bytes: int = None, level: int = None):
+        self.directory = directory or settings.MATCH_ARCHIVE_DIR
+        self.segment_bytes = segment_bytes or settings.MATCH_ARCHIVE_SEGMENT_BYTES
+        self.level = level or settings.MATCH_ARCHIVE_COMPRESSION_LEVEL
+        self._index: Dict[str, Tuple[str, int, int]] = {}
+        self._index_offsets: Dict[str, int] = {}
+        self._segment_names: List[str] = []
+        self._directory_mtime: Optional[float] = None
+        self._frames_end: Dict[str, int] = {}  # End of the last indexed frame per segment
+        self._sealed: set = set()  # Full segments whose every frame has been indexed
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._segment = None
+        self._segment_index = None
+        self._segment_name: Optional[str] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def segment_paths(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+
+    def _refresh_index(self):
+        """Load index records written since the last scan (by this or any other process)"""
+        self._loaded = True
+        try:
+            directory_mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            return
+        if directory_mtime != self._directory_mtime:
+            # New segments only appear as new directory entries
+            self._directory_mtime = directory_mtime
+            self._segment_names = [
+                os.path.basename(path)[:-len(_SEGMENT_SUFFIX)] for path in self.segment_paths()
+            ]
+        for name in self._segment_names:
+            if name in self._sealed:
+                continue
+            base = os.path.join(self.directory, name)
+            try:
+                index_size = os.path.getsize(base + _INDEX_SUFFIX)
+            except OSError:
+                continue
+            start = self._index_offsets.get(name, 0)
+            if index_size > start:
+                count = 0
+                for match_id, offset, length, _ in read_segment_index(base + _INDEX_SUFFIX, start):
+                    self._index[match_id] = (name, offset, length)
+                    self._frames_end[name] = max(self._frames_end.get(name, 0), offset + length)
+                    count += 1
+                self._index_offsets[name] = start + count * _INDEX_RECORD.size
+            # A frame is written before its index record, so a full segment is only done
+            # once the indexed frames reach its end
+            frames_end = self._frames_end.get(name, 0)
+            if name != self._segment_name and frames_end >= self.segment_bytes and frames_end == os.path.getsize(base + _SEGMENT_SUFFIX):
+                self._sealed.add(name)
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_name = f"{int(time.time() * 1000)}-{os.getpid()}"
+        base = os.path.join(self.directory, self._segment_name)
+        self._segment = open(base + _SEGMENT_SUFFIX, "ab")
+        self._segment_index = open(base + _INDEX_SUFFIX, "ab")
+
+    def put(self, match_id: str, match_data: Dict) -> bool:
+        """Archive a match; returns False if it was already stored"""
+        raw = json.dumps(match_data, separators=(",", ":")).encode()
+        frame = zstandard.ZstdCompressor(level=self.level).compress(raw)
+        with self._lock:
+            if not self._loaded:
+                self._refresh_index()
+            if match_id in self._index:
+                return False
+            if self._segment is None or self._segment.tell() >= self.segment_bytes:
+                self._close_segment()
+                self._open_segment()
+            offset = self._segment.tell()
+            self._segment.write(frame)
+            self._segment.flush()
+            # The index record goes last, so readers never see a pointer to a partial frame
+            self._segment_index.write(_INDEX_RECORD.pack(match_id.encode(), offset, len(frame), content_digest(raw)))
+            self._segment_index.flush()
+            self._index[match_id] = (self._segment_name, offset, len(frame))
+            self._frames_end[self._segment_name] = offset + len(frame)
+            self._index_offsets[self._segment_name] = self._segment_index.tell()
+            return True
+
+    def _mapped(self, name: str, end: int) -> Optional[mmap.mmap]:
+        mapped = self._maps.get(name)
+        if mapped is None or len(mapped) < end:
+            # Segments grow while being written, so remap when a record lies past the old end
+            if mapped is not None:
+                mapped.close()
+            with open(os.path.join(self.directory, name + _SEGMENT_SUFFIX), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[name] = mapped
+        return mapped if len(mapped) >= end else None
+
+    def get(self, match_id: str) -> Optional[Dict]:
+        """Read an archived match, or None if it has never been archived"""
+        with self._lock:
+            location = self._index.get(match_id)
+            if location is None:
+                self._refresh_index()
+                location = self._index.get(match_id)
+            if location is None:
+                return None
+            name, offset, length = location
+            mapped = self._mapped(name, offset + length)
+            if mapped is None:
+                return None
+            frame = mapped[offset:offset + length]
+        return json.loads(zstandard.ZstdDecompressor().decompress(frame))
+
+    def __contains__(self, match_id: str) -> bool:
+        with self._lock:
+            if match_id not in self._index:
+                self._refresh_index()
+            return match_id in self._index
+
+    def _close_segment(self):
+        """Close the current segment; the next put starts a new one"""
+        for f in (self._segment, self._segment_index):
+            if f is not None:
+                f.close()
+        self._segment = self._segment_index = None
+
+    def close(self):
+        """Close the segment being written and unmap every segment (called on shutdown)"""
+        with self._lock:
+            self._close_segment()
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+
+# Global instance
+match_archive = MatchArchive()
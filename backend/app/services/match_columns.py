@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models.match import Match
+from app.services.cache_service import cache
+from config.settings import settings
+
+# Numeric Match columns and their array dtypes
+_NUMERIC_COLUMNS = {
+    "game_creation": np.int64,  # epoch seconds
+    "win": np.bool_,
+    "kills": np.int16,
+    "deaths": np.int16,
+    "assists": np.int16,
+    "cs_per_min": np.float32,
+    "gold_per_min": np.float32,
+    "damage_to_champs_per_min": np.float32,
+    "game_duration": np.float32,
+}
+
+# Dictionary-encoded string columns and the dictionary each one uses (champion and
+# opponent share one, so their codes are comparable)
+_ENCODED_COLUMNS = {
+    "champion": "champion",
+    "opponent_champion": "champion",
+    "team_position": "position",
+    "game_mode": "game_mode",
+}
+
+# Filter / group-by names accepted by aggregate, mapped to columns
+GROUP_FIELDS = {
+    "champion": "champion",
+    "opponent": "opponent_champion",
+    "role": "team_position",
+    "game_mode": "game_mode",
+}
+
+
+class ValueDictionary:
+    """Maps strings to small integer codes; code 0 is reserved for None"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[Optional[str], int] = {None: 0}
+        self._lock = threading.Lock()
+
+    def encode(self, values: Iterable[Optional[str]]) -> np.ndarray:
+        with self._lock:
+            codes = []
+            for value in values:
+                code = self.codes.get(value)
+                if code is None:
+                    code = self.codes[value] = len(self.values)
+                    self.values.append(value)
+                codes.append(code)
+        return np.array(codes, dtype=np.uint16)
+
+    def lookup(self, value: str) -> Optional[int]:
+        """Code for an existing value, or None if it has never been seen"""
+        return self.codes.get(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class UserMatchColumns:
+    """One user's match history as NumPy columns, reloaded whenever their data changes.
+
+    `columns` is replaced as a whole on every load, so readers take a consistent
+    snapshot by reading it once.
+    """
+
+    def __init__(self, dictionaries: Dict[str, ValueDictionary]):
+        self.dictionaries = dictionaries
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.empty(0, dtype=dtype) for name, dtype in _NUMERIC_COLUMNS.items()
+        }
+        self.columns.update({name: np.empty(0, dtype=np.uint16) for name in _ENCODED_COLUMNS})
+        self.version: Optional[int] = None  # User data version the columns were loaded at
+        self.refresh_at = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.columns.values())
+
+    def __len__(self) -> int:
+        return len(self.columns["win"])
+
+    def load(self, rows: Sequence):
+        """Replace the columns with these Match rows (columns in _NUMERIC/_ENCODED order)"""
+        names = list(_NUMERIC_COLUMNS) + list(_ENCODED_COLUMNS)
+        fields = list(zip(*rows)) if rows else [()] * len(names)
+        new = {}
+        for name, values in zip(names, fields):
+            if name in _NUMERIC_COLUMNS:
+                if name == "game_creation":
+                    values = [int(v.timestamp()) if v is not None else 0 for v in values]
+                array = np.array(values, dtype=_NUMERIC_COLUMNS[name])
+            else:
+                array = self.dictionaries[_ENCODED_COLUMNS[name]].encode(values)
+            new[name] = array
+        self.columns = new
+
+    def aggregate(self, group_by: Sequence[str] = ("opponent",), filters: Dict[str, str] = None,
+                  since: Optional[int] = None, until: Optional[int] = None, min_games: int = 1) -> List[Dict]:
+        """Group the user's games and total them, entirely with vectorized masks and bincount.
+
+        group_by and filters use the GROUP_FIELDS names; since/until are epoch seconds.
+        Returns one dict per group, most played first.
+        """
+        columns = self.columns
+        mask = np.ones(len(columns["win"]), dtype=bool)
+        for field, value in (filters or {}).items():
+            name = GROUP_FIELDS[field]
+            code = self.dictionaries[_ENCODED_COLUMNS[name]].lookup(value)
+            if code is None:
+                return []
+            mask &= columns[name] == code
+        if since is not None:
+            mask &= columns["game_creation"] >= since
+        if until is not None:
+            mask &= columns["game_creation"] < until
+
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return []
+
+        # Mixed-radix group key over the dictionary codes, then dense group ids
+        names = [GROUP_FIELDS[field] for field in group_by]
+        key = np.zeros(len(rows), dtype=np.int64)
+        for name in names:
+            key = key * len(self.dictionaries[_ENCODED_COLUMNS[name]]) + columns[name][rows]
+        _, first, group = np.unique(key, return_index=True, return_inverse=True)
+
+        games = np.bincount(group)
+        sums = {
+            name: np.bincount(group, weights=columns[name][rows])
+            for name in ("win", "kills", "deaths", "assists", "cs_per_min", "gold_per_min",
+                         "damage_to_champs_per_min", "game_duration")
+        }
+
+        results = []
+        for g in np.flatnonzero(games >= min_games):
+            n = int(games[g])
+            wins = int(sums["win"][g])
+            entry = {
+                field: self.dictionaries[_ENCODED_COLUMNS[name]].values[columns[name][rows[first[g]]]]
+                for field, name in zip(group_by, names)
+            }
+            entry.update({
+                'games': n,
+                'wins': wins,
+                'losses': n - wins,
+                'win_rate': round(wins / n * 100, 1),
+                'avg_kda': {
+                    'kills': round(sums["kills"][g] / n, 1),
+                    'deaths': round(sums["deaths"][g] / n, 1),
+                    'assists': round(sums["assists"][g] / n, 1),
+                },
+                'avg_cs_per_min': round(sums["cs_per_min"][g] / n, 2),
+                'avg_gold_per_min': round(sums["gold_per_min"][g] / n, 0),
+                'avg_damage_per_min': round(sums["damage_to_champs_per_min"][g] / n, 0),
+                'avg_game_duration_min': round(sums["game_duration"][g] / n, 1),
+            })
+            results.append(entry)
+        results.sort(key=lambda x: -x['games'])
+        return results
+
+
+class MatchColumnStore:
+    """LRU of per-user UserMatchColumns, bounded by the total bytes of their arrays.
+
+    An entry is reloaded in full when the user's data version (bumped by every worker
+    after ingesting or reprocessing their games) has moved since it was loaded, when
+    ingestion in this process marks the user stale, or refresh_seconds after the last
+    load in case versions are unavailable. Full reloads also pick up rows that were
+    committed out of id order or rewritten in place.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, refresh_seconds: Optional[float] = None):
+        self.max_bytes = max_bytes or settings.MATCH_COLUMNS_MAX_BYTES
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else settings.MATCH_COLUMNS_REFRESH_SECONDS
+        self.dictionaries = {name: ValueDictionary() for name in set(_ENCODED_COLUMNS.values())}
+        self._entries: "OrderedDict[int, UserMatchColumns]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> UserMatchColumns:
+        """Columns for a user, loaded or refreshed from the database if needed"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = self._entries[user_id] = UserMatchColumns(self.dictionaries)
+            self._entries.move_to_end(user_id)
+
+        # Read before loading: a bump after this read makes the next get reload again
+        version = cache.user_version(user_id)
+        with entry.lock:
+            now = time.monotonic()
+            if version != entry.version or now >= entry.refresh_at:
+                rows = db.query(
+                    *(getattr(Match, name) for name in list(_NUMERIC_COLUMNS) + list(_ENCODED_COLUMNS))
+                ).filter(Match.user_id == user_id).all()
+                entry.load(rows)
+                entry.version = version
+                entry.refresh_at = now + self.refresh_seconds
+
+        self._evict()
+        return entry
+
+    def mark_stale(self, user_ids: Iterable[int]):
+        """Make the next get for these users reload their games"""
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    entry.refresh_at = 0.0
+
+    def _evict(self):
+        with self._lock:
+            total = sum(entry.nbytes for entry in self._entries.values())
+            # Least recently used first; the entry just requested is never evicted
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, entry = self._entries.popitem(last=False)
+                total -= entry.nbytes
+
+
+# Global instance
+match_columns = MatchColumnStore()
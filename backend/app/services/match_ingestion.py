@@ -0,0 +1,303 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.match_info import MatchInfo
+from app.models.match_participant import MatchParticipant
+from app.models.user import User
+from app.services.cache_service import cache
+from app.services.match_archive import MatchArchive, match_archive
+from app.services.match_columns import match_columns
+from app.services.matchup_aggregates import apply_matchup_stats
+from app.services.riot_api import riot_api
+from config.settings import settings
+
+# Marks the end of the stream on every queue
+_DONE = object()
+
+
+def get_opponent_champion(match_data: dict, player_data: dict) -> Optional[str]:
+    """Get the opponent champion in the same lane"""
+    player_lane = player_data.get("teamPosition", "UNKNOWN")
+    player_team = player_data["teamId"]
+
+    # Find opponent in same lane
+    for participant in match_data["info"]["participants"]:
+        if (participant["teamId"] != player_team and
+                participant.get("teamPosition") == player_lane):
+            return participant["championName"]
+
+    return None
+
+
+def get_game_mode(queue_id: int) -> str:
+    """Convert queue ID to game mode name"""
+    queue_map = {
+        420: "Ranked Solo/Duo",
+        440: "Ranked Flex",
+        450: "ARAM",
+        700: "Clash",
+        900: "URF",
+        1020: "One for All",
+        1300: "Nexus Blitz",
+        1400: "Ultimate Spellbook",
+        1700: "Arena",
+        1900: "URF",
+        2000: "Tutorial",
+        2010: "Tutorial",
+        2020: "Tutorial"
+    }
+    return queue_map.get(queue_id, f"Queue {queue_id}")
+
+
+def normalize_team_position(pos: str) -> str:
+    if not pos:
+        return "UNKNOWN"
+    mapping = {
+        'MID': 'MIDDLE',
+        'ADC': 'BOTTOM',
+        'BOT': 'BOTTOM',
+        'SUPPORT': 'UTILITY',
+    }
+    up = pos.strip().upper()
+    return mapping.get(up, up)
+
+
+def build_match_rows(match_id: str, match_data: Dict) -> Tuple[Dict, List[Dict]]:
+    """Extract the MatchInfo row and all ten MatchParticipant rows from a match-v5 response"""
+    info = match_data["info"]
+    queue_id = info["queueId"]
+    duration_min = info["gameDuration"] / 60
+
+    info_row = {
+        "match_id": match_id,
+        "queue_id": queue_id,
+        "game_mode": get_game_mode(queue_id),
+        "game_duration": duration_min,
+        "game_version": info.get("gameVersion"),
+        "game_creation": datetime.fromtimestamp(info["gameCreation"] / 1000, tz=timezone.utc),
+        "participants_complete": True,
+    }
+
+    team_kills: Dict[int, int] = {}
+    for p in info["participants"]:
+        team_kills[p["teamId"]] = team_kills.get(p["teamId"], 0) + p["kills"]
+
+    participant_rows = []
+    for player_data in info["participants"]:
+        participant_rows.append({
+            "match_id": match_id,
+            "puuid": player_data["puuid"],
+            "team_id": player_data["teamId"],
+            "champion": player_data["championName"],
+            "opponent_champion": get_opponent_champion(match_data, player_data),
+            "team_position": normalize_team_position(player_data.get("teamPosition", "UNKNOWN")),
+            "win": player_data["win"],
+            "kills": player_data["kills"],
+            "deaths": player_data["deaths"],
+            "assists": player_data["assists"],
+            "cs_per_min": (player_data["totalMinionsKilled"] + player_data["neutralMinionsKilled"]) / duration_min,
+            "gold_per_min": player_data["goldEarned"] / duration_min,
+            "kill_participation": (player_data["kills"] + player_data["assists"]) / max(1, team_kills[player_data["teamId"]]),
+            "damage_to_champs_per_min": player_data["totalDamageDealtToChampions"] / duration_min,
+        })
+    return info_row, participant_rows
+
+
+def bulk_insert_matches(db: Session, info_rows: List[Dict], participant_rows: List[Dict]) -> int:
+    """Insert matches and their participants in one multi-row statement each.
+
+    Matches that already exist are skipped instead of rolling back the whole batch.
+    Incomplete ones (migrated with only some participants) are marked complete and
+    get their missing participants. Only the participant rows actually inserted are
+    added to the matchup totals, in the same transaction.
+    Returns the number of matches inserted or completed.
+    """
+    if not info_rows:
+        return 0
+    # One row per match, ON CONFLICT DO UPDATE cannot touch the same row twice
+    info_rows = list({row["match_id"]: row for row in info_rows}.values())
+    stmt = insert(MatchInfo).values(info_rows)
+    stmt = (
+        stmt.on_conflict_do_update(
+            index_elements=[MatchInfo.match_id],
+            set_={"participants_complete": True},
+            where=MatchInfo.participants_complete.is_(False),
+        )
+        .returning(MatchInfo.match_id)
+    )
+    written = {row[0] for row in db.execute(stmt).fetchall()}
+
+    # Only the participants of matches this statement created or completed; the rest are
+    # already stored, and participants an incomplete match already has are skipped
+    new_participants = [row for row in participant_rows if row["match_id"] in written]
+    inserted = []
+    if new_participants:
+        inserted = db.execute(
+            insert(MatchParticipant)
+            .values(new_participants)
+            .on_conflict_do_nothing(index_elements=[MatchParticipant.match_id, MatchParticipant.puuid])
+            .returning(MatchParticipant.id, MatchParticipant.puuid)
+        ).fetchall()
+        apply_matchup_stats(db, [row[0] for row in inserted])
+    db.commit()
+    if inserted:
+        # Cached analytics of tracked players in these games are now behind
+        puuids = {row[1] for row in inserted}
+        user_ids = [row[0] for row in db.query(User.id).filter(User.puuid.in_(puuids)).all()]
+        match_columns.mark_stale(user_ids)
+        cache.bump_user_versions(user_ids)
+    return len(written)
+
+
+def bulk_upsert_matches(db: Session, info_rows: List[Dict], participant_rows: List[Dict]) -> int:
+    """Insert or overwrite matches and participants, e.g. when recomputing them from the archive"""
+    if not info_rows:
+        return 0
+    info_stmt = insert(MatchInfo).values(info_rows)
+    info_stmt = info_stmt.on_conflict_do_update(
+        index_elements=[MatchInfo.match_id],
+        set_={col: info_stmt.excluded[col] for col in info_rows[0] if col != "match_id"},
+    )
+    db.execute(info_stmt)
+    if participant_rows:
+        participant_stmt = insert(MatchParticipant).values(participant_rows)
+        participant_stmt = participant_stmt.on_conflict_do_update(
+            index_elements=[MatchParticipant.match_id, MatchParticipant.puuid],
+            set_={col: participant_stmt.excluded[col] for col in participant_rows[0] if col not in ("match_id", "puuid")},
+        )
+        db.execute(participant_stmt)
+    db.commit()
+    return len(info_rows)
+
+
+def stored_match_ids(db: Session, match_ids: List[str]) -> Set[str]:
+    """Which of these match IDs are already stored with all participants (for any user)"""
+    if not match_ids:
+        return set()
+    return {
+        row[0] for row in db.query(MatchInfo.match_id)
+        .filter(MatchInfo.match_id.in_(match_ids), MatchInfo.participants_complete.is_(True))
+        .all()
+    }
+
+
+class MatchIngestionPipeline:
+    """Fetch, transform and store matches in three stages joined by bounded queues.
+
+    1. fetch:     up to `concurrency` match-detail requests in flight (each still waits on
+                  the Riot rate limiter, so the limiter sets the real pace). Matches that
+                  are already stored in full for any user are skipped without a Riot call, and
+                  archived matches are read from the raw archive instead of Riot; newly
+                  fetched ones are archived.
+    2. transform: extract the match row and all participant rows from each response
+    3. write:     bulk insert matches in batches of `batch_size`
+
+    Queues are bounded, so memory stays flat no matter how many IDs are fed in.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, batch_size: Optional[int] = None, queue_size: Optional[int] = None,
+                 archive: Optional[MatchArchive] = None):
+        # More fetchers than the per-second budget only adds requests parked on the limiter
+        self.concurrency = concurrency or min(settings.MATCH_INGEST_CONCURRENCY, settings.RIOT_API_RATE_LIMIT_PER_SECOND)
+        self.batch_size = batch_size or settings.MATCH_INGEST_BATCH_SIZE
+        self.queue_size = queue_size or self.concurrency * 2
+        self.archive = archive
+
+    async def ingest(self, db: Session, match_ids: Iterable[str]) -> int:
+        """Ingest the given match IDs; returns the number of new matches stored.
+
+        Every use of db happens in a worker thread, one call at a time under db_lock, and
+        each batch commits, which expires the objects loaded in it. Callers must not touch
+        db until this returns and should read the attributes they need beforehand.
+        """
+        id_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        fetched_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        row_queue: asyncio.Queue = asyncio.Queue(self.batch_size * 2)
+        # The only way the stages touch the session: the feeder and writer take turns
+        db_lock = asyncio.Lock()
+
+        async def run_db(fn, *args):
+            async with db_lock:
+                return await asyncio.to_thread(fn, db, *args)
+
+        async def feed():
+            chunk: List[str] = []
+
+            async def flush_chunk():
+                stored = await run_db(stored_match_ids, chunk)
+                for match_id in chunk:
+                    if match_id not in stored:
+                        await id_queue.put(match_id)
+
+            for match_id in match_ids:
+                chunk.append(match_id)
+                if len(chunk) >= self.batch_size:
+                    await flush_chunk()
+                    chunk = []
+            if chunk:
+                await flush_chunk()
+            for _ in range(self.concurrency):
+                await id_queue.put(_DONE)
+
+        async def fetch():
+            while True:
+                match_id = await id_queue.get()
+                if match_id is _DONE:
+                    await fetched_queue.put(_DONE)
+                    return
+                match_data = None
+                if self.archive is not None:
+                    match_data = await asyncio.to_thread(self.archive.get, match_id)
+                if match_data is None:
+                    match_data = await riot_api.get_match_details(match_id)
+                    if match_data and self.archive is not None:
+                        await asyncio.to_thread(self.archive.put, match_id, match_data)
+                if match_data:
+                    await fetched_queue.put((match_id, match_data))
+
+        async def transform():
+            remaining_fetchers = self.concurrency
+            while remaining_fetchers:
+                item = await fetched_queue.get()
+                if item is _DONE:
+                    remaining_fetchers -= 1
+                    continue
+                match_id, match_data = item
+                try:
+                    rows = build_match_rows(match_id, match_data)
+                except (KeyError, TypeError, ZeroDivisionError) as e:
+                    print(f"🔍 ERROR: Skipping malformed match {match_id}: {e}")
+                    continue
+                await row_queue.put(rows)
+            await row_queue.put(_DONE)
+
+        async def write() -> int:
+            stored = 0
+            info_rows: List[Dict] = []
+            participant_rows: List[Dict] = []
+            while True:
+                rows = await row_queue.get()
+                if rows is not _DONE:
+                    info_rows.append(rows[0])
+                    participant_rows.extend(rows[1])
+                if info_rows and (rows is _DONE or len(info_rows) >= self.batch_size):
+                    stored += await run_db(bulk_insert_matches, info_rows, participant_rows)
+                    info_rows, participant_rows = [], []
+                if rows is _DONE:
+                    return stored
+
+        tasks = [asyncio.create_task(feed()), asyncio.create_task(transform())]
+        tasks += [asyncio.create_task(fetch()) for _ in range(self.concurrency)]
+        writer = asyncio.create_task(write())
+        try:
+            await asyncio.gather(writer, *tasks)
+        finally:
+            for task in tasks + [writer]:
+                task.cancel()
+        return writer.result()
+
+
+# Global instance
+match_ingestion = MatchIngestionPipeline(archive=match_archive if settings.MATCH_ARCHIVE_ENABLED else None)
@@ -0,0 +1,145 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.models.match_info import MatchInfo
+from app.models.user_sync_cursor import UserSyncCursor
+from app.services.match_ingestion import match_ingestion, stored_match_ids
+from app.services.riot_api import riot_api
+from app.utils.database import SessionLocal
+from config.settings import settings
+
+
+def stored_game_range(db: Session, match_ids: List[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Oldest and newest game start (epoch seconds) among the stored matches in match_ids"""
+    if not match_ids:
+        return None, None
+    oldest, newest = db.query(
+        func.min(MatchInfo.game_creation),
+        func.max(MatchInfo.game_creation)
+    ).filter(MatchInfo.match_id.in_(match_ids)).one()
+    if oldest is None:
+        return None, None
+    return int(oldest.timestamp()), int(newest.timestamp())
+
+
+def cursor_match_ids(db: Session, match_ids: List[str]) -> List[str]:
+    """The part of a newest-first listing the sync cursor may advance over: every ID after
+    the oldest one that is still not stored. Stopping there means an ID that failed to
+    fetch is listed again on the next sync instead of falling behind the cursor.
+    """
+    stored = stored_match_ids(db, match_ids)
+    missing = [i for i, match_id in enumerate(match_ids) if match_id not in stored]
+    return match_ids[missing[-1] + 1:] if missing else match_ids
+
+
+class MatchSyncService:
+    """Keeps each user's stored match history in step with Riot using a sync cursor.
+
+    - sync_recent asks match-v5 only for games since the newest one already ingested, so
+      refreshing an active user costs one ID list call plus the new matches.
+    - backfill pages backwards through older history from a persisted checkpoint, a few
+      pages per run, so it can be spread over background runs and resumed after a restart.
+    """
+
+    def __init__(self, page_size: Optional[int] = None, backfill_pages: Optional[int] = None):
+        self.page_size = page_size or settings.MATCH_SYNC_PAGE_SIZE
+        self.backfill_pages = backfill_pages or settings.MATCH_BACKFILL_PAGES_PER_RUN
+
+    def get_cursor(self, db: Session, user_id: int) -> UserSyncCursor:
+        cursor = db.get(UserSyncCursor, user_id)
+        if cursor is None:
+            # sync_recent and run_backfill can both get here first; the loser keeps the winner's row
+            db.execute(
+                insert(UserSyncCursor)
+                .values(user_id=user_id, backfill_complete=False)
+                .on_conflict_do_nothing(index_elements=[UserSyncCursor.user_id])
+            )
+            cursor = db.get(UserSyncCursor, user_id, populate_existing=True)
+        return cursor
+
+    async def sync_recent(self, db: Session, user: User) -> int:
+        """Ingest the user's games played since the last sync; returns the number of new matches"""
+        # The ingest pipeline commits the session from a worker thread, which expires the
+        # user; read what is needed now instead of reloading it on the event loop
+        user_id, puuid = user.id, user.puuid
+        cursor = self.get_cursor(db, user_id)
+
+        if cursor.newest_game_start is None:
+            # First sync: the latest page, which also anchors the backfill checkpoint
+            match_ids = await riot_api.get_match_history(puuid, count=self.page_size)
+            stored = await match_ingestion.ingest(db, match_ids)
+            # With no safe cursor yet the next sync is a first sync again, which must not
+            # move an existing backfill checkpoint
+            _, cursor.newest_game_start = stored_game_range(db, cursor_match_ids(db, match_ids))
+            if cursor.backfill_end_time is None:
+                cursor.backfill_end_time, _ = stored_game_range(db, match_ids)
+                cursor.backfill_complete = len(match_ids) < self.page_size
+        else:
+            # startTime is inclusive, so the newest stored game is listed again and then
+            # skipped by the pipeline without a details call
+            match_ids = []
+            start = 0
+            while True:
+                page = await riot_api.get_match_history(
+                    puuid, count=self.page_size, start=start, start_time=cursor.newest_game_start
+                )
+                match_ids.extend(page)
+                if len(page) < self.page_size:
+                    break
+                start += self.page_size
+            stored = await match_ingestion.ingest(db, match_ids)
+            _, newest = stored_game_range(db, cursor_match_ids(db, match_ids))
+            if newest is not None:
+                cursor.newest_game_start = max(cursor.newest_game_start, newest)
+
+        db.commit()
+        print(f"🔍 DEBUG: Synced {stored} new matches for user {puuid} ({len(match_ids)} IDs listed)")
+        return stored
+
+    async def backfill(self, db: Session, user: User, max_pages: Optional[int] = None) -> int:
+        """Ingest up to max_pages pages of older history, checkpointing after each page"""
+        user_id, puuid = user.id, user.puuid
+        cursor = self.get_cursor(db, user_id)
+        stored = 0
+
+        for _ in range(max_pages or self.backfill_pages):
+            if cursor.backfill_complete or cursor.backfill_end_time is None:
+                break
+            match_ids = await riot_api.get_match_history(
+                puuid, count=self.page_size, end_time=cursor.backfill_end_time
+            )
+            stored += await match_ingestion.ingest(db, match_ids)
+            oldest, _ = stored_game_range(db, match_ids)
+
+            if len(match_ids) < self.page_size:
+                cursor.backfill_complete = True
+            elif oldest is None or oldest >= cursor.backfill_end_time:
+                # Nothing from this page could be stored; try again on the next run
+                print(f"🔍 ERROR: Backfill made no progress for user {puuid}")
+                break
+            else:
+                cursor.backfill_end_time = oldest
+            db.commit()
+
+        db.commit()
+        return stored
+
+    async def run_backfill(self, user_id: int):
+        """Background task entry point: backfill with its own session"""
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user:
+                stored = await self.backfill(db, user)
+                print(f"🔍 DEBUG: Backfilled {stored} older matches for user {user_id}")
+        except Exception as e:
+            print(f"🔍 ERROR: Match backfill failed for user {user_id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+
+# Global instance
+match_sync = MatchSyncService()
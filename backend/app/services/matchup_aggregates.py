@@ -0,0 +1,100 @@
+from typing import Iterable, Optional
+from sqlalchemy import Date, Integer, cast, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.match import Match
+from app.models.user import User
+from app.models.matchup_stats import MatchupStats
+from app.models.matchup_daily_stats import MatchupDailyStats
+from app.services.cache_service import cache
+
+# Matchup key and the running totals, in MatchupStats column order
+_KEY_COLUMNS = ["user_id", "champion", "opponent_champion", "team_position", "game_mode"]
+_SUM_COLUMNS = [
+    "games_played", "wins", "total_kills", "total_deaths", "total_assists",
+    "total_cs_per_min", "total_gold_per_min", "total_damage_per_min", "total_game_duration",
+]
+
+# UTC day a game was played, the extra key of the daily rollups
+_GAME_DAY = cast(func.timezone("UTC", Match.game_creation), Date)
+
+# Every aggregate table with its extra key columns (name, expression) and row filters
+_AGGREGATES = [
+    (MatchupStats, [], []),
+    (MatchupDailyStats, [("day", _GAME_DAY)], [Match.game_creation.isnot(None)]),
+]
+
+
+def _aggregate_select(extra_keys, *criteria):
+    """Per-matchup totals over the Match view rows matching criteria"""
+    keys = [
+        Match.user_id,
+        Match.champion,
+        Match.opponent_champion,
+        Match.team_position,
+        Match.game_mode,
+        *(expression for _, expression in extra_keys),
+    ]
+    return (
+        select(
+            *keys,
+            func.count(),
+            func.sum(cast(Match.win, Integer)),
+            func.sum(Match.kills),
+            func.sum(Match.deaths),
+            func.sum(Match.assists),
+            func.sum(Match.cs_per_min),
+            func.sum(Match.gold_per_min),
+            func.sum(Match.damage_to_champs_per_min),
+            func.sum(Match.game_duration),
+        )
+        .where(
+            Match.opponent_champion.isnot(None),  # Only matches with a lane opponent
+            *criteria
+        )
+        .group_by(*keys)
+    )
+
+
+def apply_matchup_stats(db: Session, participant_ids: Iterable[int]):
+    """Fold newly stored participant rows into their tracked players' matchup totals and daily rollups.
+
+    Must be called exactly once per participant row, in the transaction that inserts it;
+    the caller commits.
+    """
+    participant_ids = list(participant_ids)
+    if not participant_ids:
+        return
+    for model, extra_keys, filters in _AGGREGATES:
+        key_columns = _KEY_COLUMNS + [name for name, _ in extra_keys]
+        stmt = insert(model).from_select(
+            key_columns + _SUM_COLUMNS,
+            _aggregate_select(extra_keys, Match.id.in_(participant_ids), *filters),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={
+                **{col: getattr(model, col) + getattr(stmt.excluded, col) for col in _SUM_COLUMNS},
+                "updated_at": func.now(),
+            },
+        )
+        db.execute(stmt)
+
+
+def rebuild_matchup_stats(db: Session, user_id: Optional[int] = None):
+    """Recompute matchup totals and daily rollups from scratch for one user (or everyone).
+
+    Needed when a user signs up after some of their games were stored for another player,
+    and after reprocessing rewrites stored matches.
+    """
+    for model, extra_keys, filters in _AGGREGATES:
+        delete = db.query(model)
+        criteria = list(filters)
+        if user_id is not None:
+            delete = delete.filter(model.user_id == user_id)
+            criteria.append(Match.user_id == user_id)
+        delete.delete(synchronize_session=False)
+        key_columns = _KEY_COLUMNS + [name for name, _ in extra_keys]
+        db.execute(insert(model).from_select(key_columns + _SUM_COLUMNS, _aggregate_select(extra_keys, *criteria)))
+    db.commit()
+    cache.bump_user_versions([user_id] if user_id is not None else [row[0] for row in db.query(User.id).all()])
@@ -1,88 +1,141 @@
 ﻿from typing import List, Dict
 from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import Integer
+from sqlalchemy import func, tuple_
 from app.models.match import Match
+from app.models.matchup_stats import MatchupStats
+from app.models.matchup_daily_stats import MatchupDailyStats
 from app.services.cache_service import cache
+from app.services.match_columns import GROUP_FIELDS, match_columns
+from app.services.matchup_matrix import matchup_matrix
 from config.settings import settings
 
 
+# Rolling windows in days; "split" starts at settings.CURRENT_SPLIT_START
+WINDOW_DAYS = {'7d': 7, '30d': 30, '90d': 90}
+
+
 class MatchupAnalyzer:
     """Analyzes player matchups to identify difficult opponents and provide insights."""
     
     def __init__(self):
         self.cache_ttl = settings.CACHE_MATCHUP_DATA_TTL
     
-    def analyze_difficult_matchups(self, db: Session, user_id: int, role: str = None, game_mode: str | None = None) -> List[Dict]:
+    def analyze_difficult_matchups(self, db: Session, user_id: int, role: str = None, game_mode: str | None = None,
+                                   window: str | None = None) -> List[Dict]:
         """Find champions that give the player the most trouble.
         
-        Returns matchups with win rate < 50% sorted by difficulty.
+        Returns matchups with win rate < 50% sorted by difficulty. Served from the
+        per-user matchup cube, so every role and game mode filter shares one cache entry.
         """
         normalized_role = self._normalize_role(role) if role else None
         normalized_mode = (game_mode or '').strip() or None
-        cache_key = f"user:{user_id}:difficult_matchups:{normalized_role or 'all'}:{normalized_mode or 'all'}"
+        cube = self.get_difficult_matchups_cube(db, user_id, window)
+        return cube.get(self._cube_key(normalized_role, normalized_mode), [])
+    
+    def _window_start(self, window: str | None) -> date | None:
+        """First UTC day included in a time window, or None for all games"""
+        if not window or window == 'all':
+            return None
+        if window == 'split':
+            return date.fromisoformat(settings.CURRENT_SPLIT_START)
+        if window in WINDOW_DAYS:
+            # Today counts as one of the N days
+            return datetime.now(timezone.utc).date() - timedelta(days=WINDOW_DAYS[window] - 1)
+        raise ValueError(f"Unknown window '{window}' (expected all, split, {', '.join(WINDOW_DAYS)})")
+    
+    def _stats_source(self, window: str | None):
+        """Aggregate model and row filters for a window: lifetime totals or summed daily rollups"""
+        start = self._window_start(window)
+        if start is None:
+            return MatchupStats, [], start
+        return MatchupDailyStats, [MatchupDailyStats.day >= start], start
+    
+    def _cube_key(self, role: str | None, game_mode: str | None) -> str:
+        return f"{role or 'all'}|{game_mode or 'all'}"
+    
+    def difficult_matchups_cache_key(self, user_id: int, window: str | None = None) -> str:
+        """Cache key of the matchup cube, for callers that prefetch it"""
+        start = self._window_start(window)
+        return cache.user_key(user_id, "difficult_matchups_cube", start.isoformat() if start else 'all')
+    
+    def get_difficult_matchups_cube(self, db: Session, user_id: int, window: str | None = None) -> Dict[str, List[Dict]]:
+        """Difficult matchups for every (role, game mode) filter, including the "all" rollups.
+        
+        Computed with a single GROUPING SETS scan of the user's matchup totals (or, for a
+        time window, of the daily rollups in that window) and cached as one document keyed
+        by "role|mode".
+        """
+        stats, window_filters, start = self._stats_source(window)
+        cache_key = self.difficult_matchups_cache_key(user_id, window)
         
         def _analyze():
-            # Use database aggregation for much faster processing
-            from sqlalchemy import func
-            
-            # Build base query with filters
-            query = db.query(
-                Match.opponent_champion,
-                func.count(Match.id).label('games'),
-                func.sum(func.cast(Match.win, Integer)).label('wins'),
-                func.avg(Match.kills).label('avg_kills'),
-                func.avg(Match.deaths).label('avg_deaths'),
-                func.avg(Match.assists).label('avg_assists'),
-                func.avg(Match.cs_per_min).label('avg_cs_per_min'),
-                func.avg(Match.damage_to_champs_per_min).label('avg_damage_per_min')
+            # Sum the pre-aggregated matchup totals; this scans one row per
+            # (champion, opponent, role, mode[, day]) rather than one per game
+            games = func.sum(stats.games_played)
+            results = db.query(
+                func.grouping(stats.team_position).label('all_roles'),
+                func.grouping(stats.game_mode).label('all_modes'),
+                stats.team_position,
+                stats.game_mode,
+                stats.opponent_champion,
+                games.label('games'),
+                func.sum(stats.wins).label('wins'),
+                (func.sum(stats.total_kills) / games).label('avg_kills'),
+                (func.sum(stats.total_deaths) / games).label('avg_deaths'),
+                (func.sum(stats.total_assists) / games).label('avg_assists'),
+                (func.sum(stats.total_cs_per_min) / games).label('avg_cs_per_min'),
+                (func.sum(stats.total_damage_per_min) / games).label('avg_damage_per_min')
             ).filter(
-                Match.user_id == user_id,
-                Match.opponent_champion.isnot(None)  # Only matches with opponent data
-            )
-            
-            if normalized_role:
-                query = query.filter(Match.team_position == normalized_role)
-            if normalized_mode:
-                query = query.filter(Match.game_mode == normalized_mode)
-            
-            # Group by opponent champion
-            results = query.group_by(Match.opponent_champion).having(
-                func.count(Match.id) >= 3  # At least 3 games
+                stats.user_id == user_id,
+                *window_filters
+            ).group_by(
+                # Per opponent: overall, per role, per mode and per (role, mode)
+                func.grouping_sets(
+                    tuple_(stats.opponent_champion),
+                    tuple_(stats.opponent_champion, stats.team_position),
+                    tuple_(stats.opponent_champion, stats.game_mode),
+                    tuple_(stats.opponent_champion, stats.team_position, stats.game_mode)
+                )
+            ).having(
+                games >= 3  # At least 3 games
             ).all()
             
-            if not results:
-                return []
-            
-            # Process database results
-            difficult_matchups = []
+            # Process database results into one list per filter
+            cube: Dict[str, List[Dict]] = defaultdict(list)
             for row in results:
-                opponent = row.opponent_champion
-                games = row.games
-                wins = row.wins or 0
+                games_played = int(row.games)
+                wins = int(row.wins or 0)
                 
-                win_rate = (wins / games) * 100
+                win_rate = (wins / games_played) * 100
                 if win_rate >= 50:  # Skip matchups we're winning
                     continue
                 
-                difficult_matchups.append({
-                    'champion': opponent,
-                    'games_played': games,
+                key = self._cube_key(
+                    None if row.all_roles else row.team_position,
+                    None if row.all_modes else row.game_mode
+                )
+                cube[key].append({
+                    'champion': row.opponent_champion,
+                    'games_played': games_played,
                     'wins': wins,
-                    'losses': games - wins,
+                    'losses': games_played - wins,
                     'win_rate': round(win_rate, 1),
                     'avg_kda': {
-                        'kills': round(row.avg_kills or 0, 1),
-                        'deaths': round(row.avg_deaths or 0, 1),
-                        'assists': round(row.avg_assists or 0, 1)
+                        'kills': round(float(row.avg_kills or 0), 1),
+                        'deaths': round(float(row.avg_deaths or 0), 1),
+                        'assists': round(float(row.avg_assists or 0), 1)
                     },
-                    'avg_cs_per_min': round(row.avg_cs_per_min or 0, 1),
-                    'avg_damage_per_min': round(row.avg_damage_per_min or 0, 1)
+                    'avg_cs_per_min': round(float(row.avg_cs_per_min or 0), 1),
+                    'avg_damage_per_min': round(float(row.avg_damage_per_min or 0), 1)
                 })
             
             # Sort by difficulty: worst win rate first, then by sample size
-            difficult_matchups.sort(key=lambda x: (x['win_rate'], -x['games_played']))
-            return difficult_matchups[:10]  # Return top 10 toughest matchups
+            for matchups in cube.values():
+                matchups.sort(key=lambda x: (x['win_rate'], -x['games_played'], x['champion']))
+                del matchups[10:]  # Keep top 10 toughest matchups
+            return dict(cube)
         
         return cache.get_or_set(cache_key, _analyze, self.cache_ttl)
     
@@ -106,7 +159,8 @@ class MatchupAnalyzer:
         return role_mapping.get(role_upper, role_upper)
 
     
-    def analyze_matchup_details(self, db: Session, user_id: int, opponent_champion: str, role: str | None = None, game_mode: str | None = None) -> Dict:
+    def analyze_matchup_details(self, db: Session, user_id: int, opponent_champion: str, role: str | None = None,
+                                game_mode: str | None = None, window: str | None = None) -> Dict:
         """Get comprehensive stats for a specific opponent champion.
         
         Similar to u.gg's detailed matchup view - shows performance breakdown,
@@ -114,21 +168,56 @@ class MatchupAnalyzer:
         """
         normalized_role = self._normalize_role(role) if role else None
         normalized_mode = (game_mode or '').strip() or None
-        cache_key = f"user:{user_id}:matchup_details:{opponent_champion}:{normalized_role or 'all'}:{normalized_mode or 'all'}"
+        stats, window_filters, start = self._stats_source(window)
+        cache_key = cache.user_key(
+            user_id, "matchup_details", opponent_champion, normalized_role or 'all', normalized_mode or 'all',
+            start.isoformat() if start else 'all'
+        )
 
         def _compute():
-            # Query matches against this specific opponent
-            query = db.query(Match).filter(
-                Match.user_id == user_id,
-                Match.opponent_champion == opponent_champion
+            # One aggregate over the matchup totals: the overall row plus per-role and
+            # per-mode rows, told apart by GROUPING()
+            games = func.sum(stats.games_played)
+            query = db.query(
+                func.grouping(stats.team_position).label('by_role'),
+                func.grouping(stats.game_mode).label('by_mode'),
+                stats.team_position,
+                stats.game_mode,
+                games.label('games'),
+                func.sum(stats.wins).label('wins'),
+                func.sum(stats.total_kills).label('kills'),
+                func.sum(stats.total_deaths).label('deaths'),
+                func.sum(stats.total_assists).label('assists'),
+                func.sum(stats.total_cs_per_min).label('cs_per_min'),
+                func.sum(stats.total_gold_per_min).label('gold_per_min'),
+                func.sum(stats.total_damage_per_min).label('damage_to_champs_per_min'),
+                func.sum(stats.total_game_duration).label('game_duration_min')
+            ).filter(
+                stats.user_id == user_id,
+                stats.opponent_champion == opponent_champion,
+                *window_filters
             )
             if normalized_role:
-                query = query.filter(Match.team_position == normalized_role)
+                query = query.filter(stats.team_position == normalized_role)
             if normalized_mode:
-                query = query.filter(Match.game_mode == normalized_mode)
+                query = query.filter(stats.game_mode == normalized_mode)
 
-            matches = query.order_by(Match.game_creation.desc()).all()
-            if not matches:
+            rows = query.group_by(
+                func.grouping_sets(tuple_(), stats.team_position, stats.game_mode)
+            ).all()
+
+            totals = None
+            role_dist: Dict[str, int] = {}
+            mode_dist: Dict[str, int] = {}
+            for row in rows:
+                if row.by_role and row.by_mode:
+                    totals = row
+                elif not row.by_role:
+                    role_dist[row.team_position or 'UNKNOWN'] = int(row.games)
+                else:
+                    mode_dist[row.game_mode or 'UNKNOWN'] = int(row.games)
+
+            if totals is None or not totals.games:
                 return {
                     'opponent': opponent_champion,
                     'games': 0,
@@ -145,32 +234,41 @@ class MatchupAnalyzer:
                     'recent_matches': []
                 }
 
-            # Calculate aggregate statistics
-            total_games = len(matches)
-            total_wins = sum(1 for m in matches if m.win)
-            
-            totals = {
-                'kills': sum(m.kills for m in matches),
-                'deaths': sum(m.deaths for m in matches),
-                'assists': sum(m.assists for m in matches),
-                'cs_per_min': sum(m.cs_per_min for m in matches),
-                'gold_per_min': sum(m.gold_per_min for m in matches),
-                'damage_to_champs_per_min': sum(m.damage_to_champs_per_min for m in matches),
-                'game_duration_min': sum(m.game_duration for m in matches),
-            }
+            total_games = int(totals.games)
+            total_wins = int(totals.wins)
 
-            # Count role and game mode distributions
-            role_dist: Dict[str, int] = {}
-            mode_dist: Dict[str, int] = {}
-            for m in matches:
-                role_key = m.team_position or 'UNKNOWN'
-                role_dist[role_key] = role_dist.get(role_key, 0) + 1
-                mode_key = m.game_mode or 'UNKNOWN'
-                mode_dist[mode_key] = mode_dist.get(mode_key, 0) + 1
+            # Only the columns the response needs for the 10 most recent games
+            recent_query = db.query(
+                Match.match_id,
+                Match.game_creation,
+                Match.champion,
+                Match.opponent_champion,
+                Match.win,
+                Match.kills,
+                Match.deaths,
+                Match.assists,
+                Match.cs_per_min,
+                Match.gold_per_min,
+                Match.damage_to_champs_per_min,
+                Match.game_duration,
+                Match.team_position,
+                Match.game_mode
+            ).filter(
+                Match.user_id == user_id,
+                Match.opponent_champion == opponent_champion
+            )
+            if normalized_role:
+                recent_query = recent_query.filter(Match.team_position == normalized_role)
+            if normalized_mode:
+                recent_query = recent_query.filter(Match.game_mode == normalized_mode)
+            if start:
+                recent_query = recent_query.filter(
+                    Match.game_creation >= datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
+                )
 
             # Build recent matches list
             recent = []
-            for m in matches[:10]:
+            for m in recent_query.order_by(Match.game_creation.desc()).limit(10):
                 recent.append({
                     'match_id': m.match_id,
                     'date': m.game_creation.isoformat() if m.game_creation else None,
@@ -193,14 +291,14 @@ class MatchupAnalyzer:
                 'losses': total_games - total_wins,
                 'win_rate': round((total_wins / total_games) * 100, 1),
                 'avg_kda': {
-                    'kills': round(totals['kills'] / total_games, 1),
-                    'deaths': round(totals['deaths'] / total_games, 1),
-                    'assists': round(totals['assists'] / total_games, 1),
+                    'kills': round(totals.kills / total_games, 1),
+                    'deaths': round(totals.deaths / total_games, 1),
+                    'assists': round(totals.assists / total_games, 1),
                 },
-                'avg_cs_per_min': round(totals['cs_per_min'] / total_games, 2),
-                'avg_gold_per_min': round(totals['gold_per_min'] / total_games, 0),
-                'avg_damage_per_min': round(totals['damage_to_champs_per_min'] / total_games, 0),
-                'avg_game_duration_min': round(totals['game_duration_min'] / total_games, 1),
+                'avg_cs_per_min': round(totals.cs_per_min / total_games, 2),
+                'avg_gold_per_min': round(totals.gold_per_min / total_games, 0),
+                'avg_damage_per_min': round(totals.damage_to_champs_per_min / total_games, 0),
+                'avg_game_duration_min': round(totals.game_duration_min / total_games, 1),
                 'role_distribution': role_dist,
                 'game_mode_distribution': mode_dist,
                 'recent_matches': recent,
@@ -210,34 +308,53 @@ class MatchupAnalyzer:
 
 
     
-    def get_champion_matchup_data(self, champion: str, opponent: str) -> Dict:
-        """Fetch matchup data between two champions from u.gg.
+    def explore_matchups(self, db: Session, user_id: int, group_by: List[str], role: str | None = None,
+                         game_mode: str | None = None, champion: str | None = None, opponent: str | None = None,
+                         since: int | None = None, min_games: int = 1) -> List[Dict]:
+        """Ad-hoc filter / group-by over the user's games, served from the in-process column store.
         
-        Returns win rate and confidence level based on sample size.
+        Any combination of role, game mode, own champion, opponent and date window is
+        computed in memory, so interactive filtering costs no database round trip.
         """
-        cache_key = f"matchup:{champion}:{opponent}"
-        
-        def _get_matchup():
-            try:
-                from app.services.scraper import get_champion_counters
-                counters = get_champion_counters(champion)
-                
-                # Find the specific opponent in counter data
-                for counter in counters:
-                    if counter.get('champion', '').lower() == opponent.lower():
-                        games = counter.get('games', 0)
-                        return {
-                            'champion': champion,
-                            'opponent': opponent,
-                            'win_rate': counter.get('win_rate', 0),
-                            'games_analyzed': games,
-                            'confidence': 'high' if games > 100 else 'medium'
-                        }
-            except Exception:
-                pass
+        unknown = [field for field in group_by if field not in GROUP_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown group_by fields: {', '.join(unknown)}")
+        filters = {
+            'role': self._normalize_role(role) if role else None,
+            'game_mode': (game_mode or '').strip() or None,
+            'champion': champion,
+            'opponent': opponent,
+        }
+        columns = match_columns.get(db, user_id)
+        return columns.aggregate(
+            group_by,
+            {field: value for field, value in filters.items() if value},
+            since=since,
+            min_games=min_games
+        )
+    
+    def get_champion_matchup_data(self, champion: str, opponent: str, role: str | None = None) -> Dict | None:
+        """Head-to-head record of champion against opponent across every stored match.
+
+        Served from the in-memory matchup matrix; returns None until the matrix has been
+        built or when either champion has never been seen in lane.
+        """
+        matrix = matchup_matrix.get()
+        if matrix is None:
             return None
-        
-        return cache.get_or_set(cache_key, _get_matchup, self.cache_ttl)
+        matchup = matrix.head_to_head(champion, opponent, role=role)
+        if matchup is None:
+            return None
+        games = matchup['games']
+        return {
+            'champion': matchup['champion'],
+            'opponent': matchup['opponent'],
+            'win_rate': matchup['win_rate'],
+            'games_analyzed': games,
+            'confidence': 'high' if games > 100 else 'medium' if games >= settings.MATCHUP_MATRIX_MIN_GAMES else 'low',
+            'patches': matrix.patches,
+            'by_role': matchup['by_role'],
+        }
 
 
 # Singleton instance for use across the application
@@ -0,0 +1,360 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import Integer, cast, func
+from sqlalchemy.orm import Session
+from app.models.match_info import MatchInfo
+from app.models.match_participant import MatchParticipant
+from app.services.match_ingestion import normalize_team_position
+from config.settings import settings
+
+# Lane roles on the role axis, in Riot teamPosition format
+ROLES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+
+
+def patch_of(game_version: Optional[str]) -> Optional[str]:
+    """"14.1.553.5555" -> "14.1" """
+    if not game_version:
+        return None
+    parts = game_version.split(".")
+    if len(parts) < 2 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    return f"{parts[0]}.{parts[1]}"
+
+
+def _patch_key(patch: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in patch.split("."))
+
+
+def role_index(role: str) -> int:
+    """Position of a role on the role axis; accepts the same aliases as ingestion (MID, ADC, ...)"""
+    normalized = normalize_team_position(role)
+    if normalized not in ROLES:
+        raise ValueError(f"Unknown role '{role}', expected one of {', '.join(ROLES)}")
+    return ROLES.index(normalized)
+
+
+class MatchupMatrix:
+    """Champion x opponent x role games and wins from every stored match, one slice per patch.
+
+    games[p, i, j, r] counts games where champion i faced lane opponent j in role r on
+    patch p; wins[p, i, j, r] counts the ones champion i won. The patch-summed arrays
+    are computed once at load, so lookups are array indexing with no database or
+    network access.
+
+    neighbors[i] and similarity[i] hold champion i's most similar champions by play
+    style (see champion_features), most similar first; -1 pads champions with too few
+    games to be compared and missing slots.
+    """
+
+    def __init__(self, patches: List[str], champions: List[str], games: np.ndarray, wins: np.ndarray,
+                 neighbors: Optional[np.ndarray] = None, similarity: Optional[np.ndarray] = None):
+        self.patches = list(patches)
+        self.champions = list(champions)
+        self.games = games
+        self.wins = wins
+        if neighbors is None:
+            neighbors = np.full((len(self.champions), 0), -1, dtype=np.int32)
+            similarity = np.zeros((len(self.champions), 0), dtype=np.float32)
+        self.neighbors = neighbors
+        self.similarity = similarity
+        self.total_games = games.sum(axis=0)
+        self.total_wins = wins.sum(axis=0)
+        self._champion_index = {name.lower(): i for i, name in enumerate(self.champions)}
+        self._patch_index = {patch: p for p, patch in enumerate(self.patches)}
+
+    @property
+    def latest_patch(self) -> Optional[str]:
+        return self.patches[-1] if self.patches else None
+
+    def save(self, path: str):
+        """Write atomically, so a loading API process never sees a partial file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                patches=np.array(self.patches),
+                champions=np.array(self.champions),
+                games=self.games,
+                wins=self.wins,
+                neighbors=self.neighbors,
+                similarity=self.similarity,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MatchupMatrix":
+        with np.load(path) as data:
+            return cls(
+                data["patches"].tolist(), data["champions"].tolist(), data["games"], data["wins"],
+                data["neighbors"] if "neighbors" in data else None,
+                data["similarity"] if "similarity" in data else None,
+            )
+
+    def champion_index(self, champion: str) -> Optional[int]:
+        return self._champion_index.get(champion.strip().lower())
+
+    def _slices(self, patch: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        if patch is None:
+            return self.total_games, self.total_wins
+        p = self._patch_index.get(patch)
+        if p is None:
+            raise ValueError(f"Patch {patch} is not in the matchup matrix ({', '.join(self.patches)})")
+        return self.games[p], self.wins[p]
+
+    def _role_slice(self, array: np.ndarray, role: Optional[str]) -> np.ndarray:
+        """Collapse the role axis, or pick one role"""
+        if role is None:
+            return array.sum(axis=-1)
+        return array[..., role_index(role)]
+
+    def head_to_head(self, champion: str, opponent: str, role: Optional[str] = None,
+                     patch: Optional[str] = None) -> Optional[Dict]:
+        """Games and win rate of champion against opponent in lane"""
+        i, j = self.champion_index(champion), self.champion_index(opponent)
+        if i is None or j is None:
+            return None
+        games, wins = self._slices(patch)
+        pair_games, pair_wins = games[i, j], wins[i, j]
+        n = int(self._role_slice(pair_games, role))
+        w = int(self._role_slice(pair_wins, role))
+        return {
+            'champion': self.champions[i],
+            'opponent': self.champions[j],
+            'games': n,
+            'wins': w,
+            'win_rate': round(w / n * 100, 2) if n else None,
+            'by_role': {
+                r: {'games': int(pair_games[k]), 'win_rate': round(int(pair_wins[k]) / int(pair_games[k]) * 100, 2)}
+                for k, r in enumerate(ROLES) if pair_games[k]
+            },
+        }
+
+    def pair_counts(self, champions: List[str], opponents: List[str], role: Optional[str] = None,
+                    patch: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """games and wins as [len(champions), len(opponents)] arrays, zero for unseen champions"""
+        if not self.champions:
+            empty = np.zeros((len(champions), len(opponents)), dtype=np.uint64)
+            return empty, empty
+        rows = np.array([self._champion_index.get(c.lower(), -1) for c in champions], dtype=np.int64)
+        cols = np.array([self._champion_index.get(o.lower(), -1) for o in opponents], dtype=np.int64)
+        games, wins = self._slices(patch)
+        games = self._role_slice(games, role)
+        wins = self._role_slice(wins, role)
+        known = (rows[:, None] >= 0) & (cols[None, :] >= 0)
+        index = np.ix_(np.maximum(rows, 0), np.maximum(cols, 0))
+        return np.where(known, games[index], 0), np.where(known, wins[index], 0)
+
+    def matchups(self, champion: str, role: Optional[str] = None, patch: Optional[str] = None,
+                 min_games: Optional[int] = None) -> List[Dict]:
+        """Every other champion faced with enough games, best win rate first"""
+        i = self.champion_index(champion)
+        if i is None:
+            return []
+        min_games = settings.MATCHUP_MATRIX_MIN_GAMES if min_games is None else min_games
+        games, wins = self._slices(patch)
+        row_games = self._role_slice(games[i], role)
+        row_wins = self._role_slice(wins[i], role)
+        eligible = np.flatnonzero(row_games >= max(1, min_games))
+        eligible = eligible[eligible != i]  # Mirror matches are always close to 50%
+        if not len(eligible):
+            return []
+        rates = row_wins[eligible] / row_games[eligible]
+        order = eligible[np.argsort(-rates, kind="stable")]
+        return [
+            {
+                'champion': self.champions[j],
+                'win_rate': round(int(row_wins[j]) / int(row_games[j]) * 100, 2),
+                'games': int(row_games[j]),
+            }
+            for j in order
+        ]
+
+    def similar(self, champion: str, limit: int = 10) -> List[Dict]:
+        """Champions that play most like champion, from the precomputed neighbor table"""
+        i = self.champion_index(champion)
+        if i is None:
+            return []
+        return [
+            {'champion': self.champions[j], 'similarity': round(float(sim), 3)}
+            for j, sim in zip(self.neighbors[i][:limit], self.similarity[i][:limit]) if j >= 0
+        ]
+
+    def counters(self, champion: str, role: Optional[str] = None, patch: Optional[str] = None,
+                 limit: int = 10) -> List[Dict]:
+        """Opponents with a winning record against champion, strongest first.
+
+        win_rate is the counter's win rate against champion.
+        """
+        counters = []
+        for entry in reversed(self.matchups(champion, role, patch)):
+            if entry['win_rate'] >= 50 or len(counters) >= limit:
+                break
+            counters.append({**entry, 'win_rate': round(100 - entry['win_rate'], 2)})
+        return counters
+
+
+def champion_features(db: Session, versions: List[str], champions: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-champion play-style vectors from every stored participant row on versions.
+
+    Features: CS, gold and damage per minute, kill participation, kills, deaths and
+    assists per game, the change in win rate per 10 minutes of game length (duration
+    sensitivity) and the share of games in each role. Returns the raw [C, F] vectors
+    and the games behind each one.
+    """
+    index = {name: i for i, name in enumerate(champions)}
+    features = np.zeros((len(champions), 8 + len(ROLES)))
+    games = np.zeros(len(champions), dtype=np.int64)
+    if not versions:
+        return features, games
+
+    rows = db.query(
+        MatchParticipant.champion,
+        func.count(),
+        func.avg(MatchParticipant.cs_per_min),
+        func.avg(MatchParticipant.gold_per_min),
+        func.avg(MatchParticipant.damage_to_champs_per_min),
+        func.avg(MatchParticipant.kill_participation),
+        func.avg(MatchParticipant.kills),
+        func.avg(MatchParticipant.deaths),
+        func.avg(MatchParticipant.assists),
+        func.regr_slope(cast(MatchParticipant.win, Integer), MatchInfo.game_duration) * 10,
+        *(func.avg(cast(MatchParticipant.team_position == role, Integer)) for role in ROLES)
+    ).join(
+        MatchInfo, MatchInfo.match_id == MatchParticipant.match_id
+    ).filter(
+        MatchInfo.game_version.in_(versions)
+    ).group_by(MatchParticipant.champion).all()
+
+    for champion, n, *values in rows:
+        i = index.get(champion)
+        if i is not None:
+            games[i] = n
+            features[i] = [float(v or 0) for v in values]
+    return features, games
+
+
+def nearest_neighbors(features: np.ndarray, eligible: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k cosine neighbors of each eligible row after z-scoring each feature.
+
+    Returns int32 indices and float32 similarities of shape [C, k]; slots without a
+    positively correlated neighbor are padded with -1 / 0.
+    """
+    count = len(features)
+    neighbors = np.full((count, k), -1, dtype=np.int32)
+    similarity = np.zeros((count, k), dtype=np.float32)
+    rows = np.flatnonzero(eligible)
+    if len(rows) < 2 or k == 0:
+        return neighbors, similarity
+
+    x = features[rows]
+    std = x.std(axis=0)
+    x = (x - x.mean(axis=0)) / np.where(std > 0, std, 1.0)
+    norms = np.linalg.norm(x, axis=1)
+    x = x / np.where(norms > 0, norms, 1.0)[:, None]
+    sims = x @ x.T
+    np.fill_diagonal(sims, -np.inf)
+
+    k_best = min(k, len(rows) - 1)
+    top = np.argpartition(-sims, k_best - 1, axis=1)[:, :k_best]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1, kind="stable"), axis=1)
+    top_sims = np.take_along_axis(sims, top, axis=1)
+    # Champions pointing the other way on balance are not "similar"
+    neighbors[rows, :k_best] = np.where(top_sims > 0, rows[top], -1)
+    similarity[rows, :k_best] = np.where(top_sims > 0, top_sims, 0.0)
+    return neighbors, similarity
+
+
+def build_matchup_matrix(db: Session, patches: Optional[int] = None) -> MatchupMatrix:
+    """Aggregate every stored lane matchup on the most recent `patches` patches,
+    and the champion similarity table from the same games"""
+    patches = patches or settings.MATCHUP_MATRIX_PATCHES
+
+    versions = [row[0] for row in db.query(MatchInfo.game_version).distinct().all()]
+    by_patch: Dict[str, List[str]] = {}
+    for version in versions:
+        patch = patch_of(version)
+        if patch:
+            by_patch.setdefault(patch, []).append(version)
+    kept = sorted(by_patch, key=_patch_key)[-patches:]
+    kept_versions = {version: patch for patch in kept for version in by_patch[patch]}
+
+    if not kept_versions:
+        return MatchupMatrix([], [], np.zeros((0, 0, 0, len(ROLES)), dtype=np.uint32),
+                             np.zeros((0, 0, 0, len(ROLES)), dtype=np.uint32))
+
+    rows = db.query(
+        MatchInfo.game_version,
+        MatchParticipant.champion,
+        MatchParticipant.opponent_champion,
+        MatchParticipant.team_position,
+        func.count(),
+        func.sum(cast(MatchParticipant.win, Integer))
+    ).join(
+        MatchInfo, MatchInfo.match_id == MatchParticipant.match_id
+    ).filter(
+        MatchInfo.game_version.in_(list(kept_versions)),
+        MatchParticipant.opponent_champion.isnot(None),
+        MatchParticipant.team_position.in_(ROLES)
+    ).group_by(
+        MatchInfo.game_version,
+        MatchParticipant.champion,
+        MatchParticipant.opponent_champion,
+        MatchParticipant.team_position
+    ).all()
+
+    champions = sorted({row[1] for row in rows} | {row[2] for row in rows})
+    champion_index = {name: i for i, name in enumerate(champions)}
+    patch_index = {patch: p for p, patch in enumerate(kept)}
+    shape = (len(kept), len(champions), len(champions), len(ROLES))
+    games = np.zeros(shape, dtype=np.uint32)
+    wins = np.zeros(shape, dtype=np.uint32)
+    for version, champion, opponent, role, n, w in rows:
+        index = (patch_index[kept_versions[version]], champion_index[champion], champion_index[opponent], ROLES.index(role))
+        games[index] += n
+        wins[index] += w or 0
+
+    features, feature_games = champion_features(db, list(kept_versions), champions)
+    neighbors, similarity = nearest_neighbors(
+        features, feature_games >= settings.CHAMPION_SIMILARITY_MIN_GAMES, settings.CHAMPION_SIMILARITY_NEIGHBORS
+    )
+    return MatchupMatrix(kept, champions, games, wins, neighbors, similarity)
+
+
+class MatchupMatrixStore:
+    """Loads the matrix file written by the build job and reloads it when the job replaces it"""
+
+    def __init__(self, path: Optional[str] = None, check_interval: float = 60.0):
+        self.path = path or settings.MATCHUP_MATRIX_PATH
+        self.check_interval = check_interval
+        self._matrix: Optional[MatchupMatrix] = None
+        self._mtime = 0.0
+        # monotonic() can be below check_interval on a freshly booted host; the first get must look
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[MatchupMatrix]:
+        """The current matrix, or None until the build job has run"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._matrix
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return self._matrix
+            if mtime != self._mtime:
+                try:
+                    self._matrix = MatchupMatrix.load(self.path)
+                    self._mtime = mtime
+                except Exception as e:
+                    print(f"🔍 ERROR: Failed to load matchup matrix {self.path}: {e}")
+        return self._matrix
+
+
+# Global instance
+matchup_matrix = MatchupMatrixStore()
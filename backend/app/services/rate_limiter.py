@@ -0,0 +1,392 @@
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+import redis
+from contextvars import ContextVar
+from typing import Dict, List, Mapping, Optional, Tuple
+
+
+def parse_rate_limit_header(value: Optional[str]) -> List[Tuple[int, int]]:
+    """Parse a Riot rate limit header such as "20:1,100:120" into [(20, 1), (100, 120)].
+
+    The same format is used by the *-Count headers, where the first number is the
+    number of requests already made in the window.
+    """
+    if not value:
+        return []
+    pairs = []
+    for part in value.split(","):
+        try:
+            amount, window = part.strip().split(":")
+            pairs.append((int(amount), int(window)))
+        except ValueError:
+            continue
+    return pairs
+
+
+class RateLimitBucket:
+    """Token bucket for a single Riot window (e.g. 100 requests per 120 seconds).
+
+    Riot counts requests in fixed windows that start with the first request, so the
+    bucket refills all of its tokens at once when the window rolls over instead of
+    trickling them back in.
+    """
+
+    __slots__ = ("limit", "window", "count", "reset_at")
+
+    def __init__(self, limit: int, window: int):
+        self.limit = limit
+        self.window = window
+        self.count = 0
+        self.reset_at = 0.0
+
+    def _roll(self, now: float):
+        if now >= self.reset_at:
+            self.count = 0
+            self.reset_at = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._roll(now)
+        if self.count < self.limit:
+            return 0.0
+        return max(0.0, self.reset_at - now)
+
+    def consume(self, now: float):
+        self._roll(now)
+        if self.count == 0:
+            self.reset_at = now + self.window
+        self.count += 1
+
+    def sync_count(self, count: int, now: float):
+        """Adopt the server's view of the window if it has seen more requests than we have"""
+        self._roll(now)
+        if count > self.count:
+            if self.reset_at == 0.0:
+                self.reset_at = now + self.window
+            self.count = count
+
+
+class RateLimitScope:
+    """All windows for one limit scope (the app limit or one method limit on one routing host)"""
+
+    def __init__(self, limits: List[Tuple[int, int]] = None):
+        self.buckets: Dict[int, RateLimitBucket] = {}
+        self.blocked_until = 0.0
+        if limits:
+            self.set_limits(limits)
+
+    def set_limits(self, limits: List[Tuple[int, int]]):
+        """Replace the window definitions, keeping counts for windows that still exist"""
+        buckets = {}
+        for limit, window in limits:
+            bucket = self.buckets.get(window) or RateLimitBucket(limit, window)
+            bucket.limit = limit
+            buckets[window] = bucket
+        self.buckets = buckets
+
+    def wait_time(self, now: float) -> float:
+        wait = max(0.0, self.blocked_until - now)
+        for bucket in self.buckets.values():
+            wait = max(wait, bucket.wait_time(now))
+        return wait
+
+    def consume(self, now: float):
+        for bucket in self.buckets.values():
+            bucket.consume(now)
+
+    def sync_counts(self, counts: List[Tuple[int, int]], now: float):
+        for count, window in counts:
+            bucket = self.buckets.get(window)
+            if bucket is not None:
+                bucket.sync_count(count, now)
+
+
+class RateLimiter:
+    """Multi-bucket Riot API rate limiter.
+
+    Keeps one application scope per routing host and one scope per (routing host, method).
+    Limits are seeded from settings and then learned from the X-App-Rate-Limit and
+    X-Method-Rate-Limit response headers; the matching *-Count headers keep local counts
+    in line with what Riot has seen. A 429 blocks only the scope that was exceeded, for as
+    long as Retry-After asks.
+
+    State is guarded by a threading lock that is never held while waiting, so the same
+    instance can be shared by event loop code (acquire) and worker threads (acquire_sync).
+    """
+
+    def __init__(self, default_app_limits: List[Tuple[int, int]] = None, default_retry_after: float = 1.0):
+        self.default_app_limits = default_app_limits or []
+        self.default_retry_after = default_retry_after
+        self._app_scopes: Dict[str, RateLimitScope] = {}
+        self._method_scopes: Dict[Tuple[str, str], RateLimitScope] = {}
+        self._lock = threading.Lock()
+
+    def _scopes(self, region: str, method: str) -> Tuple[RateLimitScope, RateLimitScope]:
+        app_scope = self._app_scopes.get(region)
+        if app_scope is None:
+            app_scope = self._app_scopes[region] = RateLimitScope(self.default_app_limits)
+        method_scope = self._method_scopes.get((region, method))
+        if method_scope is None:
+            method_scope = self._method_scopes[(region, method)] = RateLimitScope()
+        return app_scope, method_scope
+
+    def try_acquire(self, region: str, method: str) -> float:
+        """Take a token from every bucket in scope, or return how long to wait before retrying"""
+        with self._lock:
+            now = time.monotonic()
+            scopes = self._scopes(region, method)
+            wait = max(scope.wait_time(now) for scope in scopes)
+            if wait > 0:
+                return wait
+            for scope in scopes:
+                scope.consume(now)
+            return 0.0
+
+    async def acquire(self, region: str, method: str):
+        """Wait (without blocking the event loop) until a request may be sent"""
+        while True:
+            wait = self.try_acquire(region, method)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def on_response(self, region: str, method: str):
+        """Called once the request allowed by the last acquire() has got its response or failed"""
+
+    def acquire_sync(self, region: str, method: str):
+        """Blocking variant of acquire for worker threads"""
+        while True:
+            wait = self.try_acquire(region, method)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def update_from_headers(self, region: str, method: str, headers: Mapping[str, str]):
+        """Learn limits and counts from a Riot response"""
+        app_limits = parse_rate_limit_header(headers.get("X-App-Rate-Limit"))
+        app_counts = parse_rate_limit_header(headers.get("X-App-Rate-Limit-Count"))
+        method_limits = parse_rate_limit_header(headers.get("X-Method-Rate-Limit"))
+        method_counts = parse_rate_limit_header(headers.get("X-Method-Rate-Limit-Count"))
+
+        with self._lock:
+            now = time.monotonic()
+            app_scope, method_scope = self._scopes(region, method)
+            if app_limits:
+                app_scope.set_limits(app_limits)
+            if method_limits:
+                method_scope.set_limits(method_limits)
+            app_scope.sync_counts(app_counts, now)
+            method_scope.sync_counts(method_counts, now)
+
+    def on_rate_limited(self, region: str, method: str, headers: Mapping[str, str]) -> float:
+        """Block the exceeded scope after a 429 and return the back-off in seconds"""
+        try:
+            retry_after = float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            retry_after = self.default_retry_after
+
+        limit_type = (headers.get("X-Rate-Limit-Type") or "").lower()
+        self.update_from_headers(region, method, headers)
+        with self._lock:
+            app_scope, method_scope = self._scopes(region, method)
+            scope = app_scope if limit_type == "application" else method_scope
+            scope.blocked_until = max(scope.blocked_until, time.monotonic() + retry_after)
+        return retry_after
+
+
+# Sliding-window reservation across every bucket of a request in one atomic call.
+# KEYS: blocked keys (one per scope) followed by one sorted set per window.
+# ARGV: tokens wanted, window padding (ms), unique member prefix, number of blocked keys,
+#       in-flight hold (ms), then (limit, window_ms) for each window key.
+# Granted tokens are stamped hold ms in the future so they count while their request is in flight.
+# Returns {tokens granted, ms to wait before trying again}.
+_RESERVE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local want = tonumber(ARGV[1])
+local pad = tonumber(ARGV[2])
+local member = ARGV[3]
+local nblocked = tonumber(ARGV[4])
+local hold = tonumber(ARGV[5])
+
+local wait = 0
+for i = 1, nblocked do
+    local ttl = redis.call('PTTL', KEYS[i])
+    if ttl > wait then wait = ttl end
+end
+if wait > 0 then return {0, wait} end
+
+local granted = want
+for i = nblocked + 1, #KEYS do
+    local arg = 6 + (i - nblocked - 1) * 2
+    local limit = tonumber(ARGV[arg])
+    local window = tonumber(ARGV[arg + 1]) + pad
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+    local used = redis.call('ZCARD', KEYS[i])
+    local free = limit - used
+    if free < granted then granted = free end
+    if free <= 0 then
+        local freeing = redis.call('ZRANGE', KEYS[i], used - limit, used - limit, 'WITHSCORES')
+        -- An entry still in flight may be restamped any moment, so check back within a window
+        local w = math.min(tonumber(freeing[2]) + window - now, window)
+        if w > wait then wait = w end
+    end
+end
+if granted <= 0 then
+    if wait < 1 then wait = 1 end
+    return {0, wait}
+end
+
+for i = nblocked + 1, #KEYS do
+    local window = tonumber(ARGV[6 + (i - nblocked - 1) * 2 + 1]) + pad
+    for j = 1, granted do
+        redis.call('ZADD', KEYS[i], now + hold, member .. ':' .. j)
+    end
+    redis.call('PEXPIRE', KEYS[i], window + hold)
+end
+return {granted, 0}
+"""
+
+# Moves reservations to the current time once their request is done, so each is counted
+# from no earlier than Riot received it however late it was dispatched or answered.
+# KEYS: the window sorted sets the reservations were recorded in.
+# ARGV: window padding (ms), window_ms for each key, then the members.
+_RESTAMP_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+for i = 1, #KEYS do
+    local window = tonumber(ARGV[i + 1]) + tonumber(ARGV[1])
+    for j = #KEYS + 2, #ARGV do
+        redis.call('ZADD', KEYS[i], 'XX', now, ARGV[j])
+    end
+    if redis.call('PTTL', KEYS[i]) < window then
+        redis.call('PEXPIRE', KEYS[i], window)
+    end
+end
+return 0
+"""
+
+# Reservation (window keys, window_ms per key, member) of the request the current task is sending
+_reservation: ContextVar[Optional[Tuple[List[str], List[int], str]]] = ContextVar("rate_limit_reservation", default=None)
+
+
+class RedisRateLimiter(RateLimiter):
+    """RateLimiter whose counters live in Redis so every worker shares one key budget.
+
+    Each window is a sorted-set sliding log. A single Lua script checks every bucket of the
+    app and method scopes, honors 429 blocks set by any worker and records the request, so
+    an acquire costs exactly one round trip. With lease_size > 1 a worker reserves several
+    tokens in that round trip and spends them locally within lease_ttl seconds.
+
+    A reservation is stamped reservation_hold seconds in the future, so it keeps counting
+    however long its request waits for a connection or an answer, and is moved to the
+    current time once the request is done (on_response), which is never earlier than Riot
+    counted it. The log therefore never lets a window close before Riot's does, whatever
+    the dispatch and network delays; window_padding only absorbs clock differences. A
+    worker that dies mid-request holds its token for reservation_hold plus the window.
+    Leased tokens left unspent are restamped the same way when their lease expires.
+
+    Limits are still learned per process from response headers; only counts and 429 blocks
+    are shared. If Redis becomes unreachable the in-process buckets take over.
+    """
+
+    def __init__(self, redis_client, default_app_limits: List[Tuple[int, int]] = None,
+                 default_retry_after: float = 1.0, key_prefix: str = "riot:ratelimit",
+                 lease_size: int = 1, lease_ttl: float = 0.25, window_padding: float = 0.1,
+                 reservation_hold: float = 30.0):
+        super().__init__(default_app_limits, default_retry_after)
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.lease_size = max(1, lease_size)
+        self.lease_ttl = lease_ttl
+        self.window_padding_ms = int(window_padding * 1000)
+        self.reservation_hold_ms = int(reservation_hold * 1000)
+        self._reserve = redis_client.register_script(_RESERVE_SCRIPT)
+        self._restamp = redis_client.register_script(_RESTAMP_SCRIPT)
+        # (region, method) -> (window keys, window_ms, unspent members, expiry)
+        self._leases: Dict[Tuple[str, str], Tuple[List[str], List[int], List[str], float]] = {}
+        self._member_prefix = uuid.uuid4().hex
+        self._member_seq = itertools.count()
+
+    def _scope_key(self, region: str, method: Optional[str] = None) -> str:
+        scope = f"method:{method}" if method else "app"
+        return f"{self.key_prefix}:{region}:{scope}"
+
+    def _try_reserve(self, region: str, method: str) -> Tuple[float, Optional[Tuple[List[str], List[int], str]]]:
+        """try_acquire that also returns the reservation taken (None if the local buckets granted it)"""
+        with self._lock:
+            now = time.monotonic()
+            window_keys, windows_ms, members, expires = self._leases.get((region, method), ([], [], [], 0.0))
+            if members and now < expires:
+                return 0.0, (window_keys, windows_ms, members.pop())
+            unspent = self._leases.pop((region, method), None) if members else None
+
+            app_scope, method_scope = self._scopes(region, method)
+            app_key = self._scope_key(region)
+            method_key = self._scope_key(region, method)
+            member = f"{self._member_prefix}:{next(self._member_seq)}"
+            keys = [f"{app_key}:blocked", f"{method_key}:blocked"]
+            args = [self.lease_size, self.window_padding_ms, member, 2, self.reservation_hold_ms]
+            for scope_key, scope in ((app_key, app_scope), (method_key, method_scope)):
+                for window, bucket in scope.buckets.items():
+                    keys.append(f"{scope_key}:{window}")
+                    args.extend([bucket.limit, window * 1000])
+
+        try:
+            if unspent:
+                self._release(unspent[0], unspent[1], unspent[2])
+            granted, wait_ms = self._reserve(keys=keys, args=args)
+        except redis.RedisError as e:
+            print(f" Shared rate limiter unavailable, using local buckets: {e}")
+            return super().try_acquire(region, method), None
+
+        if granted <= 0:
+            return wait_ms / 1000.0, None
+        window_keys, windows_ms = keys[2:], args[6::2]
+        if granted > 1:
+            with self._lock:
+                self._leases[(region, method)] = (
+                    window_keys, windows_ms, [f"{member}:{j}" for j in range(granted, 1, -1)],
+                    time.monotonic() + self.lease_ttl,
+                )
+        return 0.0, (window_keys, windows_ms, f"{member}:1")
+
+    def _release(self, window_keys: List[str], windows_ms: List[int], members: List[str]):
+        """Restamp reservations to now so they stop counting a window after it"""
+        self._restamp(keys=window_keys, args=[self.window_padding_ms, *windows_ms, *members])
+
+    def try_acquire(self, region: str, method: str) -> float:
+        return self._try_reserve(region, method)[0]
+
+    async def acquire(self, region: str, method: str):
+        # The reservation is a blocking Redis call, so keep it off the event loop
+        while True:
+            wait, reservation = await asyncio.to_thread(self._try_reserve, region, method)
+            if wait <= 0:
+                _reservation.set(reservation)
+                return
+            await asyncio.sleep(wait)
+
+    async def on_response(self, region: str, method: str):
+        reservation = _reservation.get()
+        if reservation is None:
+            return
+        _reservation.set(None)
+        window_keys, windows_ms, member = reservation
+        try:
+            await asyncio.to_thread(self._release, window_keys, windows_ms, [member])
+        except redis.RedisError:
+            pass  # The reservation counts until its hold runs out
+
+    def on_rate_limited(self, region: str, method: str, headers: Mapping[str, str]) -> float:
+        retry_after = super().on_rate_limited(region, method, headers)
+        limit_type = (headers.get("X-Rate-Limit-Type") or "").lower()
+        scope_key = self._scope_key(region) if limit_type == "application" else self._scope_key(region, method)
+        try:
+            self.redis.set(f"{scope_key}:blocked", 1, px=max(1, int(retry_after * 1000)))
+        except redis.RedisError:
+            pass
+        return retry_after
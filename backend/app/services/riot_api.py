@@ -1,116 +1,151 @@
-﻿import requests
-import time
+﻿import httpx
 from typing import List, Dict, Optional
+from app.services.rate_limiter import RateLimiter, RedisRateLimiter
+from app.utils.database import get_redis
 from config.settings import settings
 
 
+def create_rate_limiter() -> RateLimiter:
+    """Build the rate limiter, shared through Redis across workers when it is available"""
+    # App limits are seeded from settings until Riot's response headers tell us the real ones
+    default_app_limits = [
+        (settings.RIOT_API_RATE_LIMIT_PER_SECOND, 1),
+        (settings.RIOT_API_RATE_LIMIT_PER_TWO_MINUTES, 120),
+    ]
+    redis_client = get_redis()
+    if settings.RIOT_API_SHARED_RATE_LIMIT and redis_client is not None:
+        return RedisRateLimiter(
+            redis_client,
+            default_app_limits=default_app_limits,
+            lease_size=settings.RIOT_API_RATE_LIMIT_LEASE_SIZE,
+            window_padding=settings.RIOT_API_RATE_LIMIT_WINDOW_PADDING,
+            # Longest a request can be in flight: pool, connect and read timeouts back to back
+            reservation_hold=2 * settings.RIOT_API_TIMEOUT + 5.0,
+        )
+    return RateLimiter(default_app_limits=default_app_limits)
+
+
 class RiotAPIService:
-    def __init__(self):
+    def __init__(self, base_url: Optional[str] = None, account_url: Optional[str] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         self.api_key = settings.RIOT_API_KEY
         self.region = settings.RIOT_API_REGION
         self.account_region = settings.RIOT_API_ACCOUNT_REGION
-        self.base_url = f"https://{self.region}.api.riotgames.com"
-        self.account_url = f"https://{self.account_region}.api.riotgames.com"
-        self.rate_limit_per_second = settings.RIOT_API_RATE_LIMIT_PER_SECOND
-        self.rate_limit_per_two_minutes = settings.RIOT_API_RATE_LIMIT_PER_TWO_MINUTES
-        self.last_request_time = 0
-        self.request_count = 0
-        self.two_minute_window_start = time.time()
-    
-    def _rate_limit(self):
-        """Implement rate limiting for Riot API"""
-        current_time = time.time()
-        
-        # Reset two-minute window if needed
-        if current_time - self.two_minute_window_start >= 120:
-            self.two_minute_window_start = current_time
-            self.request_count = 0
-        
-        # Check two-minute limit
-        if self.request_count >= self.rate_limit_per_two_minutes:
-            sleep_time = 120 - (current_time - self.two_minute_window_start)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-                self.two_minute_window_start = time.time()
-                self.request_count = 0
-        
-        # Check per-second limit
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < (1.0 / self.rate_limit_per_second):
-            time.sleep((1.0 / self.rate_limit_per_second) - time_since_last)
-        
-        self.last_request_time = time.time()
-        self.request_count += 1
-    
-    def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
-        """Make a rate-limited request to Riot API"""
-        self._rate_limit()
-        
-        headers = {"X-Riot-Token": self.api_key}
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            
-            if response.status_code == 200:
-                print(response.status_code)
-                return response.json()
-            if response.status_code == 209:
-                print(response.status_code)
+        self.base_url = base_url or f"https://{self.region}.api.riotgames.com"
+        self.account_url = account_url or f"https://{self.account_region}.api.riotgames.com"
+        self.max_retries = settings.RIOT_API_MAX_RETRIES
+        self.rate_limiter = rate_limiter or create_rate_limiter()
+
+        # One pooled client per routing host so keep-alive connections are reused
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _get_client(self, host_url: str) -> httpx.AsyncClient:
+        """Get (or lazily create) the pooled HTTP client for a routing host"""
+        client = self._clients.get(host_url)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=host_url,
+                headers={"X-Riot-Token": self.api_key},
+                http2=settings.RIOT_API_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=settings.RIOT_API_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.RIOT_API_MAX_CONNECTIONS,
+                    keepalive_expiry=60.0,
+                ),
+                timeout=httpx.Timeout(settings.RIOT_API_TIMEOUT, connect=5.0),
+            )
+            self._clients[host_url] = client
+        return client
+
+    async def aclose(self):
+        """Close all pooled connections (called on application shutdown)"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    async def _make_request(self, host_url: str, method: str, path: str, params: Dict = None) -> Optional[Dict]:
+        """Make a rate-limited request to Riot API over the pooled client for host_url.
+
+        method names the Riot endpoint so it gets its own per-method rate limit bucket.
+        """
+        client = self._get_client(host_url)
+
+        for _ in range(self.max_retries + 1):
+            await self.rate_limiter.acquire(host_url, method)
+            try:
+                response = await client.get(path, params=params)
+            except httpx.HTTPError as e:
+                await self.rate_limiter.on_response(host_url, method)
+                print(f" Request failed: {e}")
+                return None
+            await self.rate_limiter.on_response(host_url, method)
+
+            if response.status_code == 429:
+                retry_after = self.rate_limiter.on_rate_limited(host_url, method, response.headers)
+                print(f" Rate limit exceeded ({method}), retrying in {retry_after:.1f}s...")
+                continue
+
+            self.rate_limiter.update_from_headers(host_url, method, response.headers)
+            if response.status_code in (200, 209):
                 return response.json()
             elif response.status_code == 404:
-                print(response.status_code)
                 return None
             elif response.status_code == 403:
                 print(" Forbidden: Check API key, rate limits, or permissions.")
-                print(response.status_code)
                 return None
-            elif response.status_code == 429:
-                print(" Rate limit exceeded, waiting...")
-                time.sleep(60)  # Wait 1 minute for rate limit reset
-                return self._make_request(url, params)
             else:
                 print(f" API Error: {response.status_code} - {response.text}")
                 return None
-        except Exception as e:
-            print(f" Request failed: {e}")
-            return None
-    
-    def get_puuid(self, riot_id: str, tag: str) -> Optional[str]:
+
+        print(f" Giving up on {method} after {self.max_retries} rate limited retries")
+        return None
+
+    async def get_puuid(self, riot_id: str, tag: str) -> Optional[str]:
         """Get PUUID from Riot ID and tag"""
-        url = f"{self.account_url}/riot/account/v1/accounts/by-riot-id/{riot_id}/{tag}/"
-        data = self._make_request(url)
+        path = f"/riot/account/v1/accounts/by-riot-id/{riot_id}/{tag}/"
+        data = await self._make_request(self.account_url, "account-v1.by-riot-id", path)
         if data:
             return data.get("puuid")
         else:
             print("Api call failed (Getting PUUID)")
             return None
-    
-    def get_summoner_by_puuid(self, puuid: str) -> Optional[Dict]:
+
+    async def get_summoner_by_puuid(self, puuid: str) -> Optional[Dict]:
         """Get summoner data by PUUID"""
-        url = f"{self.base_url}/lol/summoner/v4/summoners/by-puuid/{puuid}"
-        return self._make_request(url)
-    
-    def get_match_history(self, puuid: str, count: int = 100, start: int = 0, queue: Optional[int] = None) -> List[str]:
-        """Get match history for a player"""
-        url = f"{self.account_url}/lol/match/v5/matches/by-puuid/{puuid}/ids"
+        path = f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
+        return await self._make_request(self.base_url, "summoner-v4.by-puuid", path)
+
+    async def get_match_history(self, puuid: str, count: int = 100, start: int = 0, queue: Optional[int] = None,
+                                start_time: Optional[int] = None, end_time: Optional[int] = None) -> List[str]:
+        """Get match history for a player, newest first.
+
+        start_time and end_time (epoch seconds) restrict the IDs to games played in that range.
+        """
+        path = f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
         params: Dict = {"count": count, "start": start}
         if queue is not None:
             params["queue"] = queue
-        return self._make_request(url, params) or []
-    
-    def get_match_details(self, match_id: str) -> Optional[Dict]:
+        if start_time is not None:
+            params["startTime"] = start_time
+        if end_time is not None:
+            params["endTime"] = end_time
+        return await self._make_request(self.account_url, "match-v5.ids", path, params) or []
+
+    async def get_match_details(self, match_id: str) -> Optional[Dict]:
         """Get detailed match information"""
-        url = f"{self.account_url}/lol/match/v5/matches/{match_id}"
-        return self._make_request(url)
-    
-    def get_champion_mastery(self, puuid: str) -> List[Dict]:
+        path = f"/lol/match/v5/matches/{match_id}"
+        return await self._make_request(self.account_url, "match-v5.match", path)
+
+    async def get_champion_mastery(self, puuid: str) -> List[Dict]:
         """Get champion mastery data"""
-        url = f"{self.base_url}/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}"
-        return self._make_request(url) or []
-    
-    def get_ranked_stats(self, summoner_id: str) -> List[Dict]:
+        path = f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}"
+        return await self._make_request(self.base_url, "champion-mastery-v4.by-puuid", path) or []
+
+    async def get_ranked_stats(self, summoner_id: str) -> List[Dict]:
         """Get ranked statistics"""
-        url = f"{self.base_url}/lol/league/v4/entries/by-summoner/{summoner_id}"
-        return self._make_request(url) or []
+        path = f"/lol/league/v4/entries/by-summoner/{summoner_id}"
+        return await self._make_request(self.base_url, "league-v4.by-summoner", path) or []
 
 
 # Global instance
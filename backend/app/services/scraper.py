@@ -1,39 +1,270 @@
-import requests
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+import orjson
 from bs4 import BeautifulSoup as bs
-import json
 import re
+from config.settings import settings
 
-def get_champion_data(champion_name: str, role: str | None = None):
+UGG_CHAMPIONS_URL = "https://u.gg/lol/champions"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Referer": "https://u.gg/",
+}
+
+
+class ChampionPages(NamedTuple):
+    """Raw HTML of a champion's u.gg pages (None where the request failed)"""
+    build: Optional[bytes]
+    counter: Optional[bytes]
+
+
+def champion_path(champion_name: str, role: Optional[str] = None) -> str:
+    """u.gg URL segment for a champion and optional role, such as lee-sin/jungle"""
+    path = champion_name.lower().replace(" ", "-").replace("'", "")
+    return f"{path}/{role.lower()}" if role else path
+
+
+class UggClient:
+    """Fetches u.gg champion pages over one pooled async HTTP client.
+    
+    The client runs on its own event loop thread, so the sync scraping functions share
+    its connections whether they are called from a request or a cache refresh thread.
+    A champion's /build and /counter pages are fetched concurrently, at most
+    SCRAPER_MAX_CONCURRENCY_PER_HOST requests run per host, and the pages are shared by
+    every caller for SCRAPER_PAGE_TTL seconds (including callers arriving while they
+    are still being fetched).
     """
-    Get comprehensive champion data from u.gg by scraping their web pages.
     
-    Fetches win/pick/ban rates from the /build page and counter data from the /counter page.
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._pages: Dict[str, Tuple[float, Future]] = {}  # champion path -> (expiry, pages future)
+        self._lock = threading.Lock()
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop thread of the client, started on first use; call with _lock held"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="ugg-scraper", daemon=True).start()
+        return self._loop
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=HEADERS,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=settings.SCRAPER_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SCRAPER_MAX_CONNECTIONS,
+                    keepalive_expiry=60.0,
+                ),
+                timeout=httpx.Timeout(settings.SCRAPER_TIMEOUT, connect=5.0),
+            )
+        return self._client
+    
+    async def _fetch(self, url: str) -> Optional[bytes]:
+        host = urlsplit(url).hostname
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(settings.SCRAPER_MAX_CONCURRENCY_PER_HOST)
+        async with semaphore:
+            try:
+                response = await self._get_client().get(url)
+            except httpx.HTTPError as e:
+                print(f"[SCRAPER] Request failed for {url}: {e}")
+                return None
+        if response.status_code != 200:
+            print(f"[SCRAPER] HTTP error {response.status_code} for {url}")
+            return None
+        return response.content
+    
+    async def _fetch_pages(self, path: str) -> ChampionPages:
+        build, counter = await asyncio.gather(
+            self._fetch(f"{UGG_CHAMPIONS_URL}/{path}/build"),
+            self._fetch(f"{UGG_CHAMPIONS_URL}/{path}/counter"),
+        )
+        return ChampionPages(build, counter)
+    
+    def get_pages(self, champion_name: str, role: Optional[str] = None) -> ChampionPages:
+        """Build and counter pages of a champion, fetched at most once per SCRAPER_PAGE_TTL"""
+        path = champion_path(champion_name, role)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pages.get(path)
+            if entry is None or entry[0] <= now:
+                for key in [key for key, (expires_at, _) in self._pages.items() if expires_at <= now]:
+                    del self._pages[key]
+                future = asyncio.run_coroutine_threadsafe(self._fetch_pages(path), self._get_loop())
+                entry = self._pages[path] = (now + settings.SCRAPER_PAGE_TTL, future)
+        return entry[1].result()
+    
+    def close(self):
+        """Close pooled connections and stop the event loop (called on application shutdown)"""
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop, self._client = None, None
+            self._semaphores, self._pages = {}, {}
+        if loop is None:
+            return
+        if client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+            except Exception as e:
+                print(f"[SCRAPER] Error closing HTTP client: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+
+
+class JsonPath:
+    """Precompiled path into decoded JSON, matched with an iterative depth-first walk.
+    
+    Steps are separated by dots: a key (or alternatives "a|b"), a list index, "*" for
+    every child, "**" for any depth including none, and "[a|b]" to keep only objects
+    having key a or b. "**.counters" matches every "counters" value in the document.
     """
-    champion_formatted = champion_name.lower().replace(" ", "-").replace("'", "")
     
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        "Accept": "text/html",
-        "Accept-Language": "en-US",
-    }
+    def __init__(self, path: str):
+        self.path = path
+        self.steps = tuple(self._compile(step) for step in path.split("."))
+        # Whether each step only matches objects or lists, letting "**" skip scalars before it
+        self._containers_only = tuple(kind in ("key", "has", "index") for kind, _ in self.steps) + (False,)
+    
+    @staticmethod
+    def _compile(step: str) -> Tuple[str, Any]:
+        if step in ("*", "**"):
+            return step, None
+        if step.startswith("[") and step.endswith("]"):
+            return "has", frozenset(step[1:-1].split("|"))
+        if step.isdigit():
+            return "index", int(step)
+        return "key", tuple(step.split("|"))
     
-    build_url = f"https://u.gg/lol/champions/{champion_formatted}/build"
+    def iter(self, data: Any) -> Iterator[Any]:
+        """Every match, parents before their descendants"""
+        steps = self.steps
+        containers_only = self._containers_only
+        stack = [(data, 0)]
+        while stack:
+            node, i = stack.pop()
+            if i == len(steps):
+                yield node
+                continue
+            kind, arg = steps[i]
+            if kind == "key":
+                if isinstance(node, dict):
+                    stack.extend((node[key], i + 1) for key in reversed(arg) if key in node)
+            elif kind == "has":
+                if isinstance(node, dict) and not arg.isdisjoint(node):
+                    stack.append((node, i + 1))
+            elif kind == "index":
+                if isinstance(node, list) and arg < len(node):
+                    stack.append((node[arg], i + 1))
+            else:
+                children = node.values() if isinstance(node, dict) else node if isinstance(node, list) else ()
+                if kind == "**":
+                    if containers_only[i + 1]:
+                        # Scalars hold no matches and cannot match the next step
+                        stack.extend((child, i) for child in reversed(children) if isinstance(child, (dict, list)))
+                    else:
+                        stack.extend((child, i) for child in reversed(children))
+                    stack.append((node, i + 1))  # Zero depth, matched first
+                else:
+                    stack.extend((child, i + 1) for child in reversed(children))
     
+    def first(self, data: Any, default: Any = None) -> Any:
+        """First match, without walking the rest of the document"""
+        return next(self.iter(data), default)
+
+
+# Selectors over u.gg's embedded page data
+STATS_PATHS = [
+    JsonPath("**.[winRate|win_rate].[pickRate|pick_rate|pickrate|popularity]"),  # Overview stats
+    JsonPath("**.[winRate|win_rate]"),
+]
+COUNTERS_PATH = JsonPath("**.counters")
+MATCHUP_LISTS_PATH = JsonPath("**.counters|matchups|strongAgainst|weakAgainst|champions")
+
+_NEXT_DATA_ID = b'id="__NEXT_DATA__"'
+_SCRIPT_END = b"</script>"
+
+
+def extract_next_data(html: bytes) -> Optional[Any]:
+    """Decoded __NEXT_DATA__ JSON of a Next.js page, found by byte search rather than by
+    parsing the HTML; None if the page has none"""
+    start = html.find(_NEXT_DATA_ID)
+    if start < 0:
+        return None
+    start = html.find(b">", start) + 1
+    end = html.find(_SCRIPT_END, start)
+    if start == 0 or end < 0:
+        return None
     try:
-        r = requests.get(build_url, headers=headers, timeout=15)
-        
-        if r.status_code != 200:
+        return orjson.loads(memoryview(html)[start:end])
+    except orjson.JSONDecodeError:
+        return None
+
+
+def _percent(value) -> Optional[float]:
+    """Rate as a percentage; fractions (below 1) are scaled up"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return round(value * 100 if value < 1 else value, 2)
+
+
+def extract_counters_from_json(data, limit: int = 10) -> List[Dict]:
+    """Entries of the first non-empty "counters" list in a counter page's data"""
+    raw = next((value for value in COUNTERS_PATH.iter(data) if isinstance(value, list) and value), [])
+    counters = []
+    for item in raw[:limit]:
+        if not isinstance(item, dict):
+            continue
+        name = item.get('name') or item.get('champion') or item.get('key')
+        win = item.get('winRate') or item.get('win_rate')
+        games = item.get('games') or item.get('numGames')
+        if name and win is not None:
+            try:
+                counters.append({
+                    'champion': name,
+                    'win_rate': round(float(win), 2),
+                    'games': int(games) if games else None
+                })
+            except (TypeError, ValueError):
+                pass
+    return counters
+
+
+def get_champion_data(champion_name: str, role: str | None = None):
+    """
+    Get comprehensive champion data from u.gg by scraping their web pages.
+    
+    Fetches win/pick/ban rates from the /build page and counter data from the /counter page.
+    """
+    try:
+        pages = ugg_client.get_pages(champion_name, role)
+        if pages.build is None:
             return None
         
-        soup = bs(r.text, "html.parser")
-        stats = extract_stats_from_build_page(r.text, soup, champion_name)
+        # Embedded page data first; the full HTML parse is only a fallback
+        data = extract_next_data(pages.build)
+        stats = extract_champion_info_from_json(data, champion_name) if data is not None else None
+        if stats is None:
+            html_text = pages.build.decode("utf-8", "replace")
+            stats = extract_stats_from_build_page(html_text, bs(html_text, "html.parser"), champion_name)
         
-        counter_url = f"https://u.gg/lol/champions/{champion_formatted}/counter"
-        r2 = requests.get(counter_url, headers=headers, timeout=15)
-        
-        if r2.status_code == 200:
-            soup2 = bs(r2.text, "html.parser")
-            counters = extract_counters_from_page(soup2)
+        if pages.counter is not None:
+            data = extract_next_data(pages.counter)
+            counters = extract_counters_from_json(data) if data is not None else []
+            if not counters:
+                counters = extract_counters_from_page(bs(pages.counter.decode("utf-8", "replace"), "html.parser"))
             stats['counters'] = counters
             stats['weak_against'] = counters
         
@@ -105,7 +336,11 @@ def get_simulated_champion_data(champion_name: str):
     }
 
 def extract_champion_info_from_json(data, champion_name):
-    """Extract champion information from u.gg's JSON data"""
+    """Extract champion information from u.gg's JSON data, or None if it has no stats"""
+    stats = next(filter(None, (path.first(data) for path in STATS_PATHS)), None)
+    if stats is None:
+        return None
+    
     champion_data = {
         'name': champion_name,
         'win_rate': 50.0,
@@ -115,77 +350,30 @@ def extract_champion_info_from_json(data, champion_name):
         'strong_against': [],
         'weak_against': []
     }
+    fields = {
+        'win_rate': ('winRate', 'win_rate', 'wr'),
+        'pick_rate': ('pickRate', 'pick_rate', 'pickrate', 'popularity'),
+        'ban_rate': ('banRate', 'ban_rate', 'banrate'),
+    }
+    for field, keys in fields.items():
+        value = _percent(next((stats[key] for key in keys if stats.get(key)), None))
+        if value is not None:
+            champion_data[field] = value
     
-    # More aggressive search - look for champion stats in the JSON structure
-    def find_champion_data(obj, path=""):
-        if isinstance(obj, dict):
-            # Check for champion stats object
-            if 'winRate' in obj or 'win_rate' in obj:
-                # This might be a champion stat object
-                wr = obj.get('winRate') or obj.get('win_rate') or obj.get('wr')
-                pr = obj.get('pickRate') or obj.get('pick_rate') or obj.get('pickrate') or obj.get('popularity')
-                br = obj.get('banRate') or obj.get('ban_rate') or obj.get('banrate')
-                
-                # Extract win rate
-                if wr is not None:
-                    try:
-                        wr_val = float(wr)
-                        if wr_val < 1:
-                            wr_val = wr_val * 100
-                        champion_data['win_rate'] = round(wr_val, 2)
-                    except:
-                        pass
-                
-                # Extract pick rate
-                if pr is not None:
-                    try:
-                        pr_val = float(pr)
-                        if pr_val < 1:
-                            pr_val = pr_val * 100
-                        champion_data['pick_rate'] = round(pr_val, 2)
-                    except:
-                        pass
-                
-                # Extract ban rate
-                if br is not None:
-                    try:
-                        br_val = float(br)
-                        if br_val < 1:
-                            br_val = br_val * 100
-                        champion_data['ban_rate'] = round(br_val, 2)
-                    except:
-                        pass
-            
-            # Look for counter/matchup data
-            for key in ['counters', 'matchups', 'strongAgainst', 'weakAgainst', 'champions']:
-                if key in obj and isinstance(obj[key], list):
-                    for item in obj[key][:10]:
-                        if isinstance(item, dict):
-                            champ_name = item.get('name') or item.get('championName') or item.get('champion') or item.get('key')
-                            wr = item.get('winRate') or item.get('win_rate') or item.get('wr') or item.get('winRate')
-                            
-                            if champ_name:
-                                try:
-                                    wr_val = float(wr) if wr is not None else 50.0
-                                    if wr_val < 1:
-                                        wr_val = wr_val * 100
-                                    if wr_val < 50:  # Difficult matchup
-                                        champion_data['weak_against'].append({
-                                            'champion': champ_name,
-                                            'win_rate': round(wr_val, 2)
-                                        })
-                                except:
-                                    pass
-            
-            # Recursively search
-            for k, v in obj.items():
-                find_champion_data(v, f"{path}.{k}")
-                
-        elif isinstance(obj, list):
-            for i, item in enumerate(obj):
-                find_champion_data(item, f"{path}[{i}]")
-    
-    find_champion_data(data)
+    # Difficult matchups from any counter/matchup list
+    for matchups in MATCHUP_LISTS_PATH.iter(data):
+        if not isinstance(matchups, list):
+            continue
+        for item in matchups[:10]:
+            if not isinstance(item, dict):
+                continue
+            champ_name = item.get('name') or item.get('championName') or item.get('champion') or item.get('key')
+            wr = _percent(item.get('winRate') or item.get('win_rate') or item.get('wr'))
+            if champ_name and wr is not None and wr < 50:
+                champion_data['weak_against'].append({
+                    'champion': champ_name,
+                    'win_rate': wr
+                })
     
     # Extract counters from weak_against
     champion_data['counters'] = champion_data['weak_against']
@@ -320,58 +508,19 @@ def extract_champion_info_from_html(soup, champion_name):
     return get_simulated_champion_data(champion_name)
 
 def get_champion_counters(champion_name: str, role: str | None = None):
-    role_segment = f"/{role.lower()}" if role else ""
-    url = f"https://u.gg/lol/champions/{champion_name}{role_segment}/counter"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": "https://u.gg/",
-    }
-    r = requests.get(url, headers=headers, timeout=20)
-    if r.status_code != 200:
-        print("HTTP error:", r.status_code)
+    # Shares the pages get_champion_data fetched for the same champion
+    pages = ugg_client.get_pages(champion_name, role)
+    if pages.counter is None:
         return []
 
-    soup = bs(r.text, "html.parser")
-    script = soup.find("script", id="__NEXT_DATA__")
-    if script and script.string:
-        try:
-            data = json.loads(script.string)
-            # Heuristic extraction from embedded data
-            def walk(obj):
-                if isinstance(obj, dict):
-                    for k, v in obj.items():
-                        if k == 'counters' and isinstance(v, list) and v:
-                            return v
-                        found = walk(v)
-                        if found is not None:
-                            return found
-                elif isinstance(obj, list):
-                    for item in obj:
-                        found = walk(item)
-                        if found is not None:
-                            return found
-                return None
-            raw = walk(data)
-            result_list = []
-            if isinstance(raw, list):
-                for item in raw[:10]:
-                    name = item.get('name') or item.get('champion') or item.get('key')
-                    win = item.get('winRate') or item.get('win_rate')
-                    games = item.get('games') or item.get('numGames')
-                    if name and win is not None:
-                        result_list.append({
-                            'champion': name,
-                            'win_rate': round(float(win), 2),
-                            'games': int(games) if games else None
-                        })
-            if result_list:
-                return result_list
-        except Exception:
-            pass
+    data = extract_next_data(pages.counter)
+    if data is not None:
+        result_list = extract_counters_from_json(data)
+        if result_list:
+            return result_list
 
     # Fallback to static scrape (may be empty due to JS)
+    soup = bs(pages.counter.decode("utf-8", "replace"), "html.parser")
     result = []
     champs = soup.find_all("div", class_="text-white text-[14px] font-bold truncate")
     counters = soup.find_all("div", class_="text-[12px] font-bold leading-[15px] whitespace-nowrap text-right text-accent-blue-400")
@@ -389,4 +538,8 @@ def get_champion_counters(champion_name: str, role: str | None = None):
             'win_rate': win_rate,
             'games': None
         })
-    return result
\ No newline at end of file
+    return result
+
+
+# Global instance
+ugg_client = UggClient()
@@ -17,15 +17,23 @@ class Base(DeclarativeBase):
     pass
 
 # Redis Setup
-redis_client = None
-try:
-    redis_client = redis.Redis(
+def connect_redis(decode_responses: bool = True):
+    """New Redis client; raises if the server does not answer"""
+    client = redis.Redis(
         host=settings.REDIS_HOST,
         port=settings.REDIS_PORT,
         db=settings.REDIS_DB,
-        decode_responses=True
+        decode_responses=decode_responses
     )
-    redis_client.ping()
+    client.ping()
+    return client
+
+
+redis_client = None
+redis_binary_client = None  # Same server without response decoding, for binary cache values
+try:
+    redis_client = connect_redis()
+    redis_binary_client = connect_redis(decode_responses=False)
     print(" Connected to Redis")
 except Exception as e:
     print(f" Redis connection failed (caching disabled): {e}")
@@ -50,3 +58,8 @@ def init_db():
 def get_redis():
     """Get Redis client"""
     return redis_client
+
+
+def get_redis_binary():
+    """Get Redis client that returns bytes (for values that are not UTF-8 text)"""
+    return redis_binary_client
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Cache codec benchmark.
+
+Encodes and decodes documents shaped like the ones the API caches (a 200-game match
+history, a champion mastery list, a difficult-matchups cube and a matchup details view)
+with every cache codec, plus the legacy json.dumps text format. Reports stored bytes and
+mean encode / decode time per document. No Redis or database is needed.
+
+Usage:
+    python benchmarks/cache_codec_benchmark.py
+    python benchmarks/cache_codec_benchmark.py --iterations 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings require these; the benchmark never talks to Riot or the database
+os.environ.setdefault("RIOT_API_KEY", "benchmark")
+os.environ.setdefault("DB_PASSWORD", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.services import cache_codecs  # noqa: E402
+
+CHAMPIONS = [
+    "Ahri", "Darius", "Garen", "Jinx", "LeeSin", "Lux", "Thresh", "Vi", "Yasuo", "Zed",
+    "Aatrox", "Caitlyn", "Ezreal", "Graves", "Kaisa", "Leona", "Lulu", "Orianna", "Sett", "Viego",
+]
+ROLES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+MODES = ["RANKED_SOLO_5x5", "RANKED_FLEX_SR", "NORMAL_DRAFT", "ARAM"]
+
+
+def match_history(rng: random.Random, games: int = 200):
+    """Same fields as /users/match-history"""
+    start = datetime(2026, 9, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "match_id": f"NA1_{5000000000 + i}",
+            "champion": rng.choice(CHAMPIONS),
+            "opponent_champion": rng.choice(CHAMPIONS),
+            "team_position": rng.choice(ROLES),
+            "win": rng.random() < 0.5,
+            "game_duration": round(rng.uniform(18, 42), 2),
+            "kda": {"kills": rng.randint(0, 15), "deaths": rng.randint(0, 12), "assists": rng.randint(0, 20)},
+            "cs_per_min": round(rng.uniform(1, 10), 2),
+            "gold_per_min": round(rng.uniform(250, 550), 2),
+            "kill_participation": round(rng.random(), 3),
+            "damage_to_champs_per_min": round(rng.uniform(200, 1200), 2),
+            "game_creation": (start + timedelta(hours=7 * i)).isoformat(),
+            "queue_id": 420,
+            "game_mode": rng.choice(MODES),
+        }
+        for i in range(games)
+    ]
+
+
+def champion_mastery(rng: random.Random, champions: int = 170):
+    """Same fields as /users/champion-mastery"""
+    return [
+        {
+            "champion_id": i + 1,
+            "champion_name": f"{rng.choice(CHAMPIONS)}{i}",
+            "champion_level": rng.randint(1, 7),
+            "champion_points": rng.randint(100, 500000),
+            "last_played": "2026-09-14T18:22:05",
+        }
+        for i in range(champions)
+    ]
+
+
+def matchup_entry(rng: random.Random, champion: str):
+    games = rng.randint(3, 60)
+    wins = rng.randint(0, games // 2)
+    return {
+        "champion": champion,
+        "games_played": games,
+        "wins": wins,
+        "losses": games - wins,
+        "win_rate": round(wins / games * 100, 1),
+        "avg_kda": {"kills": round(rng.uniform(2, 9), 1), "deaths": round(rng.uniform(2, 8), 1),
+                    "assists": round(rng.uniform(2, 12), 1)},
+        "avg_cs_per_min": round(rng.uniform(1, 9), 1),
+        "avg_damage_per_min": round(rng.uniform(200, 1100), 1),
+    }
+
+
+def difficult_matchups_cube(rng: random.Random):
+    """Same shape as MatchupAnalyzer.get_difficult_matchups_cube"""
+    return {
+        f"{role}|{mode}": [matchup_entry(rng, champion) for champion in rng.sample(CHAMPIONS, 10)]
+        for role in ROLES + ["all"] for mode in MODES + ["all"]
+    }
+
+
+def matchup_details(rng: random.Random):
+    """Same shape as MatchupAnalyzer.analyze_matchup_details"""
+    return {
+        "opponent": "Zed",
+        "total_games": 48,
+        "overall": matchup_entry(rng, "Zed"),
+        "by_role": {role: matchup_entry(rng, "Zed") for role in ROLES},
+        "by_game_mode": {mode: matchup_entry(rng, "Zed") for mode in MODES},
+        "recent_matches": match_history(rng, 10),
+    }
+
+
+def bench(encode, decode, document, iterations: int):
+    encoded = encode(document)
+    assert decode(encoded) == json.loads(json.dumps(document))
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(document)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode(encoded)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+    return len(encoded), encode_us, decode_us
+
+
+def main(iterations: int):
+    rng = random.Random(42)
+    documents = {
+        "match_history (200 games)": match_history(rng),
+        "champion_mastery (170)": champion_mastery(rng),
+        "difficult_matchups_cube": difficult_matchups_cube(rng),
+        "matchup_details": matchup_details(rng),
+    }
+    formats = {
+        # What CacheService stored before codecs: json text, decoded by redis-py then parsed
+        "legacy json": (lambda v: json.dumps(v).encode(), lambda raw: json.loads(raw.decode())),
+        **{
+            name: (lambda v, name=name: cache_codecs.encode(v, name), cache_codecs.decode)
+            for name in cache_codecs.CODECS
+        },
+    }
+
+    for label, document in documents.items():
+        print(f"\n{label}")
+        print(f"  {'format':<14}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+        baseline = None
+        for name, (encode, decode) in formats.items():
+            size, encode_us, decode_us = bench(encode, decode, document, iterations)
+            baseline = baseline or size
+            print(f"  {name:<14}{size:>10}{encode_us:>12.1f}{decode_us:>12.1f}   ({size / baseline:.0%} of json)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    main(args.iterations)
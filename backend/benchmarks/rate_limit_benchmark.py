@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Shared rate limiter benchmark.
+
+Starts a stub Riot server that enforces fixed rate limit windows the way Riot does
+(answering 429 once a window is exhausted), then runs N worker processes that all call it
+through RiotAPIService with the same key. Reports aggregate throughput against the
+configured ceiling and how many 429s the stub handed out.
+
+Usage:
+    python benchmarks/rate_limit_benchmark.py --workers 4 --duration 10
+    python benchmarks/rate_limit_benchmark.py --workers 4 --local   # per-process limiter, for comparison
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings require these; the benchmark never talks to the real Riot API or database
+os.environ.setdefault("RIOT_API_KEY", "benchmark")
+os.environ.setdefault("DB_PASSWORD", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+class StubRiotState:
+    def __init__(self, limits):
+        self.limits = limits
+        self.windows = {window: [0.0, 0] for _, window in limits}
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def hit(self):
+        """Count a request against every window; returns (accepted, retry_after, counts)"""
+        with self.lock:
+            now = time.monotonic()
+            retry_after = 0.0
+            for limit, window in self.limits:
+                state = self.windows[window]
+                if now >= state[0] + window:
+                    state[0], state[1] = now, 0
+                if state[1] >= limit:
+                    retry_after = max(retry_after, state[0] + window - now)
+            if retry_after > 0:
+                self.rejected += 1
+            else:
+                for _, window in self.limits:
+                    self.windows[window][1] += 1
+                self.accepted += 1
+            counts = ",".join(f"{self.windows[w][1]}:{w}" for _, w in self.limits)
+            return retry_after == 0, retry_after, counts
+
+
+def make_handler(state: StubRiotState):
+    limit_header = ",".join(f"{limit}:{window}" for limit, window in state.limits)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            accepted, retry_after, counts = state.hit()
+            body = json.dumps({"metadata": {"matchId": self.path.rsplit("/", 1)[-1]}, "info": {}}).encode()
+            self.send_response(200 if accepted else 429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("X-App-Rate-Limit", limit_header)
+            self.send_header("X-App-Rate-Limit-Count", counts)
+            if not accepted:
+                self.send_header("Retry-After", str(math.ceil(retry_after)))
+                self.send_header("X-Rate-Limit-Type", "application")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run_worker(stub_url, limits, start_at, duration, concurrency, redis_url, key_prefix, padding, local):
+    from app.services.rate_limiter import RateLimiter, RedisRateLimiter
+    from app.services.riot_api import RiotAPIService
+
+    if local:
+        limiter = RateLimiter(default_app_limits=limits)
+    else:
+        import redis
+        limiter = RedisRateLimiter(redis.Redis.from_url(redis_url, decode_responses=True),
+                                   default_app_limits=limits, key_prefix=key_prefix,
+                                   window_padding=padding)
+    riot = RiotAPIService(base_url=stub_url, account_url=stub_url, rate_limiter=limiter)
+
+    async def main():
+        # Start every worker at the same wall-clock instant, after process start-up
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        done = 0
+        deadline = time.monotonic() + duration
+
+        async def loop(n):
+            nonlocal done
+            i = 0
+            while time.monotonic() < deadline:
+                if await riot.get_match_details(f"BENCH_{os.getpid()}_{n}_{i}"):
+                    done += 1
+                i += 1
+
+        await asyncio.gather(*(loop(n) for n in range(concurrency)))
+        await riot.aclose()
+        return done
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight requests per worker")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--startup", type=float, default=5.0, help="seconds allowed for workers to start")
+    parser.add_argument("--limits", default="20:1,500:120", help="app limits enforced by the stub, Riot header format")
+    parser.add_argument("--padding", type=float, default=0.1,
+                        help="seconds added to each window to absorb clock differences")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--local", action="store_true", help="use the in-process limiter instead of Redis")
+    args = parser.parse_args()
+
+    from app.services.rate_limiter import parse_rate_limit_header
+    limits = parse_rate_limit_header(args.limits)
+
+    state = StubRiotState(limits)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    key_prefix = f"bench:ratelimit:{uuid.uuid4().hex}"
+    start_at = time.time() + args.startup
+    worker_args = [(stub_url, limits, start_at, args.duration, args.concurrency, args.redis_url, key_prefix,
+                    args.padding, args.local)
+                   for _ in range(args.workers)]
+    with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+        per_worker = pool.starmap(run_worker, worker_args)
+    elapsed = time.time() - start_at
+    server.shutdown()
+
+    ceiling = min(math.ceil(args.duration / window) * limit for limit, window in limits)
+    mode = "in-process" if args.local else "redis"
+    print(f"limiter:      {mode}, {args.workers} workers x {args.concurrency} in flight")
+    print(f"stub limits:  {args.limits}")
+    print(f"successes:    {sum(per_worker)} (per worker: {per_worker})")
+    print(f"accepted:     {state.accepted} / ceiling {ceiling} over {args.duration:.0f}s "
+          f"({state.accepted / args.duration:.1f} req/s, wall {elapsed:.1f}s)")
+    print(f"429s:         {state.rejected}")
+
+
+if __name__ == "__main__":
+    main()
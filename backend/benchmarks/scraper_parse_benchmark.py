@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+u.gg page parsing benchmark.
+
+Parses saved build and counter pages with the previous approach (a full BeautifulSoup
+html.parser tree, then regex passes over the text or json.loads and a recursive walk of
+__NEXT_DATA__) and with the current one (byte search for __NEXT_DATA__, orjson, and
+precompiled JsonPath selectors). Reports mean parse time and peak Python memory per page.
+
+The fixtures in benchmarks/fixtures are synthetic: generated pages shaped like u.gg's
+(Tailwind markup around a large __NEXT_DATA__ script), not captured from the site.
+Regenerate them with --write-fixtures. No network, Redis or database is needed.
+
+Usage:
+    python benchmarks/scraper_parse_benchmark.py
+    python benchmarks/scraper_parse_benchmark.py --iterations 50
+    python benchmarks/scraper_parse_benchmark.py --write-fixtures
+"""
+
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings require these; the benchmark never talks to u.gg or the database
+os.environ.setdefault("RIOT_API_KEY", "benchmark")
+os.environ.setdefault("DB_PASSWORD", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from bs4 import BeautifulSoup as bs  # noqa: E402
+from app.services import scraper  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CHAMPION = "Ahri"
+CHAMPIONS = [
+    "Aatrox", "Akali", "Anivia", "Annie", "Azir", "Cassiopeia", "Corki", "Diana", "Ekko", "Fizz",
+    "Galio", "Hwei", "Kassadin", "Katarina", "LeBlanc", "Lissandra", "Lux", "Malzahar", "Orianna",
+    "Qiyana", "Ryze", "Sylas", "Syndra", "Taliyah", "Talon", "TwistedFate", "Veigar", "Vex",
+    "Viktor", "Vladimir", "Xerath", "Yasuo", "Yone", "Zed", "Ziggs", "Zoe",
+]
+
+
+def _markup(rng: random.Random, rows: int, counters: bool) -> str:
+    """Server-rendered body: nested Tailwind divs with names and percentages"""
+    parts = ['<div id="__next"><div class="flex flex-col min-h-screen bg-purple-600">']
+    for i in range(rows):
+        champion = rng.choice(CHAMPIONS)
+        parts.append(
+            '<div class="flex items-center justify-between px-[12px] py-[8px] border-b border-purple-400">'
+            f'<a href="/lol/champions/{champion.lower()}/build" class="flex items-center gap-[8px]">'
+            f'<img src="https://static.bigbrain.gg/assets/lol/riot_static/14.20.1/img/champion/{champion}.webp"'
+            f' alt="{champion}" width="32" height="32" loading="lazy"/>'
+            f'<div class="text-white text-[14px] font-bold truncate">{champion}</div></a>'
+            '<div class="text-[12px] font-bold leading-[15px] whitespace-nowrap text-right text-accent-blue-400">'
+            f'{rng.uniform(42, 58):.2f}%</div>'
+            f'<div class="text-[11px] text-lavender-400">{rng.randint(200, 90000):,} Matches</div>'
+            f'<div class="hidden md:block text-[11px]">{rng.uniform(0.1, 20):.1f}% Pick Rate</div></div>'
+        )
+        if not counters and i % 10 == 0:
+            parts.append(
+                '<svg viewBox="0 0 24 24" class="w-[16px] h-[16px] fill-current"><path d="'
+                + " ".join(f"M{rng.randint(0, 24)} {rng.randint(0, 24)}" for _ in range(40)) + '"/></svg>'
+            )
+    parts.append("</div></div>")
+    return "".join(parts)
+
+
+def _matchup(rng: random.Random, champion: str):
+    games = rng.randint(200, 90000)
+    return {
+        "championId": CHAMPIONS.index(champion) + 1,
+        "name": champion,
+        "winRate": round(rng.uniform(42, 58), 2),
+        "games": games,
+        "goldDiff15": round(rng.uniform(-600, 600), 1),
+        "xpDiff15": round(rng.uniform(-500, 500), 1),
+        "csDiff15": round(rng.uniform(-15, 15), 1),
+        "killParticipation": round(rng.uniform(0.3, 0.8), 3),
+    }
+
+
+def _page_data(rng: random.Random, kind: str):
+    """__NEXT_DATA__ payload: page props with builds, rune pages and matchup tables"""
+    builds = [
+        {
+            "items": [rng.randint(1000, 8000) for _ in range(6)],
+            "runes": {"primary": rng.randint(8000, 8500), "perks": [rng.randint(8000, 9200) for _ in range(9)]},
+            "skillOrder": [rng.choice("QWER") for _ in range(18)],
+            "matches": rng.randint(100, 50000),
+            "winRate": round(rng.uniform(45, 56), 2),
+        }
+        for _ in range(300 if kind == "build" else 60)
+    ]
+    matchups = {
+        role: [_matchup(rng, champion) for champion in rng.sample(CHAMPIONS, len(CHAMPIONS))]
+        for role in ["top", "jungle", "mid", "adc", "support"]
+    }
+    page_props = {
+        "champion": {"id": 103, "key": CHAMPION.lower(), "name": CHAMPION, "patch": "14.20"},
+        "overview": {
+            "winRate": 51.23, "pickRate": 7.54, "banRate": 2.1, "matches": 412389, "tier": "A",
+        },
+        "builds": builds,
+        "matchups": matchups,
+        "seo": {"title": f"{CHAMPION} Build", "description": "x" * 400},
+    }
+    if kind == "counter":
+        page_props["counters"] = sorted(
+            (_matchup(rng, champion) for champion in CHAMPIONS), key=lambda m: m["winRate"]
+        )
+    return {
+        "props": {"pageProps": page_props, "__N_SSP": True},
+        "page": f"/lol/champions/[champion]/{kind}",
+        "query": {"champion": CHAMPION.lower()},
+        "buildId": "b1c2d3e4f5",
+        "isFallback": False,
+        "gssp": True,
+    }
+
+
+def write_fixtures():
+    rng = random.Random(7)
+    os.makedirs(FIXTURES, exist_ok=True)
+    for kind in ("build", "counter"):
+        html = (
+            '<!DOCTYPE html><html lang="en"><head><meta charSet="utf-8"/>'
+            f"<title>{CHAMPION} {kind.title()} - U.GG</title>"
+            + "".join(f'<link rel="preload" href="/_next/static/chunks/{i:04x}.js" as="script"/>' for i in range(60))
+            + "</head><body>"
+            + _markup(rng, 600 if kind == "build" else 400, counters=kind == "counter")
+            + '<script id="__NEXT_DATA__" type="application/json">'
+            + json.dumps(_page_data(rng, kind), separators=(",", ":"))
+            + "</script></body></html>"
+        )
+        path = os.path.join(FIXTURES, f"ugg_{CHAMPION.lower()}_{kind}.html.gz")
+        with open(path, "wb") as f:
+            f.write(gzip.compress(html.encode(), mtime=0))
+        print(f"Wrote {path} ({len(html) / 1024:.0f} KiB uncompressed)")
+
+
+def load_fixture(kind: str) -> bytes:
+    with gzip.open(os.path.join(FIXTURES, f"ugg_{CHAMPION.lower()}_{kind}.html.gz"), "rb") as f:
+        return f.read()
+
+
+# Previous parsing paths (what get_champion_data / get_champion_counters did with response.text)
+
+def legacy_build_stats(html: bytes):
+    text = html.decode()
+    return scraper.extract_stats_from_build_page(text, bs(text, "html.parser"), CHAMPION)
+
+
+def legacy_counter_page_heuristic(html: bytes):
+    return scraper.extract_counters_from_page(bs(html.decode(), "html.parser"))
+
+
+def legacy_counters(html: bytes):
+    soup = bs(html.decode(), "html.parser")
+    data = json.loads(soup.find("script", id="__NEXT_DATA__").string)
+
+    def walk(obj):
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if k == 'counters' and isinstance(v, list) and v:
+                    return v
+                found = walk(v)
+                if found is not None:
+                    return found
+        elif isinstance(obj, list):
+            for item in obj:
+                found = walk(item)
+                if found is not None:
+                    return found
+        return None
+
+    return [
+        {"champion": item["name"], "win_rate": round(float(item["winRate"]), 2), "games": item["games"]}
+        for item in walk(data)[:10]
+    ]
+
+
+# Current parsing paths
+
+def build_stats(html: bytes):
+    return scraper.extract_champion_info_from_json(scraper.extract_next_data(html), CHAMPION)
+
+
+def counters(html: bytes):
+    return scraper.extract_counters_from_json(scraper.extract_next_data(html))
+
+
+def measure(parse, html: bytes, iterations: int):
+    """Mean milliseconds per parse and peak traced KiB of one parse"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        parse(html)  # Warm up imports and caches
+        start = time.perf_counter()
+        for _ in range(iterations):
+            parse(html)
+        elapsed_ms = (time.perf_counter() - start) / iterations * 1000
+
+        tracemalloc.start()
+        parse(html)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed_ms, peak / 1024
+
+
+def main(iterations: int):
+    pages = {kind: load_fixture(kind) for kind in ("build", "counter")}
+    cases = [
+        ("build page stats", "build", legacy_build_stats, build_stats),
+        ("counter page counters", "counter", legacy_counters, counters),
+        ("counter page (get_champion_data)", "counter", legacy_counter_page_heuristic, counters),
+    ]
+    print(f"{'page':<34}{'KiB':>6}{'before ms':>11}{'after ms':>10}{'before peak KiB':>17}{'after peak KiB':>16}")
+    for label, kind, before, after in cases:
+        html = pages[kind]
+        before_ms, before_peak = measure(before, html, iterations)
+        after_ms, after_peak = measure(after, html, iterations)
+        print(f"{label:<34}{len(html) / 1024:>6.0f}{before_ms:>11.2f}{after_ms:>10.2f}"
+              f"{before_peak:>17.0f}{after_peak:>16.0f}   ({before_ms / after_ms:.0f}x faster)")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stats = build_stats(pages["build"])
+    print(f"\nafter: win rate {stats['win_rate']}, pick rate {stats['pick_rate']}, ban rate {stats['ban_rate']}")
+    print(f"after: top counter {counters(pages['counter'])[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--write-fixtures", action="store_true", help="Regenerate the synthetic fixtures and exit")
+    args = parser.parse_args()
+    if args.write_fixtures:
+        write_fixtures()
+    else:
+        main(args.iterations)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Build the global champion-vs-champion matchup matrix
+Run this script periodically (e.g. hourly from cron). It aggregates every stored
+lane matchup on the most recent patches, rebuilds the champion similarity table from
+the same games (so it follows new patch data), and replaces the matrix file that the
+API loads; running API processes pick up the new file on their next lookup.
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.matchup_matrix import build_matchup_matrix
+from app.utils.database import SessionLocal
+from config.settings import settings
+
+
+def main(path: str, patches: int):
+    db = SessionLocal()
+    try:
+        matrix = build_matchup_matrix(db, patches)
+    finally:
+        db.close()
+
+    matrix.save(path)
+    print(
+        f"Matchup matrix written to {path}: {len(matrix.champions)} champions, "
+        f"patches {', '.join(matrix.patches) or 'none'}, {int(matrix.total_games.sum())} lane games"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--path", default=settings.MATCHUP_MATRIX_PATH)
+    parser.add_argument("--patches", type=int, default=settings.MATCHUP_MATRIX_PATCHES)
+    args = parser.parse_args()
+    main(args.path, args.patches)
@@ -1,5 +1,9 @@
-﻿from pydantic_settings import BaseSettings
-from typing import Optional, Union
+﻿import os
+from pydantic_settings import BaseSettings
+from typing import Dict, Optional, Union
+
+# Relative data paths below are resolved from here, not from the working directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class Settings(BaseSettings):
@@ -36,16 +40,100 @@ class Settings(BaseSettings):
     CACHE_MATCH_HISTORY_TTL: int = 3600
     CACHE_CHAMPION_MASTERY_TTL: int = 7200
     CACHE_MATCHUP_DATA_TTL: int = 86400
+    CACHE_USER_VERSION_TTL: int = 30 * 86400  # Life of per-user data versions; must exceed every cache TTL
+    
+    # In-process L1 cache in front of Redis (see app/services/cache_service.py)
+    CACHE_L1_ENABLED: bool = True
+    CACHE_L1_MAX_BYTES: int = 32 * 1024 * 1024  # Serialized size of all L1 values per worker
+    CACHE_L1_DEFAULT_TTL: int = 30  # Seconds; capped by the Redis TTL of each key
+    CACHE_L1_TTLS: Dict[str, int] = {  # Per-namespace L1 TTLs (0 = Redis only)
+        "match_history": 60,
+        "champion_mastery": 300,
+        "difficult_matchups_cube": 120,
+        "matchup_details": 120,
+        "recommendations": 120,
+        "data": 60,
+    }
+    
+    # Cache value encoding (see app/services/cache_codecs.py)
+    CACHE_CODEC_DEFAULT: str = "orjson"  # orjson, msgpack or zstd_msgpack
+    CACHE_CODECS: Dict[str, str] = {  # Per-namespace codecs for large documents
+        "match_history": "zstd_msgpack",
+        "data": "zstd_msgpack",
+        "difficult_matchups_cube": "zstd_msgpack",
+    }
+    CACHE_ZSTD_LEVEL: int = 3
+    
+    # Cache stampede protection
+    CACHE_LOCK_TIMEOUT_SECONDS: int = 30  # Expiry of the cross-worker recompute lock
+    CACHE_LOCK_WAIT_SECONDS: float = 3.0  # How long a caller waits for another's recompute
+    CACHE_EARLY_REFRESH_BETA: float = 1.0  # Eagerness of probabilistic early refresh (0 = off)
+    CACHE_CHAMPION_STATS_TTL: int = 86400
+    CACHE_CHAMPION_STATS_STALE_TTL: int = 86400  # Serve scraped stats this long past expiry while refreshing
+    
+    # Cache fallback while Redis is unreachable
+    CACHE_LOCAL_FALLBACK_ENABLED: bool = True
+    CACHE_LOCAL_PATH: str = "data/cache.sqlite3"  # Shared by the workers on one host
+    CACHE_LOCAL_MAX_BYTES: int = 256 * 1024 * 1024
+    CACHE_REDIS_RETRY_SECONDS: float = 10.0  # Interval between reconnection attempts
+    
+    # Analytics time windows
+    CURRENT_SPLIT_START: str = "2026-08-27"  # First day (UTC) of the current ranked split, for window=split
     
     # Rate Limiting
     RIOT_API_RATE_LIMIT_PER_SECOND: int = 20
     RIOT_API_RATE_LIMIT_PER_TWO_MINUTES: int = 100
+    RIOT_API_MAX_RETRIES: int = 3  # Retries after a 429, each waiting for Retry-After
+    RIOT_API_SHARED_RATE_LIMIT: bool = True  # Share limiter state across workers through Redis
+    RIOT_API_RATE_LIMIT_LEASE_SIZE: int = 1  # Tokens reserved per Redis round trip
+    RIOT_API_RATE_LIMIT_WINDOW_PADDING: float = 0.1  # Seconds added to shared windows to absorb clock differences
+    
+    # Riot API HTTP client (pooled connections per routing host)
+    RIOT_API_MAX_CONNECTIONS: int = 20
+    RIOT_API_TIMEOUT: float = 10.0
+    RIOT_API_HTTP2: bool = False  # Requires the h2 package (pip install httpx[http2])
+    
+    # u.gg scraper HTTP client
+    SCRAPER_MAX_CONNECTIONS: int = 10
+    SCRAPER_MAX_CONCURRENCY_PER_HOST: int = 4  # Requests in flight per host
+    SCRAPER_TIMEOUT: float = 15.0
+    SCRAPER_PAGE_TTL: int = 60  # Seconds a fetched page is shared between callers
+    
+    # Match ingestion pipeline
+    MATCH_INGEST_CONCURRENCY: int = 10  # Match detail requests in flight (capped at the per-second limit)
+    MATCH_INGEST_BATCH_SIZE: int = 50  # Rows committed per database write
+    MATCH_SYNC_PAGE_SIZE: int = 100  # Match IDs per match-v5 ID list call (Riot maximum)
+    MATCH_BACKFILL_PAGES_PER_RUN: int = 5  # Older ID pages ingested per background backfill run
+    
+    # Raw match archive (zstd segments of match-v5 JSON, for reprocessing without the API)
+    MATCH_ARCHIVE_ENABLED: bool = True
+    MATCH_ARCHIVE_DIR: str = "data/match_archive"
+    MATCH_ARCHIVE_SEGMENT_BYTES: int = 256 * 1024 * 1024
+    MATCH_ARCHIVE_COMPRESSION_LEVEL: int = 10
+    
+    # In-process columnar match store for interactive analytics
+    MATCH_COLUMNS_MAX_BYTES: int = 64 * 1024 * 1024  # Total array bytes kept across users (LRU)
+    MATCH_COLUMNS_REFRESH_SECONDS: float = 30.0  # Max age of a user's columns when data versions are unavailable
+    
+    # Global champion-vs-champion matchup matrix (built by build_matchup_matrix.py)
+    MATCHUP_MATRIX_PATH: str = "data/matchup_matrix.npz"
+    MATCHUP_MATRIX_PATCHES: int = 3  # Most recent patches kept in the matrix
+    MATCHUP_MATRIX_MIN_GAMES: int = 5  # Fewest games for a pair to be listed as a counter / strong matchup
+    CHAMPION_SIMILARITY_NEIGHBORS: int = 10  # Similar champions kept per champion
+    CHAMPION_SIMILARITY_MIN_GAMES: int = 20  # Fewest games for a champion to get a play-style vector
+    
+    # Champion recommendations
+    RECOMMENDER_MIN_MASTERY_POINTS: int = 10000  # Champions below this are not recommended
+    RECOMMENDER_PRIOR_GAMES: float = 10.0  # Weight of the global matchup win rate, in games of the user's own
+    RECOMMENDER_MASTERY_WEIGHT: float = 3.0  # Ranking bonus (win rate points) for the user's most played champion
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # Construct DATABASE_URL if not provided directly
         if not self.DATABASE_URL:
             self.DATABASE_URL = f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+        for name in ("CACHE_LOCAL_PATH", "MATCH_ARCHIVE_DIR", "MATCHUP_MATRIX_PATH"):
+            setattr(self, name, os.path.join(BACKEND_DIR, getattr(self, name)))
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,8 @@
+-- One mastery row per (user, champion), required by the single-statement mastery upsert
+DELETE FROM champion_mastery a
+USING champion_mastery b
+WHERE a.user_id = b.user_id
+  AND a.champion_id = b.champion_id
+  AND a.id < b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_champion_mastery_user_champion ON champion_mastery(user_id, champion_id);
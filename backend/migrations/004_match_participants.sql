@@ -0,0 +1,65 @@
+-- Move per-user match rows onto the shared match_info / match_participants tables.
+-- Match is now a read-only view over these tables, so the old matches table is retired.
+-- On a fresh database (no matches table) only the new tables are created.
+
+CREATE TABLE IF NOT EXISTS match_info (
+    id SERIAL PRIMARY KEY,
+    match_id VARCHAR(50) NOT NULL UNIQUE,
+    queue_id INTEGER,
+    game_mode VARCHAR(50),
+    game_duration DOUBLE PRECISION NOT NULL,
+    game_version VARCHAR(30),
+    game_creation TIMESTAMP WITH TIME ZONE,
+    participants_complete BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+ALTER TABLE match_info ADD COLUMN IF NOT EXISTS participants_complete BOOLEAN NOT NULL DEFAULT true;
+CREATE INDEX IF NOT EXISTS ix_match_info_game_creation ON match_info(game_creation);
+
+CREATE TABLE IF NOT EXISTS match_participants (
+    id SERIAL PRIMARY KEY,
+    match_id VARCHAR(50) NOT NULL REFERENCES match_info(match_id),
+    puuid VARCHAR(100) NOT NULL,
+    team_id INTEGER,
+    champion VARCHAR(50) NOT NULL,
+    opponent_champion VARCHAR(50),
+    team_position VARCHAR(20) NOT NULL,
+    win BOOLEAN NOT NULL,
+    kills INTEGER NOT NULL,
+    deaths INTEGER NOT NULL,
+    assists INTEGER NOT NULL,
+    cs_per_min DOUBLE PRECISION NOT NULL,
+    gold_per_min DOUBLE PRECISION NOT NULL,
+    kill_participation DOUBLE PRECISION NOT NULL,
+    damage_to_champs_per_min DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_match_participants_match_puuid ON match_participants(match_id, puuid);
+CREATE INDEX IF NOT EXISTS ix_match_participants_puuid ON match_participants(puuid);
+
+-- Backfill from the old per-user table. Only tracked players were stored there, so the
+-- matches are marked incomplete and ingestion refetches them with every participant.
+DO $$
+BEGIN
+    IF to_regclass('matches') IS NOT NULL THEN
+        INSERT INTO match_info (match_id, queue_id, game_mode, game_duration, game_creation, participants_complete, created_at)
+        SELECT DISTINCT ON (match_id) match_id, queue_id, game_mode, game_duration, game_creation, false, created_at
+        FROM matches
+        ORDER BY match_id, id
+        ON CONFLICT (match_id) DO NOTHING;
+
+        INSERT INTO match_participants (
+            match_id, puuid, champion, opponent_champion, team_position, win,
+            kills, deaths, assists, cs_per_min, gold_per_min, kill_participation,
+            damage_to_champs_per_min, created_at
+        )
+        SELECT m.match_id, u.puuid, m.champion, m.opponent_champion, m.team_position, m.win,
+               m.kills, m.deaths, m.assists, m.cs_per_min, m.gold_per_min, m.kill_participation,
+               m.damage_to_champs_per_min, m.created_at
+        FROM matches m
+        JOIN users u ON u.id = m.user_id
+        ON CONFLICT (match_id, puuid) DO NOTHING;
+
+        ALTER TABLE matches RENAME TO matches_legacy;
+    END IF;
+END $$;
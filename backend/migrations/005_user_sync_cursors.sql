@@ -0,0 +1,21 @@
+-- Per-user match sync cursor: refreshes page forward from newest_game_start, the
+-- background backfill pages backward from backfill_end_time
+CREATE TABLE IF NOT EXISTS user_sync_cursors (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    newest_game_start BIGINT,
+    backfill_end_time BIGINT,
+    backfill_complete BOOLEAN NOT NULL DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    last_updated TIMESTAMP WITH TIME ZONE
+);
+
+-- Seed cursors for users that already have matches, so their next refresh is incremental
+INSERT INTO user_sync_cursors (user_id, newest_game_start, backfill_end_time)
+SELECT u.id,
+       floor(extract(epoch FROM max(mi.game_creation)))::bigint,
+       floor(extract(epoch FROM min(mi.game_creation)))::bigint
+FROM users u
+JOIN match_participants mp ON mp.puuid = u.puuid
+JOIN match_info mi ON mi.match_id = mp.match_id
+GROUP BY u.id
+ON CONFLICT (user_id) DO NOTHING;
@@ -0,0 +1,40 @@
+-- matchup_stats was never written; recreate it as running totals keyed by
+-- (user, champion, opponent, role, game mode) and fill it from stored matches
+DROP TABLE IF EXISTS matchup_stats;
+
+CREATE TABLE matchup_stats (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    champion VARCHAR(50) NOT NULL,
+    opponent_champion VARCHAR(50) NOT NULL,
+    team_position VARCHAR(20) NOT NULL,
+    game_mode VARCHAR(50) NOT NULL,
+    games_played INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    total_kills INTEGER NOT NULL,
+    total_deaths INTEGER NOT NULL,
+    total_assists INTEGER NOT NULL,
+    total_cs_per_min DOUBLE PRECISION NOT NULL,
+    total_gold_per_min DOUBLE PRECISION NOT NULL,
+    total_damage_per_min DOUBLE PRECISION NOT NULL,
+    total_game_duration DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_matchup_stats_id ON matchup_stats(id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_matchup_stats_key
+    ON matchup_stats(user_id, champion, opponent_champion, team_position, game_mode);
+
+INSERT INTO matchup_stats (
+    user_id, champion, opponent_champion, team_position, game_mode,
+    games_played, wins, total_kills, total_deaths, total_assists,
+    total_cs_per_min, total_gold_per_min, total_damage_per_min, total_game_duration
+)
+SELECT u.id, mp.champion, mp.opponent_champion, mp.team_position, mi.game_mode,
+       count(*), sum(mp.win::int), sum(mp.kills), sum(mp.deaths), sum(mp.assists),
+       sum(mp.cs_per_min), sum(mp.gold_per_min), sum(mp.damage_to_champs_per_min), sum(mi.game_duration)
+FROM match_participants mp
+JOIN match_info mi ON mi.match_id = mp.match_id
+JOIN users u ON u.puuid = mp.puuid
+WHERE mp.opponent_champion IS NOT NULL AND mi.game_mode IS NOT NULL
+GROUP BY u.id, mp.champion, mp.opponent_champion, mp.team_position, mi.game_mode;
@@ -0,0 +1,53 @@
+-- Matches stored before game_mode existed have it NULL, which kept them out of the
+-- matchup totals and daily rollups. Derive it from the queue the way ingestion does
+-- (get_game_mode), make it required, and rebuild both aggregate tables.
+UPDATE match_info
+SET game_mode = CASE queue_id
+    WHEN 420 THEN 'Ranked Solo/Duo'
+    WHEN 440 THEN 'Ranked Flex'
+    WHEN 450 THEN 'ARAM'
+    WHEN 700 THEN 'Clash'
+    WHEN 900 THEN 'URF'
+    WHEN 1020 THEN 'One for All'
+    WHEN 1300 THEN 'Nexus Blitz'
+    WHEN 1400 THEN 'Ultimate Spellbook'
+    WHEN 1700 THEN 'Arena'
+    WHEN 1900 THEN 'URF'
+    WHEN 2000 THEN 'Tutorial'
+    WHEN 2010 THEN 'Tutorial'
+    WHEN 2020 THEN 'Tutorial'
+    ELSE COALESCE('Queue ' || queue_id, 'Unknown')
+END
+WHERE game_mode IS NULL;
+
+ALTER TABLE match_info ALTER COLUMN game_mode SET NOT NULL;
+
+TRUNCATE matchup_stats, matchup_daily_stats;
+
+INSERT INTO matchup_stats (
+    user_id, champion, opponent_champion, team_position, game_mode,
+    games_played, wins, total_kills, total_deaths, total_assists,
+    total_cs_per_min, total_gold_per_min, total_damage_per_min, total_game_duration
+)
+SELECT u.id, mp.champion, mp.opponent_champion, mp.team_position, mi.game_mode,
+       count(*), sum(mp.win::int), sum(mp.kills), sum(mp.deaths), sum(mp.assists),
+       sum(mp.cs_per_min), sum(mp.gold_per_min), sum(mp.damage_to_champs_per_min), sum(mi.game_duration)
+FROM match_participants mp
+JOIN match_info mi ON mi.match_id = mp.match_id
+JOIN users u ON u.puuid = mp.puuid
+WHERE mp.opponent_champion IS NOT NULL
+GROUP BY u.id, mp.champion, mp.opponent_champion, mp.team_position, mi.game_mode;
+
+INSERT INTO matchup_daily_stats (
+    user_id, day, champion, opponent_champion, team_position, game_mode,
+    games_played, wins, total_kills, total_deaths, total_assists,
+    total_cs_per_min, total_gold_per_min, total_damage_per_min, total_game_duration
+)
+SELECT u.id, (mi.game_creation AT TIME ZONE 'UTC')::date, mp.champion, mp.opponent_champion, mp.team_position, mi.game_mode,
+       count(*), sum(mp.win::int), sum(mp.kills), sum(mp.deaths), sum(mp.assists),
+       sum(mp.cs_per_min), sum(mp.gold_per_min), sum(mp.damage_to_champs_per_min), sum(mi.game_duration)
+FROM match_participants mp
+JOIN match_info mi ON mi.match_id = mp.match_id
+JOIN users u ON u.puuid = mp.puuid
+WHERE mp.opponent_champion IS NOT NULL AND mi.game_creation IS NOT NULL
+GROUP BY u.id, (mi.game_creation AT TIME ZONE 'UTC')::date, mp.champion, mp.opponent_champion, mp.team_position, mi.game_mode;
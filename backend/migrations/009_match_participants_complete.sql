@@ -0,0 +1,8 @@
+-- Databases that ran 004 before match_info tracked completeness: matches backfilled from
+-- the per-user table hold only the tracked players' rows. Mark those incomplete so
+-- ingestion refetches them and stores every participant (Arena lobbies have 16).
+ALTER TABLE match_info ADD COLUMN IF NOT EXISTS participants_complete BOOLEAN NOT NULL DEFAULT true;
+
+UPDATE match_info mi
+SET participants_complete = false
+WHERE (SELECT count(*) FROM match_participants mp WHERE mp.match_id = mi.match_id) < 10;
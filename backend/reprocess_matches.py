@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Rebuild match rows from the raw match archive
+Run this script after changing how matches are transformed (new derived stats,
+fixed formulas, ...). No Riot API calls are made; every archived match is
+re-transformed and upserted over its stored rows.
+"""
+
+import sys
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.match_archive import iter_segment, match_archive
+from app.services.match_ingestion import build_match_rows, bulk_upsert_matches
+from app.services.matchup_aggregates import rebuild_matchup_stats
+from app.utils.database import SessionLocal
+from config.settings import settings
+
+
+def reprocess_segment(segment_path: str, batch_size: int) -> int:
+    """Re-transform every match in one archive segment (runs in a worker process)"""
+    db = SessionLocal()
+    processed = 0
+    info_rows, participant_rows = [], []
+    try:
+        for match_id, match_data in iter_segment(segment_path):
+            try:
+                info_row, rows = build_match_rows(match_id, match_data)
+            except (KeyError, TypeError, ZeroDivisionError) as e:
+                print(f"Skipping malformed match {match_id}: {e}")
+                continue
+            info_rows.append(info_row)
+            participant_rows.extend(rows)
+            if len(info_rows) >= batch_size:
+                processed += bulk_upsert_matches(db, info_rows, participant_rows)
+                info_rows, participant_rows = [], []
+        processed += bulk_upsert_matches(db, info_rows, participant_rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return processed
+
+
+def reprocess_matches(workers: int, batch_size: int):
+    """Re-transform every archived match, one archive segment per worker process"""
+    segments = match_archive.segment_paths()
+    print(f"Reprocessing {len(segments)} archive segments from {match_archive.directory}...")
+
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(reprocess_segment, path, batch_size): path for path in segments}
+        for future in as_completed(futures):
+            count = future.result()
+            total += count
+            print(f"{os.path.basename(futures[future])}: {count} matches")
+
+    # Matchup totals were summed from the old rows, so recompute them
+    db = SessionLocal()
+    try:
+        rebuild_matchup_stats(db)
+    finally:
+        db.close()
+
+    print(f"Reprocessing completed: {total} matches rewritten")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=settings.MATCH_INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+    reprocess_matches(args.workers, args.batch_size)